@@ -1,38 +1,129 @@
 # app/api.py
+import json
 import logging
+from typing import Any, AsyncIterator, Dict, List, Literal, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
-from app.schemas import TextInput, PredictionOutput, HealthCheck
+from app.schemas import TextInput, PredictionOutput, LivenessStatus, ReadinessStatus, CacheStats, NearDuplicateStats, SchedulerStats, ThreadDiagnostics
+from app.config import settings
+from app.incremental import run_session
+from app.scheduler import RequestContext, batch_request_context, request_context
 from app.services import TextDetectionService, get_text_detection_service
-from app.exceptions import ModelInferenceError
+from app.exceptions import (
+    DeadlineExceededError,
+    ModelInferenceError,
+    QuotaExceededError,
+    ServiceNotReadyError,
+    ServiceOverloadedError,
+    UnknownModelError,
+)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.get("/health", response_model=HealthCheck, tags=["Health"])
-async def health_check():
-    """Provides a basic health check endpoint."""
-    return HealthCheck()
+@router.get("/health/live", response_model=LivenessStatus, tags=["Health"])
+async def liveness(
+    response: Response,
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> LivenessStatus:
+    """Reports whether the process is alive. Fails only if the model could not be loaded."""
+    if service.state == TextDetectionService.STATE_FAILED:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return LivenessStatus(status="failed", detail=service.load_error)
+    return LivenessStatus(status="alive")
+
+
+@router.get("/health/ready", response_model=ReadinessStatus, tags=["Health"])
+async def readiness(
+    response: Response,
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> ReadinessStatus:
+    """Reports whether the model is loaded and warmed up and the service can take traffic."""
+    if not service.is_ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return ReadinessStatus(ready=service.is_ready, state=service.state, time_to_ready_seconds=service.time_to_ready)
+
+
+@router.get("/health", response_model=LivenessStatus, tags=["Health"], deprecated=True)
+async def health_check(
+    response: Response,
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> LivenessStatus:
+    """Kept for existing load balancer configs; use /health/live or /health/ready instead."""
+    return await liveness(response, service)
+
+
+@router.get("/cache/stats", response_model=CacheStats, tags=["Cache"])
+async def cache_stats(
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> CacheStats:
+    """Reports prediction cache hit/miss counters."""
+    return CacheStats(**service.cache_stats())
+
+
+@router.get("/cache/near-duplicates", response_model=NearDuplicateStats, tags=["Cache"])
+async def near_duplicate_stats(
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> NearDuplicateStats:
+    """Reports near-duplicate lookups and the model calls they saved."""
+    return NearDuplicateStats(**service.near_duplicate_stats())
+
+
+@router.get("/diagnostics/threads", response_model=ThreadDiagnostics, tags=["Diagnostics"])
+async def thread_diagnostics(
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> ThreadDiagnostics:
+    """Reports the torch thread counts and CPU affinity in effect, and the auto-tuning results behind them."""
+    return ThreadDiagnostics(**service.thread_diagnostics())
+
+
+@router.get("/diagnostics/scheduler", response_model=SchedulerStats, tags=["Diagnostics"])
+async def scheduler_stats(
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> SchedulerStats:
+    """Reports admissions in flight, the in-flight limit of each priority class and per-client quota usage."""
+    return SchedulerStats(**service.scheduler_stats())
 
 
 @router.post(
     "/predict",
     response_model=PredictionOutput,
+    response_model_exclude_none=True,
     summary="Detect if text is AI-generated",
     tags=["Detection"]
 )
 async def detect_text(
     input_data: TextInput,
+    context: RequestContext = Depends(request_context),
     service: TextDetectionService = Depends(get_text_detection_service)
 ) -> PredictionOutput:
-    """Analyzes text to predict origin (Human vs AI)."""
+    """
+    Analyzes text to predict origin (Human vs AI). X-Priority and
+    X-Deadline-Ms headers set the request's scheduling class and time budget.
+    """
     try:
-        result = service.predict(input_data.text)
+        result = await service.predict_async(
+            input_data.text,
+            long_document=input_data.long_document,
+            aggregation=input_data.aggregation,
+            model=input_data.model,
+            context=context,
+            segmentation=input_data.segmentation,
+        )
         return PredictionOutput(**result)
-    except ModelInferenceError as e:
-        # Let the global handler catch this HTTPException subclass
+    except (
+        DeadlineExceededError,
+        ModelInferenceError,
+        QuotaExceededError,
+        ServiceNotReadyError,
+        ServiceOverloadedError,
+        UnknownModelError,
+    ) as e:
+        # Let the global handler catch these HTTPException subclasses
         raise e
     except Exception as e:
         # Catch unexpected errors during prediction request handling
@@ -40,4 +131,152 @@ async def detect_text(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected server error occurred."
-        )
\ No newline at end of file
+        )
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+_BATCH_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {"type": "array", "items": TextInput.model_json_schema()},
+            },
+            NDJSON_MEDIA_TYPE: {
+                "schema": {"type": "string", "description": "One TextInput JSON object per line."},
+            },
+        },
+    }
+}
+
+
+def _validate_item(raw: Any) -> TextInput | Dict[str, Any]:
+    """Validates one batch item, returning an inline error payload instead of raising."""
+    try:
+        return TextInput.model_validate(raw)
+    except ValidationError as e:
+        return {"status_code": status.HTTP_422_UNPROCESSABLE_ENTITY, "detail": e.errors(include_url=False, include_context=False)}
+
+
+async def _read_ndjson_items(request: Request) -> List[TextInput | Dict[str, Any]]:
+    """Parses the request body line by line, so only validated items are kept rather than the raw body."""
+    items = []
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        items.extend(_parse_ndjson_line(line) for line in lines if line.strip())
+    if buffer.strip():
+        items.append(_parse_ndjson_line(buffer))
+    return items
+
+
+def _parse_ndjson_line(line: bytes) -> TextInput | Dict[str, Any]:
+    try:
+        return _validate_item(json.loads(line))
+    except json.JSONDecodeError as e:
+        return {"status_code": status.HTTP_400_BAD_REQUEST, "detail": f"Invalid JSON: {e.msg}"}
+
+
+async def _read_json_items(request: Request) -> List[TextInput | Dict[str, Any]]:
+    """Accepts either a JSON array of TextInput objects or {"items": [...]}."""
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Request body is not valid JSON.")
+    if isinstance(body, dict):
+        body = body.get("items")
+    if not isinstance(body, list):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Expected a JSON array of TextInput objects or an object with an 'items' array.",
+        )
+    return [_validate_item(raw) for raw in body]
+
+
+def _error_payload(exc: Exception) -> Dict[str, Any]:
+    if isinstance(exc, HTTPException):
+        return {"status_code": exc.status_code, "detail": exc.detail}
+    return {"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR, "detail": "An unexpected server error occurred."}
+
+
+async def _stream_predictions(
+    items: List[TextInput | Dict[str, Any]], service: TextDetectionService, context: RequestContext
+) -> AsyncIterator[bytes]:
+    """Scores items in model-sized chunks and yields one NDJSON line per item, in input order."""
+    indexed = list(enumerate(items))
+    for start in range(0, len(indexed), settings.BATCH_MAX_SIZE):
+        for line in await _score_chunk(indexed[start:start + settings.BATCH_MAX_SIZE], service, context):
+            yield line
+
+
+async def _score_chunk(
+    chunk: List[Tuple[int, TextInput | Dict[str, Any]]], service: TextDetectionService, context: RequestContext
+) -> List[bytes]:
+    valid = [(index, item) for index, item in chunk if isinstance(item, TextInput)]
+    try:
+        outcomes = await service.predict_many_async([item.model_dump() for _, item in valid], context)
+    except Exception as e:
+        logger.exception(f"Batch chunk failed: {e}")
+        outcomes = [e] * len(valid)
+    scored = {index: outcome for (index, _), outcome in zip(valid, outcomes)}
+
+    lines = []
+    for index, item in chunk:
+        if isinstance(item, TextInput):
+            outcome = scored[index]
+            if isinstance(outcome, Exception):
+                payload = {"index": index, "error": _error_payload(outcome)}
+            else:
+                payload = {"index": index, "result": PredictionOutput(**outcome).model_dump(exclude_none=True)}
+        else:
+            payload = {"index": index, "error": item}
+        lines.append(json.dumps(payload).encode("utf-8") + b"\n")
+    return lines
+
+
+@router.post(
+    "/predict/batch",
+    summary="Detect AI-generated text for many inputs, streaming NDJSON results",
+    tags=["Detection"],
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}, "description": "One JSON object per input line, in input order."}},
+    openapi_extra=_BATCH_REQUEST_BODY,
+)
+async def detect_text_batch(
+    request: Request,
+    context: RequestContext = Depends(batch_request_context),
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> StreamingResponse:
+    """
+    Accepts a JSON array of TextInput objects or an NDJSON body (one TextInput
+    per line) and streams back one {"index", "result" | "error"} line per item
+    as each model-sized chunk completes.
+    """
+    service.check_ready()
+    # The body has to be consumed before streaming starts: once the response is
+    # running, Starlette's disconnect listener owns the receive channel.
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in (NDJSON_MEDIA_TYPE, "application/jsonl", "application/ndjson"):
+        items = await _read_ndjson_items(request)
+    else:
+        items = await _read_json_items(request)
+    return StreamingResponse(_stream_predictions(items, service, context), media_type=NDJSON_MEDIA_TYPE)
+
+
+@router.websocket("/predict/live")
+async def detect_text_live(
+    websocket: WebSocket,
+    model: str | None = None,
+    aggregation: Literal["mean", "max", "length_weighted"] = "mean",
+    context: RequestContext = Depends(request_context),
+    service: TextDetectionService = Depends(get_text_detection_service)
+):
+    """
+    Scores a document as it is being written. The client streams edits and
+    receives updated document and per-window scores; only the windows an edit
+    touches are re-scored. See app/incremental.py for the message protocol.
+    """
+    # A session outlives any per-request deadline; only its priority and client quotas apply
+    await run_session(websocket, service, model, aggregation, context._replace(deadline=None))
@@ -0,0 +1,385 @@
+# app/autotune.py
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import platform
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from app.registry import LoadedModel
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the benchmark changes so stored profiles are re-measured
+PROFILE_VERSION = 1
+
+SOURCE_STATIC = "static" # TORCH_NUM_THREADS or the cores // SERVING_WORKERS split
+SOURCE_PERSISTED = "persisted"
+SOURCE_BENCHMARK = "benchmark"
+
+# A candidate within this fraction of the best throughput wins if it uses fewer threads
+_THROUGHPUT_TOLERANCE = 0.03
+
+_host_cpus: List[int] | None = None
+_slot_file = None # Lock file of the CPU slot this process claimed, held open for its lifetime
+_slot_cpus: List[int] | None = None
+
+
+class ThreadProfile(NamedTuple):
+    """Thread and CPU affinity settings of one serving worker, and what they measured."""
+    intra_op_threads: int | None # None leaves torch's default
+    inter_op_threads: int | None
+    pin_cpus: bool
+    source: str
+    throughput: float | None = None # Sequences per second over the benchmark shapes
+    latency_p50_ms: float | None = None
+    latency_p99_ms: float | None = None
+    candidates: List[Dict[str, Any]] = []
+
+
+def host_cpus() -> List[int]:
+    """CPUs this process could use at startup, before any pinning."""
+    global _host_cpus
+    if _host_cpus is None:
+        if hasattr(os, "sched_getaffinity"):
+            _host_cpus = sorted(os.sched_getaffinity(0))
+        else:
+            _host_cpus = list(range(os.cpu_count() or 1))
+    return _host_cpus
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def host_fingerprint() -> str:
+    """Identifies the host and every setting that changes which thread layout is fastest."""
+    import torch
+
+    description = {
+        "version": PROFILE_VERSION,
+        "host": socket.gethostname(),
+        "cpu": _cpu_model(),
+        "cpus": len(host_cpus()),
+        "torch": torch.__version__,
+        "model": settings.MODEL_LOCAL_DIR or f"{settings.MODEL_NAME}@{settings.MODEL_REVISION or 'main'}",
+        "backend": settings.INFERENCE_BACKEND,
+        "serving_workers": settings.SERVING_WORKERS,
+        "executor": settings.INFERENCE_EXECUTOR,
+        "inference_workers": settings.INFERENCE_WORKERS,
+        "batch_max_size": settings.BATCH_MAX_SIZE,
+        "max_length": settings.MODEL_MAX_LENGTH,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def profile_path() -> Path:
+    return Path(settings.AUTOTUNE_DIR) / f"{socket.gethostname()}-{host_fingerprint()}.json"
+
+
+def load_profile() -> ThreadProfile | None:
+    """Returns the profile stored for this host, if there is one."""
+    path = profile_path()
+    if not path.exists():
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            stored = json.load(f)
+        return ThreadProfile(**{**stored, "source": SOURCE_PERSISTED})
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable thread profile {path}: {e}")
+        return None
+
+
+def save_profile(profile: ThreadProfile):
+    path = profile_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profile._asdict(), f, indent=2)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved thread profile to {path}")
+
+
+def claim_cpu_slot() -> List[int] | None:
+    """
+    Claims this worker's share of the host's CPUs when SERVING_WORKERS > 1.
+    Slots are lock files under AUTOTUNE_DIR, so each live worker holds a
+    distinct slice and a restarted worker takes over the slot of the one it replaces.
+    """
+    global _slot_file, _slot_cpus
+    if _slot_file is not None:
+        return _slot_cpus
+    workers = max(1, settings.SERVING_WORKERS)
+    cpus = host_cpus()
+    share = len(cpus) // workers
+    if workers == 1 or share == 0 or not hasattr(os, "sched_setaffinity"):
+        return None
+    lock_dir = Path(settings.AUTOTUNE_DIR)
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    for slot in range(workers):
+        lock_file = open(lock_dir / f"cpu-slot-{slot}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            continue
+        _slot_file = lock_file
+        _slot_cpus = cpus[slot * share:(slot + 1) * share]
+        return _slot_cpus
+    logger.warning(f"All {workers} CPU slots are taken; this worker runs unpinned.")
+    return None
+
+
+def _process_threads() -> List[int]:
+    try:
+        return [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        return [0]
+
+
+def _set_pinned(pinned: bool):
+    """
+    Sets the affinity of every thread of the process: sched_setaffinity only
+    applies to one thread, and the model is loaded on an executor thread that
+    already exists by then. Threads started later inherit the mask.
+    """
+    cpus = claim_cpu_slot() if pinned else None
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    for tid in _process_threads():
+        try:
+            os.sched_setaffinity(tid, cpus or host_cpus())
+        except (ProcessLookupError, PermissionError):
+            # The thread exited meanwhile, or cannot be re-pinned
+            pass
+
+
+def apply_profile(profile: ThreadProfile):
+    """Applies a profile's thread counts and affinity to this process."""
+    import torch
+
+    _set_pinned(profile.pin_cpus)
+    if profile.intra_op_threads is not None:
+        torch.set_num_threads(profile.intra_op_threads)
+    if profile.inter_op_threads is not None:
+        try:
+            # Only allowed before any inter-op parallel work has started in this process
+            torch.set_num_interop_threads(profile.inter_op_threads)
+        except RuntimeError:
+            if torch.get_num_interop_threads() != profile.inter_op_threads:
+                logger.warning(f"Inter-op threads already fixed at {torch.get_num_interop_threads()}; applied on the next start.")
+
+
+def configure_threads() -> ThreadProfile:
+    """
+    Sets threads and affinity before the model is loaded: the stored profile
+    of this host when auto-tuning is enabled and one exists, otherwise the
+    static split of configure_worker_threads.
+    """
+    from app.shared_weights import configure_worker_threads
+
+    host_cpus()
+    if settings.AUTOTUNE_ENABLED and settings.TORCH_NUM_THREADS is None:
+        profile = load_profile()
+        if profile is not None:
+            apply_profile(profile)
+            logger.info(f"Using stored thread profile from {profile_path()}: {describe(profile)}")
+            return profile
+    configure_worker_threads()
+    if settings.AUTOTUNE_ENABLED and settings.TORCH_NUM_THREADS is None:
+        # The benchmark always settles on one inter-op thread, and it can only be set this early
+        apply_profile(ThreadProfile(None, 1, False, SOURCE_STATIC))
+    return ThreadProfile(settings.TORCH_NUM_THREADS, None, False, SOURCE_STATIC)
+
+
+def describe(profile: ThreadProfile) -> str:
+    text = (
+        f"{profile.intra_op_threads} intra-op / {profile.inter_op_threads} inter-op threads, "
+        f"{'pinned' if profile.pin_cpus else 'unpinned'}"
+    )
+    if profile.throughput is not None:
+        text += f", {profile.throughput:.1f} seq/s (p99 {profile.latency_p99_ms:.1f}ms)"
+    return text
+
+
+def _thread_candidates(cpus: int, concurrency: int) -> List[int]:
+    """Powers of two up to the CPU count, plus the even split between concurrent batches."""
+    candidates = {cpus, max(1, cpus // concurrency)}
+    threads = 1
+    while threads < cpus:
+        candidates.add(threads)
+        threads *= 2
+    return sorted(candidates)
+
+
+def _benchmark_batches(model: "LoadedModel") -> List[List[List[int]]]:
+    """Full micro-batches at a short and at the longest length bucket."""
+    buckets = model._length_buckets()
+    lengths = sorted({buckets[len(buckets) // 2], buckets[-1]})
+    batches = []
+    for length in lengths:
+        sequence = model.tokenizer(" ".join(["benchmark"] * length), truncation=True, max_length=length)["input_ids"]
+        batches.append([sequence] * max(1, settings.BATCH_MAX_SIZE))
+    return batches
+
+
+def _measure(model: "LoadedModel", batches: List[List[List[int]]], concurrency: int, seconds: float) -> Dict[str, float]:
+    """
+    Runs the batches from `concurrency` threads, like the inference executor
+    does, until `seconds` have passed (each thread scores every batch at least
+    once), and reports throughput and per-batch latency.
+    """
+    latencies: List[float] = []
+    scored = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def run():
+        rounds = 0
+        while rounds == 0 or time.perf_counter() < deadline:
+            for batch in batches:
+                started = time.perf_counter()
+                model.score_sequences(batch)
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+                    scored[0] += len(batch)
+            rounds += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=run) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "throughput": scored[0] / elapsed,
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "latency_p99_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+
+def _pick(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Highest throughput, preferring fewer threads (and pinning) when within tolerance."""
+    best = max(result["throughput"] for result in results)
+    close = [result for result in results if result["throughput"] >= best * (1 - _THROUGHPUT_TOLERANCE)]
+    return min(close, key=lambda result: (result["intra_op_threads"], not result["pin_cpus"]))
+
+
+def benchmark(model: "LoadedModel") -> ThreadProfile:
+    """
+    Measures intra-op thread counts (and, with several serving workers,
+    pinning to this worker's CPU slice) on representative batch shapes and
+    returns the fastest. Inter-op threads can't be changed once torch has
+    started, so they are fixed to one: the forward passes here never fork
+    inter-op work, and a single thread avoids an idle pool per worker.
+    """
+    import torch
+
+    concurrency = max(1, settings.INFERENCE_WORKERS)
+    batches = _benchmark_batches(model)
+    slot = claim_cpu_slot() if settings.AUTOTUNE_PIN_CPUS else None
+    layouts: List[Tuple[bool, int]] = []
+    for pinned in ([True, False] if slot else [False]):
+        cpus = len(slot) if pinned else len(host_cpus()) // max(1, settings.SERVING_WORKERS)
+        layouts += [(pinned, threads) for threads in _thread_candidates(max(1, cpus), concurrency)]
+    seconds = settings.AUTOTUNE_SECONDS / len(layouts)
+
+    results = []
+    for pinned, threads in layouts:
+        _set_pinned(pinned)
+        torch.set_num_threads(threads)
+        model.score_sequences(batches[0]) # Lets the new thread pool spin up before timing
+        result = {"intra_op_threads": threads, "pin_cpus": pinned, **_measure(model, batches, concurrency, seconds)}
+        logger.info(
+            f"Thread benchmark: {threads} threads{' pinned' if pinned else ''}: {result['throughput']:.1f} seq/s, "
+            f"p50 {result['latency_p50_ms']:.1f}ms, p99 {result['latency_p99_ms']:.1f}ms"
+        )
+        results.append(result)
+
+    best = _pick(results)
+    return ThreadProfile(
+        intra_op_threads=best["intra_op_threads"],
+        inter_op_threads=1,
+        pin_cpus=best["pin_cpus"],
+        source=SOURCE_BENCHMARK,
+        throughput=best["throughput"],
+        latency_p50_ms=best["latency_p50_ms"],
+        latency_p99_ms=best["latency_p99_ms"],
+        candidates=results,
+    )
+
+
+def tune(model: "LoadedModel", current: ThreadProfile) -> ThreadProfile:
+    """
+    Benchmarks and stores a profile unless one was already applied. Workers
+    of the same host take turns on a file lock, so only the first one pays
+    for the benchmark and the others pick up its result.
+    """
+    if current.source == SOURCE_PERSISTED or settings.TORCH_NUM_THREADS is not None:
+        return current
+    if settings.INFERENCE_BACKEND == "onnx":
+        logger.info("Skipping thread auto-tuning: the ONNX Runtime session keeps the threads it was created with.")
+        return current
+    path = profile_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix(".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            profile = load_profile()
+            if profile is None:
+                started = time.perf_counter()
+                profile = benchmark(model)
+                save_profile(profile)
+                logger.info(f"Thread auto-tuning took {time.perf_counter() - started:.1f}s.")
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    apply_profile(profile)
+    logger.info(
+        f"Selected thread profile: {describe(profile)}",
+        extra={"thread_profile": {key: value for key, value in profile._asdict().items() if key != "candidates"}},
+    )
+    return profile
+
+
+def diagnostics(profile: ThreadProfile | None) -> Dict[str, Any]:
+    """The profile in effect and the thread/affinity state it produced."""
+    import torch
+
+    affinity = None
+    if hasattr(os, "sched_getaffinity"):
+        # Union over all threads, so a thread left outside the profile's CPUs shows up
+        cpus = set()
+        for tid in _process_threads():
+            try:
+                cpus.update(os.sched_getaffinity(tid))
+            except ProcessLookupError:
+                pass
+        affinity = sorted(cpus)
+    return {
+        "autotune_enabled": settings.AUTOTUNE_ENABLED,
+        "profile": profile._asdict() if profile is not None else None,
+        "profile_path": str(profile_path()) if settings.AUTOTUNE_ENABLED else None,
+        "torch_num_threads": torch.get_num_threads(),
+        "torch_num_interop_threads": torch.get_num_interop_threads(),
+        "host_cpus": len(host_cpus()),
+        "affinity": affinity,
+    }
@@ -0,0 +1,190 @@
+# app/backends.py
+import hashlib
+import logging
+import os
+import re
+from pathlib import Path
+
+import torch
+import torch.nn.functional as F
+from transformers import PreTrainedModel, PreTrainedTokenizer
+
+from app.config import settings
+from app.exceptions import ModelLoadError
+
+logger = logging.getLogger(__name__)
+
+# Texts used to compare a backend's output against eager PyTorch at load time
+_PARITY_TEXTS = [
+    "The quick brown fox jumps over the lazy dog",
+    "In this article we explore how modern transformer models changed natural language processing forever",
+    "i wrote this on my phone so sorry for typos lol",
+]
+
+
+def _state_bytes(module: torch.nn.Module) -> int:
+    """
+    Bytes held by a module's state: parameters, buffers and the packed weights
+    of quantized layers, which are not parameters. Tied tensors count once.
+    """
+    seen = {}
+    for value in module.state_dict().values():
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if isinstance(tensor, torch.Tensor):
+                seen[(tensor.data_ptr(), tensor.numel())] = tensor.numel() * tensor.element_size()
+    return sum(seen.values())
+
+
+class InferenceBackend:
+    """Runs the classification forward pass on padded input tensors and returns logits."""
+    name = "eager"
+
+    def __init__(self, model: PreTrainedModel | None, device: torch.device):
+        self._model = model
+        self._device = device
+
+    def __call__(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self._model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+    def memory_bytes(self) -> int:
+        """Bytes of weights this backend keeps resident."""
+        return _state_bytes(self._model) if self._model is not None else 0
+
+
+class CompiledBackend(InferenceBackend):
+    """Eager model wrapped in torch.compile; compiled kernels are cached under BACKEND_CACHE_DIR."""
+    name = "compile"
+
+    def __init__(self, model: PreTrainedModel, device: torch.device, artifact_dir: Path):
+        # Inductor reads this when compiling, so it must be set before torch.compile runs
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(artifact_dir / "inductor"))
+        os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+        super().__init__(torch.compile(model, dynamic=True), device)
+
+
+class QuantizedInt8Backend(InferenceBackend):
+    """
+    Dynamic int8 quantization of every nn.Linear layer. CPU only. The model
+    is quantized at every load; no artifact is cached, since dynamic
+    quantization needs no calibration data and only repacks the weights.
+    """
+    name = "int8"
+
+    def __init__(self, model: PreTrainedModel, device: torch.device, artifact_dir: Path):
+        if device.type != "cpu":
+            raise ModelLoadError("The int8 backend only supports CPU inference.")
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=False)
+        super().__init__(quantized.eval(), device)
+
+
+class OnnxBackend(InferenceBackend):
+    """Runs an exported ONNX graph with onnxruntime. The export is cached under BACKEND_CACHE_DIR."""
+    name = "onnx"
+
+    def __init__(self, model: PreTrainedModel, device: torch.device, artifact_dir: Path):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ModelLoadError("INFERENCE_BACKEND='onnx' requires the onnxruntime package.") from e
+
+        artifact = artifact_dir / "model.onnx"
+        if not artifact.exists():
+            self._export(model, artifact)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Follows the torch thread split (or tuned profile) so ONNX workers don't oversubscribe the CPU either
+        options.intra_op_num_threads = torch.get_num_threads()
+        options.inter_op_num_threads = torch.get_num_interop_threads()
+        self._session = onnxruntime.InferenceSession(str(artifact), options, providers=["CPUExecutionProvider"])
+        # The session holds the graph's initializers, which make up nearly all of the file
+        self._graph_bytes = artifact.stat().st_size
+        logger.info(f"Loaded ONNX graph from {artifact}")
+        # The torch weights are not needed once the graph is loaded
+        super().__init__(None, device)
+
+    @staticmethod
+    def _export(model: PreTrainedModel, artifact: Path):
+        """Exports the model with dynamic batch and sequence axes."""
+        logger.info(f"Exporting ONNX graph to {artifact}")
+        sample = torch.ones((2, 16), dtype=torch.long)
+        tmp_artifact = artifact.with_suffix(".onnx.tmp")
+        # Exported on the CPU, then moved back: the caller keeps using the eager model for parity checks
+        original_device = next(model.parameters()).device
+        try:
+            torch.onnx.export(
+                model.to("cpu"),
+                (sample, sample),
+                str(tmp_artifact),
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=17,
+                dynamo=False,
+            )
+        finally:
+            model.to(original_device)
+        # Rename last so a crash mid-export never leaves a truncated graph behind
+        tmp_artifact.replace(artifact)
+
+    def memory_bytes(self) -> int:
+        return self._graph_bytes
+
+    def __call__(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        logits = self._session.run(
+            ["logits"],
+            {"input_ids": input_ids.cpu().numpy(), "attention_mask": attention_mask.cpu().numpy()},
+        )[0]
+        return torch.from_numpy(logits)
+
+
+def _artifact_dir(model: PreTrainedModel, model_id: str | None = None) -> Path:
+    """Per-model directory for cached backend artifacts, keyed by model name, revision and config."""
+    config_hash = hashlib.sha256(model.config.to_json_string().encode("utf-8")).hexdigest()[:12]
+    model_id = model_id or f"{settings.MODEL_NAME}@{settings.MODEL_REVISION or 'main'}"
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_id)
+    path = Path(settings.BACKEND_CACHE_DIR) / f"{slug}-{config_hash}-torch{torch.__version__}"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _reference_probabilities(
+    backend: InferenceBackend, tokenizer: PreTrainedTokenizer, device: torch.device
+) -> torch.Tensor:
+    inputs = tokenizer(_PARITY_TEXTS, padding=True, truncation=True, max_length=settings.MODEL_MAX_LENGTH, return_tensors="pt")
+    logits = backend(inputs["input_ids"].to(device), inputs["attention_mask"].to(device))
+    return F.softmax(logits.float(), dim=1).cpu()
+
+
+def build_backend(
+    name: str, model: PreTrainedModel, tokenizer: PreTrainedTokenizer, device: torch.device, model_id: str | None = None
+) -> InferenceBackend:
+    """
+    Wraps a loaded eager model in the requested backend and checks that its
+    probabilities match eager PyTorch within BACKEND_PARITY_TOLERANCE.
+    `model_id` ("name@revision") keys the cached artifacts; it defaults to the configured model.
+    """
+    eager = InferenceBackend(model, device)
+    if name == "eager":
+        return eager
+
+    backend_classes = {cls.name: cls for cls in (CompiledBackend, QuantizedInt8Backend, OnnxBackend)}
+    if name not in backend_classes:
+        raise ModelLoadError(f"Unknown INFERENCE_BACKEND '{name}'. Expected one of: eager, {', '.join(backend_classes)}.")
+
+    expected = _reference_probabilities(eager, tokenizer, device)
+    backend = backend_classes[name](model, device, _artifact_dir(model, model_id))
+    actual = _reference_probabilities(backend, tokenizer, device)
+    max_diff = float((expected - actual).abs().max())
+    if max_diff > settings.BACKEND_PARITY_TOLERANCE:
+        raise ModelLoadError(
+            f"Backend '{name}' failed the parity check: max probability difference {max_diff:.4f} "
+            f"exceeds BACKEND_PARITY_TOLERANCE={settings.BACKEND_PARITY_TOLERANCE}."
+        )
+    logger.info(f"Backend '{name}' passed the parity check (max probability difference {max_diff:.6f}).")
+    return backend
+
@@ -0,0 +1,229 @@
+# app/batch_score.py
+"""
+Offline batch scoring of large CSV, Parquet or JSONL files.
+
+    python -m app.batch_score corpus.csv --output scores/ --text-column text --id-column id
+
+Results are written to the output directory as one Parquet (or Arrow) part
+file per chunk. Rerunning the same command resumes after the last complete
+part. Texts go through the same normalization, tokenizer, model loading and
+backend as the API, so offline and online scores are identical.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Tuple
+
+from app.config import settings
+from app.jobs import (
+    JOB_FORMATS,
+    MISSING_TEXT_ERROR,
+    InputRow,
+    detect_format,
+    has_text,
+    iter_input_chunks,
+    result_row,
+    result_schema,
+)
+from app.logging_config import setup_logging
+from app.services import PredictionRequest, get_text_detection_service, normalize_text
+
+logger = logging.getLogger(__name__)
+
+_PART_PATTERN = re.compile(r"^part-(\d{12})\.(parquet|arrow)$")
+
+
+def _init_tokenize_worker():
+    """Loads only the tokenizer; each worker process tokenizes single-threaded."""
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    get_text_detection_service().load_tokenizer()
+
+
+def _tokenize(requests: List[PredictionRequest]) -> List[List[List[int]]]:
+    return get_text_detection_service().tokenize_requests(requests)
+
+
+def _existing_rows(output_dir: Path, output_format: str) -> int:
+    """
+    Returns how many input rows the complete part files already cover, after
+    removing temporary files left by an interrupted run. Parts are named by
+    their first row, so they must form one contiguous run from row 0.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for leftover in output_dir.glob("*.tmp"):
+        leftover.unlink()
+    next_row = 0
+    for part in sorted(output_dir.iterdir()):
+        match = _PART_PATTERN.match(part.name)
+        if match is None:
+            continue
+        if match.group(2) != output_format:
+            raise SystemExit(f"{output_dir} holds {match.group(2)} parts; rerun with --format {match.group(2)} or --overwrite.")
+        if int(match.group(1)) != next_row:
+            raise SystemExit(f"Part {part.name} does not start at row {next_row}; the output directory is inconsistent.")
+        if output_format == "parquet":
+            next_row += pq.ParquetFile(part).metadata.num_rows
+        else:
+            with pa.memory_map(str(part)) as source:
+                next_row += pa.ipc.open_file(source).read_all().num_rows
+    return next_row
+
+
+def _write_part(output_dir: Path, output_format: str, lines: List[Dict[str, Any]]):
+    """Writes one chunk of results under a temporary name and renames it, so parts are never partial."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if not lines:
+        return
+    ids = pa.array([line["id"] for line in lines])
+    schema = result_schema(ids.type if ids.null_count < len(ids) else None)
+    table = pa.Table.from_pylist(lines, schema=schema)
+    part = output_dir / f"part-{lines[0]['row']:012d}.{output_format}"
+    tmp_part = part.with_name(part.name + ".tmp")
+    if output_format == "parquet":
+        pq.write_table(table, tmp_part)
+    else:
+        with pa.OSFile(str(tmp_part), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_part, part)
+
+
+def _submit(
+    executor: Executor | None, chunk: List[InputRow], long_document: bool, aggregation: str, workers: int
+) -> Tuple[List[InputRow], List[int], List[PredictionRequest], List[Future] | List[List[List[int]]]]:
+    """Normalizes a chunk and hands its tokenization to the worker pool, split evenly between workers."""
+    valid = [i for i, (_, text, _) in enumerate(chunk) if has_text(text)]
+    requests = [PredictionRequest(normalize_text(chunk[i][1]), long_document, aggregation) for i in valid]
+    if executor is None:
+        return chunk, valid, requests, [get_text_detection_service().tokenize_requests(requests)]
+    step = max(1, -(-len(requests) // workers))
+    futures = [executor.submit(_tokenize, requests[start:start + step]) for start in range(0, len(requests), step)]
+    return chunk, valid, requests, futures
+
+
+def _score(pending: Tuple[List[InputRow], List[int], List[PredictionRequest], List[Any]]) -> List[Dict[str, Any]]:
+    """Waits for a chunk's tokens and runs the length-bucketed batched forward pass over them."""
+    chunk, valid, requests, parts = pending
+    tokenized = [sequences for part in parts for sequences in (part.result() if isinstance(part, Future) else part)]
+    lines = [result_row(row, row_id, MISSING_TEXT_ERROR) for row, _, row_id in chunk]
+    if requests:
+        outcomes = get_text_detection_service().predict_tokenized(requests, tokenized)
+        for i, outcome in zip(valid, outcomes):
+            lines[i] = result_row(chunk[i][0], chunk[i][2], outcome)
+    return lines
+
+
+def score_file(args: argparse.Namespace) -> Dict[str, Any]:
+    """Scores the input file into the output directory and returns run statistics."""
+    input_format = args.input_format or detect_format(args.input)
+    if input_format not in JOB_FORMATS:
+        raise SystemExit(f"Cannot detect the format of {args.input}; pass --input-format ({', '.join(JOB_FORMATS)}).")
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if args.overwrite:
+        for part in output_dir.iterdir():
+            if _PART_PATTERN.match(part.name) or part.suffix == ".tmp":
+                part.unlink()
+    start_row = _existing_rows(output_dir, args.format)
+    if start_row:
+        logger.info(f"Resuming from row {start_row}")
+
+    service = get_text_detection_service()
+    service.load()
+
+    workers = max(0, args.tokenize_workers)
+    executor = None
+    if workers:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_tokenize_worker,
+        )
+
+    chunks = iter_input_chunks(
+        Path(args.input), input_format, args.text_column, args.id_column, start_row, args.chunk_size
+    )
+    # Chunks are tokenized ahead of the one being scored so the model never waits on the workers
+    pending: Deque[Tuple[Any, ...]] = deque()
+    rows = failed = 0
+    started = last_report = time.perf_counter()
+
+    def flush_one():
+        nonlocal rows, failed, last_report
+        lines = _score(pending.popleft())
+        if not lines:
+            return
+        _write_part(output_dir, args.format, lines)
+        rows += len(lines)
+        failed += sum(line["error"] is not None for line in lines)
+        now = time.perf_counter()
+        if now - last_report >= args.report_every:
+            print(f"{start_row + rows} rows scored, {rows / (now - started):.1f} rows/s", file=sys.stderr, flush=True)
+            last_report = now
+
+    try:
+        for chunk in chunks:
+            pending.append(_submit(executor, chunk, args.long_document, args.aggregation, max(1, workers)))
+            while len(pending) > args.prefetch:
+                flush_one()
+        while pending:
+            flush_one()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "failed_rows": failed,
+        "resumed_from_row": start_row,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.batch_score", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("input", help="CSV, Parquet or JSONL file to score.")
+    parser.add_argument("--output", required=True, help="Directory that receives the result part files.")
+    parser.add_argument("--input-format", choices=JOB_FORMATS, help="Overrides the format detected from the file extension.")
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet", help="Output part file format.")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--id-column", help="Column copied into the results to join them back.")
+    parser.add_argument("--long-document", action="store_true", help="Score whole texts with overlapping windows.")
+    parser.add_argument("--aggregation", choices=("mean", "max", "length_weighted"), default="mean")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="Rows read, scored and written per part file.")
+    parser.add_argument("--tokenize-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Tokenizer processes; 0 tokenizes in the main process.")
+    parser.add_argument("--prefetch", type=int, default=2, help="Chunks tokenized ahead of the one being scored.")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines.")
+    parser.add_argument("--overwrite", action="store_true", help="Discard existing parts instead of resuming.")
+    args = parser.parse_args(argv)
+
+    # Offline scores are never reused, so skip the prediction cache in this process and its workers
+    os.environ["CACHE_ENABLED"] = "false"
+    settings.CACHE_ENABLED = False
+    setup_logging()
+
+    stats = score_file(args)
+    print(
+        f"Scored {stats['rows']} rows ({stats['failed_rows']} failed) in {stats['seconds']}s: "
+        f"{stats['rows_per_second']} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
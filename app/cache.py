@@ -0,0 +1,132 @@
+# app/cache.py
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+class PredictionCache:
+    """
+    Content-addressed prediction cache.
+    A bounded in-memory LRU with TTL sits in front of an optional SQLite tier
+    that survives restarts. Safe to share between the event loop and executor threads.
+    """
+
+    # Expired rows are purged from the disk tier once every this many writes
+    _DISK_PRUNE_INTERVAL = 1000
+
+    def __init__(self, max_entries: int, ttl_seconds: float, disk_path: str | None = None):
+        self._max_entries = max(1, max_entries)
+        self._ttl = ttl_seconds
+        self._memory: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._disk_writes = 0
+        self._disk: sqlite3.Connection | None = None
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, disk_path: str):
+        """Opens (or creates) the SQLite tier."""
+        try:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("PRAGMA synchronous=NORMAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            logger.info(f"Prediction cache disk tier opened at {disk_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Could not open prediction cache at {disk_path}, continuing memory-only: {e}")
+            self._disk = None
+
+    @staticmethod
+    def make_key(normalized_text: str, *namespace: Any) -> str:
+        """Hashes the normalized text together with everything that changes the model output."""
+        digest = hashlib.sha256()
+        for part in namespace:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(normalized_text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self._ttl > 0 and now - created_at > self._ttl
+
+    def get(self, key: str) -> Dict[str, Any] | None:
+        """Returns the cached prediction for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, created_at FROM predictions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self._hits += 1
+                    self._disk_hits += 1
+                    return value
+
+            self._misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Stores a prediction in memory and, if configured, on disk."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._disk is not None:
+                try:
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO predictions (key, value, created_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), now),
+                    )
+                    self._disk_writes += 1
+                    if self._ttl > 0 and self._disk_writes % self._DISK_PRUNE_INTERVAL == 0:
+                        self._disk.execute("DELETE FROM predictions WHERE created_at < ?", (now - self._ttl,))
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to write prediction cache entry to disk: {e}")
+
+    def _remember(self, key: str, created_at: float, value: Dict[str, Any]):
+        """Inserts into the memory tier, evicting the least recently used entries. Caller holds the lock."""
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_enabled": self._disk is not None,
+            }
+
+    def close(self):
+        """Closes the disk tier."""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
@@ -0,0 +1,195 @@
+# app/calibration.py
+"""
+Picks the cascade's uncertainty band from a sample of representative texts.
+
+    python -m app.calibration sample.csv --text-column text --label-column label --output cascade.json
+
+Every text the serving cascade would send to its first stage is scored by
+both stages; without CASCADE_MODEL_NAME, texts that fit in the prefix are
+skipped. The band [lower, upper] of first-stage softmax_score_class_1 values
+escalated to the full model is then
+chosen to let the first stage decide as many texts as possible while the
+accuracy loss stays within --max-accuracy-loss (CASCADE_MAX_ACCURACY_LOSS).
+With a label column the loss is measured against the labels; without one it
+is the share of verdicts that differ from the full model's. Point
+CASCADE_THRESHOLDS_PATH at the output file to serve with the chosen band.
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.jobs import JOB_FORMATS, detect_format, has_text, iter_input_chunks
+from app.logging_config import setup_logging
+from app.services import PredictionRequest, get_text_detection_service, normalize_text
+
+# Candidate thresholds are taken at these quantiles of the first-stage scores
+_QUANTILES = np.linspace(0.0, 1.0, 401)
+
+
+def load_thresholds(path: str) -> Tuple[float, float]:
+    """Reads the (lower, upper) band from a file written by this module."""
+    with open(path, encoding="utf-8") as f:
+        thresholds = json.load(f)
+    return float(thresholds["lower"]), float(thresholds["upper"])
+
+
+def choose_band(
+    first_stage: np.ndarray,
+    full_model: np.ndarray,
+    labels: np.ndarray | None = None,
+    max_accuracy_loss: float = settings.CASCADE_MAX_ACCURACY_LOSS,
+) -> Dict[str, Any]:
+    """
+    Returns the band that maximizes the share of texts decided by the first
+    stage subject to the accuracy-loss budget. Inputs are class-1 probabilities
+    (and 0/1 labels) per text. Texts with a first-stage score strictly below
+    `lower` or strictly above `upper` are decided by the first stage.
+    """
+    first_stage = np.asarray(first_stage, dtype=np.float64)
+    full_model = np.asarray(full_model, dtype=np.float64)
+    n = len(first_stage)
+    if n == 0:
+        raise ValueError("Cannot calibrate the cascade without any scored texts.")
+    first_pred = (first_stage > 0.5).astype(np.int64)
+    full_pred = (full_model > 0.5).astype(np.int64)
+    if labels is None:
+        # Each early exit costs one point if it flips the full model's verdict
+        exit_cost = (first_pred != full_pred).astype(np.float64)
+    else:
+        labels = np.asarray(labels, dtype=np.int64)
+        exit_cost = (full_pred == labels).astype(np.float64) - (first_pred == labels)
+
+    # Exits below `lower` and above `upper` are disjoint, so their counts and costs add up
+    candidates = np.unique(np.concatenate([np.quantile(first_stage, _QUANTILES), [0.0, 0.5, 1.0]]))
+    lowers = candidates[candidates <= 0.5]
+    uppers = candidates[candidates >= 0.5]
+    order = np.argsort(first_stage)
+    sorted_scores = first_stage[order]
+    cumulative_cost = np.concatenate([[0.0], np.cumsum(exit_cost[order])])
+
+    below = np.searchsorted(sorted_scores, lowers, side="left")
+    above = np.searchsorted(sorted_scores, uppers, side="right")
+    low_exits, low_cost = below, cumulative_cost[below]
+    high_exits, high_cost = n - above, cumulative_cost[-1] - cumulative_cost[above]
+
+    exits = low_exits[:, None] + high_exits[None, :]
+    loss = (low_cost[:, None] + high_cost[None, :]) / n
+    # Most exits first, least loss among those; the band [0, 1] escalates everything and is always feasible
+    feasible = loss <= max_accuracy_loss + 1e-12
+    score = np.where(feasible, exits - loss, -np.inf)
+    i, j = np.unravel_index(np.argmax(score), score.shape)
+
+    full_accuracy = cascade_accuracy = None
+    if labels is not None:
+        full_accuracy = float((full_pred == labels).mean())
+        cascade_accuracy = full_accuracy - float(loss[i, j])
+    return {
+        "lower": float(lowers[i]),
+        "upper": float(uppers[j]),
+        "first_stage_rate": float(exits[i, j] / n),
+        "accuracy_loss": float(loss[i, j]),
+        "max_accuracy_loss": max_accuracy_loss,
+        "reference": "labels" if labels is not None else "full_model",
+        "full_model_accuracy": full_accuracy,
+        "cascade_accuracy": cascade_accuracy,
+        "samples": n,
+    }
+
+
+def score_file(args: argparse.Namespace) -> Tuple[np.ndarray, np.ndarray, np.ndarray | None]:
+    """Scores every text of the input the serving cascade would send to its first stage, with both stages."""
+    input_format = args.input_format or detect_format(args.input)
+    if input_format not in JOB_FORMATS:
+        raise SystemExit(f"Cannot detect the format of {args.input}; pass --input-format ({', '.join(JOB_FORMATS)}).")
+
+    service = get_text_detection_service()
+    service.load()
+    first_stage: List[np.ndarray] = []
+    full_model: List[np.ndarray] = []
+    labels: List[int] = []
+    scored = 0
+    skipped = 0
+    # The label column rides along in the id slot of each input row
+    chunks = iter_input_chunks(Path(args.input), input_format, args.text_column, args.label_column, 0, args.chunk_size)
+    for chunk in chunks:
+        rows = [(text, label) for _, text, label in chunk if has_text(text)]
+        if args.label_column:
+            rows = [(text, label) for text, label in rows if label is not None]
+        if not rows:
+            continue
+        requests = [PredictionRequest(normalize_text(text)) for text, _ in rows]
+        sequences = [sequences[0] for sequences in service.tokenize_requests(requests)]
+        # The serving cascade's own filter, so calibration sees the same texts as the first stage
+        candidates = service.cascade_candidates(requests, sequences)
+        skipped += len(rows) - len(candidates)
+        if args.limit:
+            candidates = candidates[:args.limit - scored]
+        if not candidates:
+            continue
+        rows = [rows[i] for i in candidates]
+        sequences = [sequences[i] for i in candidates]
+        first, full = service.score_cascade_stages(sequences)
+        first_stage.append(first[:, 1])
+        full_model.append(full[:, 1])
+        labels.extend(int(label) for _, label in rows)
+        scored += len(rows)
+        if args.limit and scored >= args.limit:
+            break
+    if skipped:
+        print(f"Skipped {skipped} texts the cascade never sends to its first stage.")
+    if not full_model:
+        raise SystemExit(f"{args.input} has no rows the cascade sends to its first stage to calibrate on.")
+    return (
+        np.concatenate(first_stage),
+        np.concatenate(full_model),
+        np.array(labels) if args.label_column else None,
+    )
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.calibration", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("input", help="CSV, Parquet or JSONL file of representative texts.")
+    parser.add_argument("--output", default="cascade_thresholds.json", help="Where to write the chosen band.")
+    parser.add_argument("--input-format", choices=JOB_FORMATS, help="Overrides the format detected from the file extension.")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-column", help="0/1 labels (1 = AI-generated); without it the full model is the reference.")
+    parser.add_argument("--max-accuracy-loss", type=float, default=settings.CASCADE_MAX_ACCURACY_LOSS,
+                        help="Largest accepted drop in accuracy, as a fraction of texts.")
+    parser.add_argument("--limit", type=int, help="Calibrate on at most this many texts.")
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    # Both stages are always scored here, whatever the serving configuration
+    os.environ["CACHE_ENABLED"] = "false"
+    settings.CACHE_ENABLED = False
+    settings.CASCADE_ENABLED = True
+    settings.CASCADE_THRESHOLDS_PATH = None
+    setup_logging()
+
+    started = time.perf_counter()
+    first_stage, full_model, labels = score_file(args)
+    band = choose_band(first_stage, full_model, labels, args.max_accuracy_loss)
+    band.update({
+        "prefix_tokens": settings.CASCADE_PREFIX_TOKENS,
+        "first_stage_model": settings.CASCADE_MODEL_NAME,
+        "model": settings.MODEL_LOCAL_DIR or settings.MODEL_NAME,
+    })
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(band, f, indent=2)
+    print(
+        f"Band [{band['lower']:.4f}, {band['upper']:.4f}]: {band['first_stage_rate']:.1%} of {band['samples']} texts "
+        f"decided by the first stage, accuracy loss {band['accuracy_loss']:.4f} "
+        f"(budget {band['max_accuracy_loss']}), in {time.perf_counter() - started:.1f}s. Written to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import logging
 import os
 from functools import lru_cache
 from pathlib import Path
+from typing import Dict, List
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -18,9 +19,106 @@ class Settings(BaseSettings):
 
     HF_TOKEN: str | None = None
     MODEL_NAME: str = "muyiiwaa/ai_detect_modernbert"
+    MODEL_REVISION: str | None = None # Branch, tag or commit hash on the Hub
+    MODEL_LOCAL_DIR: str | None = None # Pinned snapshot directory; takes precedence over MODEL_NAME for loading
+    HF_OFFLINE: bool = False # Never contact the Hub; requires MODEL_LOCAL_DIR or a populated HF cache
+    MODEL_USE_SAFETENSORS: bool = True
     MODEL_MAX_LENGTH: int = 512
+    MODEL_ATTN_IMPLEMENTATION: str | None = None # e.g. "sdpa" or "flash_attention_2"
+    LENGTH_BUCKETS: List[int] = [64, 128, 256, 512]
+    WARMUP_BATCH_SIZE: int = 4 # Per length bucket; 0 skips warmup
+
+    # Model registry (see app/registry.py): extra models requests can select by name
+    MODEL_DEFAULT_NAME: str = "default" # Registry name of the model configured above
+    MODEL_REGISTRY: Dict[str, str] = {} # e.g. {"v2": "muyiiwaa/ai_detect_modernbert@<revision>"}; loaded on first use
+    MODEL_MEMORY_BUDGET_MB: float | None = None # Least recently used models are unloaded above this; unset never evicts
+    MODEL_ADMIN_ENABLED: bool = False # Allows loading models and swapping the default through POST /models
+
+    # Sliding-window scoring of documents longer than MODEL_MAX_LENGTH
+    LONG_DOCUMENT_WINDOW_STRIDE: int = 128 # Tokens shared by consecutive windows
+    LONG_DOCUMENT_MAX_WINDOWS: int = 32
     DEVICE: str = "cpu" # Updated dynamically in service initialization
 
+    # Sentence/paragraph attribution (see app/segmentation.py)
+    SEGMENTATION_DEFAULT: str = "none" # Used when a request sets no segmentation: "none", "sentence" or "paragraph"
+    SEGMENTATION_MIN_CHARS: int = 20 # Shorter segments are merged into the next one
+    SEGMENTATION_MAX_SEGMENTS: int = 128 # Consecutive segments are grouped beyond this
+
+    # Multi-worker serving (see app/serve.py)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVING_WORKERS: int = 1
+    SHARED_WEIGHTS_DIR: str | None = None # Read-only weights snapshot mapped by every worker on CPU
+    TORCH_NUM_THREADS: int | None = None # Defaults to cores // SERVING_WORKERS when running several workers
+
+    # Startup auto-tuning of CPU threads and affinity (see app/autotune.py); ignored when TORCH_NUM_THREADS is set
+    AUTOTUNE_ENABLED: bool = False
+    AUTOTUNE_SECONDS: float = 20.0 # Benchmark budget, spent only when no profile is stored for this host
+    AUTOTUNE_DIR: str = os.path.join(BASE_DIR, ".autotune") # Per-host profiles and CPU slot locks
+    AUTOTUNE_PIN_CPUS: bool = True # Also try pinning each serving worker to its own slice of cores
+
+    # Inference backend: "eager", "compile", "onnx" or "int8"
+    INFERENCE_BACKEND: str = "eager"
+    BACKEND_CACHE_DIR: str = os.path.join(BASE_DIR, ".backend_cache")
+    BACKEND_PARITY_TOLERANCE: float = 0.02 # Max allowed softmax difference against eager PyTorch
+
+    # Micro-batching of concurrent /predict calls
+    BATCH_MAX_SIZE: int = 16
+    BATCH_MAX_WAIT_MS: float = 5.0
+
+    # Dedicated inference executor and backpressure
+    INFERENCE_EXECUTOR: str = "thread" # "thread" or "process"
+    INFERENCE_WORKERS: int = 1
+    INFERENCE_MAX_IN_FLIGHT: int = 64
+    OVERLOAD_RETRY_AFTER_SECONDS: int = 1
+
+    # Priority scheduling and per-client quotas (see app/scheduler.py)
+    SCHEDULER_DEFAULT_PRIORITY: str = "standard" # Class of requests without an X-Priority header: "interactive", "standard" or "background"
+    SCHEDULER_MAX_PRIORITY: str = "standard" # Highest class a client without a mapped API key may request
+    SCHEDULER_BATCH_MAX_PRIORITY: str = "background" # The same on /predict/batch
+    SCHEDULER_API_KEYS: Dict[str, str] = {} # X-API-Key value -> highest class that key may request
+    SCHEDULER_INTERACTIVE_RESERVE: int = 8 # In-flight slots only interactive requests may take
+    SCHEDULER_BACKGROUND_SHARE: float = 0.5 # Fraction of INFERENCE_MAX_IN_FLIGHT background work may occupy
+    CLIENT_MAX_IN_FLIGHT: int | None = None # Per-client concurrency quota; unset disables it
+    CLIENT_TOKENS_PER_MINUTE: int | None = None # Per-client model token quota (estimated from text length); unset disables it
+
+    # Content-addressed prediction cache
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_TTL_SECONDS: float = 3600.0 # 0 disables expiry
+    CACHE_DISK_PATH: str | None = None # SQLite file; unset keeps the cache memory-only
+
+    # Near-duplicate reuse (see app/near_duplicate.py): texts almost identical to a recently scored one
+    NEAR_DUPLICATE_ENABLED: bool = False
+    NEAR_DUPLICATE_MODE: str = "reuse" # "reuse" returns the stored prediction; "flag" still runs the model and marks the match
+    NEAR_DUPLICATE_THRESHOLD: float = 0.9 # Estimated Jaccard similarity of word 3-grams
+    NEAR_DUPLICATE_MAX_ENTRIES: int = 20000 # Fixed-size index, about 1KB per entry plus the stored predictions
+    NEAR_DUPLICATE_TTL_SECONDS: float = 3600.0 # 0 disables expiry
+    NEAR_DUPLICATE_MIN_WORDS: int = 20 # Shorter texts are always scored by the model
+    NEAR_DUPLICATE_COMPACT_INTERVAL_SECONDS: float = 300.0
+
+    # Asynchronous bulk scoring jobs (see app/jobs.py)
+    JOBS_ENABLED: bool = True
+    JOBS_DIR: str = os.path.join(BASE_DIR, ".jobs") # Job store database, uploads and checkpointed results
+    JOB_CHUNK_SIZE: int = 256 # Rows read, scored and checkpointed together
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_LEASE_SECONDS: float = 120.0 # A running job whose worker stopped heartbeating for this long is resumed elsewhere
+
+    # Live scoring over WebSocket (see app/incremental.py)
+    INCREMENTAL_DEBOUNCE_MS: float = 300.0 # Quiet period after the last edit before the document is re-scored
+    INCREMENTAL_MAX_DELAY_MS: float = 2000.0 # Re-score at least this often while edits keep arriving
+    INCREMENTAL_MAX_CHARS: int = 1000000 # Largest document a session may hold
+    INCREMENTAL_CACHED_WINDOWS: int = 256 # Window scores remembered per session beyond the current ones
+
+    # Cascaded early exit: a cheap first stage decides confident texts, the rest go to the full model
+    CASCADE_ENABLED: bool = False
+    CASCADE_PREFIX_TOKENS: int = 128 # First-stage input length, special tokens included
+    CASCADE_MODEL_NAME: str | None = None # Smaller (e.g. distilled) first-stage model sharing the main tokenizer; unset runs the main model on the prefix
+    CASCADE_LOWER: float = 0.05 # Texts with softmax_score_class_1 in [LOWER, UPPER] are escalated to the full model
+    CASCADE_UPPER: float = 0.95
+    CASCADE_THRESHOLDS_PATH: str | None = None # JSON written by app.calibration; overrides CASCADE_LOWER/UPPER
+    CASCADE_MAX_ACCURACY_LOSS: float = 0.005 # Budget app.calibration picks the band for
+
 @lru_cache()
 def get_settings() -> Settings:
     """Returns the cached application settings."""
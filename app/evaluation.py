@@ -0,0 +1,361 @@
+# app/evaluation.py
+"""
+Compares serving configurations on a labeled held-out set: accuracy against speed.
+
+    python -m app.evaluation held_out.csv --label-column label \
+        --config baseline \
+        --config onnx INFERENCE_BACKEND=onnx \
+        --config short MODEL_MAX_LENGTH=256 \
+        --config student MODEL_NAME=./saved_model_ai_student \
+        --output evaluation.json
+
+Each --config is a name followed by settings overrides, applied as
+environment variables to a fresh process that loads TextDetectionService
+exactly as the API would. Every text is scored in batches of --batch-size
+to measure throughput, and the first --latency-samples texts are then
+scored one at a time for latency percentiles. Class probabilities and
+timings are cached in --cache-dir per configuration, keyed by the input
+file, the preprocessing code, the model files and the scoring settings, so
+unchanged configurations are not scored again (pass --refresh to re-measure).
+
+The table reports weighted F1 (as in training), ROC-AUC, expected
+calibration error, false-positive rate (human texts flagged as
+AI-generated), throughput and latency, and marks the configurations on the
+Pareto front of F1 against throughput.
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+# Bump whenever scoring or the cached entry layout changes so stale entries are ignored
+_CACHE_VERSION = 2
+# Settings that change the scores or the timings of a configuration
+_SCORING_SETTINGS = (
+    "MODEL_NAME", "MODEL_REVISION", "MODEL_LOCAL_DIR", "MODEL_MAX_LENGTH", "MODEL_ATTN_IMPLEMENTATION",
+    "LENGTH_BUCKETS", "INFERENCE_BACKEND", "BATCH_MAX_SIZE", "TORCH_NUM_THREADS",
+    "LONG_DOCUMENT_WINDOW_STRIDE", "LONG_DOCUMENT_MAX_WINDOWS",
+    "CASCADE_ENABLED", "CASCADE_MODEL_NAME", "CASCADE_PREFIX_TOKENS", "CASCADE_LOWER", "CASCADE_UPPER",
+    "CASCADE_THRESHOLDS_PATH", "AUTOTUNE_ENABLED", "INFERENCE_EXECUTOR",
+)
+_ECE_BINS = 10
+
+
+def roc_auc(scores: np.ndarray, labels: np.ndarray) -> float | None:
+    """Area under the ROC curve from the rank-sum statistic; ties count half. None with a single class."""
+    positives = labels == 1
+    n_positive, n_negative = int(positives.sum()), int((~positives).sum())
+    if n_positive == 0 or n_negative == 0:
+        return None
+    _, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+    # Tied scores share the average of the ranks they span
+    average_ranks = np.cumsum(counts) - (counts - 1) / 2
+    rank_sum = average_ranks[inverse][positives].sum()
+    return float((rank_sum - n_positive * (n_positive + 1) / 2) / (n_positive * n_negative))
+
+
+def expected_calibration_error(probabilities: np.ndarray, labels: np.ndarray, bins: int = _ECE_BINS) -> float:
+    """Gap between confidence and accuracy, averaged over equal-width confidence bins weighted by size."""
+    confidence = probabilities.max(axis=1)
+    correct = probabilities.argmax(axis=1) == labels
+    bin_index = np.minimum((confidence * bins).astype(np.int64), bins - 1)
+    error = 0.0
+    for b in range(bins):
+        in_bin = bin_index == b
+        if in_bin.any():
+            error += in_bin.mean() * abs(confidence[in_bin].mean() - correct[in_bin].mean())
+    return float(error)
+
+
+def classification_metrics(probabilities: np.ndarray, labels: np.ndarray) -> Dict[str, Any]:
+    """Accuracy metrics of (n, 2) class probabilities against 0/1 labels (1 = AI-generated)."""
+    predictions = probabilities.argmax(axis=1)
+    f1_scores, supports = [], []
+    for label in (0, 1):
+        true_positive = int(((predictions == label) & (labels == label)).sum())
+        predicted = int((predictions == label).sum())
+        actual = int((labels == label).sum())
+        precision = true_positive / predicted if predicted else 0.0
+        recall = true_positive / actual if actual else 0.0
+        f1_scores.append(2 * precision * recall / (precision + recall) if precision + recall else 0.0)
+        supports.append(actual)
+    negatives = labels == 0
+    return {
+        "samples": int(len(labels)),
+        "accuracy": float((predictions == labels).mean()),
+        "f1": float(np.average(f1_scores, weights=supports)) if sum(supports) else 0.0,
+        "roc_auc": roc_auc(probabilities[:, 1], labels),
+        "ece": expected_calibration_error(probabilities, labels),
+        "fpr": float((predictions[negatives] == 1).mean()) if negatives.any() else None,
+    }
+
+
+def pareto_front(rows: List[Dict[str, Any]]) -> List[bool]:
+    """Flags rows no other row beats on both F1 and throughput (and matches or beats on the other)."""
+    flags = []
+    for row in rows:
+        dominated = any(
+            other["f1"] >= row["f1"] and other["throughput"] >= row["throughput"]
+            and (other["f1"] > row["f1"] or other["throughput"] > row["throughput"])
+            for other in rows
+        )
+        flags.append(not dominated)
+    return flags
+
+
+def _file_fingerprint(path: str) -> Any:
+    """Path, sizes and times of a file or of every file in a directory; other values (Hub ids) as is."""
+    if os.path.isdir(path):
+        files = []
+        for name in sorted(os.listdir(path)):
+            stat = os.stat(os.path.join(path, name))
+            files.append([name, stat.st_size, int(stat.st_mtime)])
+        return [os.path.abspath(path), files]
+    if os.path.isfile(path):
+        return [os.path.abspath(path), os.stat(path).st_size, int(os.stat(path).st_mtime)]
+    return path
+
+
+def _cascade_thresholds() -> Any:
+    """The band read from CASCADE_THRESHOLDS_PATH, which can be recalibrated in place; its path if unreadable."""
+    from app.calibration import load_thresholds
+
+    if not settings.CASCADE_THRESHOLDS_PATH:
+        return None
+    try:
+        return list(load_thresholds(settings.CASCADE_THRESHOLDS_PATH))
+    except (OSError, ValueError, KeyError):
+        return settings.CASCADE_THRESHOLDS_PATH
+
+
+def configuration_key(args: argparse.Namespace) -> str:
+    """Identifies the cached scores of the current process's settings on the input."""
+    from app.services import normalize_text
+
+    description = {
+        "version": _CACHE_VERSION,
+        "input": _file_fingerprint(args.input),
+        "columns": [args.text_column, args.label_column],
+        "limit": args.limit,
+        "long_document": args.long_document,
+        "aggregation": args.aggregation,
+        "batch_size": args.batch_size,
+        "latency_samples": args.latency_samples,
+        "preprocessing": hashlib.sha256(inspect.getsource(normalize_text).encode("utf-8")).hexdigest(),
+        "model": _file_fingerprint(settings.MODEL_LOCAL_DIR or settings.MODEL_NAME),
+        "cascade_model": _file_fingerprint(settings.CASCADE_MODEL_NAME) if settings.CASCADE_MODEL_NAME else None,
+        "cascade_thresholds": _cascade_thresholds(),
+        "settings": {name: getattr(settings, name) for name in _SCORING_SETTINGS},
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def read_labeled_texts(args: argparse.Namespace) -> Tuple[List[str], np.ndarray]:
+    """Reads the texts with usable text and a label, up to --limit."""
+    from app.jobs import JOB_FORMATS, detect_format, has_text, iter_input_chunks
+
+    input_format = args.input_format or detect_format(args.input)
+    if input_format not in JOB_FORMATS:
+        raise SystemExit(f"Cannot detect the format of {args.input}; pass --input-format ({', '.join(JOB_FORMATS)}).")
+    texts: List[str] = []
+    labels: List[int] = []
+    # The label column rides along in the id slot of each input row
+    for chunk in iter_input_chunks(Path(args.input), input_format, args.text_column, args.label_column, 0, args.chunk_size):
+        for _, text, label in chunk:
+            if has_text(text) and label is not None:
+                texts.append(text)
+                labels.append(int(label))
+        if args.limit and len(texts) >= args.limit:
+            break
+    if args.limit:
+        texts, labels = texts[:args.limit], labels[:args.limit]
+    if not texts:
+        raise SystemExit(f"{args.input} has no labeled rows with text to evaluate on.")
+    return texts, np.array(labels, dtype=np.int64)
+
+
+def score_configuration(args: argparse.Namespace) -> Path:
+    """
+    Scores the input under this process's settings, or reuses the cached
+    entry, and returns the path of the entry's JSON file.
+    """
+    cache_dir = Path(args.cache_dir)
+    key = configuration_key(args)
+    entry = cache_dir / f"{key}.json"
+    if entry.exists() and not args.refresh:
+        return entry
+
+    from app.services import get_text_detection_service
+
+    texts, labels = read_labeled_texts(args)
+    service = get_text_detection_service()
+    service.load()
+    options = {"long_document": args.long_document, "aggregation": args.aggregation}
+
+    probabilities = np.zeros((len(texts), 2), dtype=np.float32)
+    started = time.perf_counter()
+    for start in range(0, len(texts), args.batch_size):
+        results = service.predict_batch(texts[start:start + args.batch_size], **options)
+        probabilities[start:start + len(results)] = [
+            (result["softmax_score_class_0"], result["softmax_score_class_1"]) for result in results
+        ]
+    elapsed = time.perf_counter() - started
+
+    latencies = []
+    for text in texts[:args.latency_samples]:
+        request_started = time.perf_counter()
+        service.predict(text, **options)
+        latencies.append((time.perf_counter() - request_started) * 1000)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    np.savez(cache_dir / f"{key}.npz", probabilities=probabilities, labels=labels)
+    timing = {
+        "key": key,
+        "measured_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "model": settings.MODEL_LOCAL_DIR or settings.MODEL_NAME,
+        "inference_backend": settings.INFERENCE_BACKEND,
+        "device": settings.DEVICE,
+        "throughput": len(texts) / elapsed,
+        "latency_p50_ms": float(np.percentile(latencies, 50)) if latencies else None,
+        "latency_p95_ms": float(np.percentile(latencies, 95)) if latencies else None,
+        "latency_p99_ms": float(np.percentile(latencies, 99)) if latencies else None,
+    }
+    # Written last: the JSON file marks a complete entry
+    tmp_path = entry.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(timing, indent=2))
+    os.replace(tmp_path, entry)
+    return entry
+
+
+def _parse_config(values: List[str]) -> Tuple[str, Dict[str, str]]:
+    name, *assignments = values
+    overrides = {}
+    for assignment in assignments:
+        key, separator, value = assignment.partition("=")
+        if not separator or not key:
+            raise SystemExit(f"Invalid override '{assignment}' for configuration '{name}'; expected KEY=VALUE.")
+        overrides[key.upper()] = value
+    return name, overrides
+
+
+def _worker_argv(args: argparse.Namespace) -> List[str]:
+    """The scoring options shared by every configuration, as command-line arguments for a worker."""
+    argv = [
+        args.input,
+        "--label-column", args.label_column,
+        "--text-column", args.text_column,
+        "--batch-size", str(args.batch_size),
+        "--latency-samples", str(args.latency_samples),
+        "--aggregation", args.aggregation,
+        "--chunk-size", str(args.chunk_size),
+        "--cache-dir", args.cache_dir,
+    ]
+    if args.input_format:
+        argv += ["--input-format", args.input_format]
+    if args.limit:
+        argv += ["--limit", str(args.limit)]
+    if args.long_document:
+        argv.append("--long-document")
+    if args.refresh:
+        argv.append("--refresh")
+    return argv
+
+
+def _run_configuration(args: argparse.Namespace, name: str, overrides: Dict[str, str]) -> Path:
+    """Scores one configuration in a fresh process, so its settings and model never leak into the next."""
+    env = {**os.environ, **overrides, "CACHE_ENABLED": "false", "NEAR_DUPLICATE_ENABLED": "false", "JOBS_ENABLED": "false"}
+    with tempfile.NamedTemporaryFile("r", suffix=".txt") as result:
+        command = [sys.executable, "-m", "app.evaluation", *_worker_argv(args), "--worker-output", result.name]
+        print(f"Evaluating {name} ({', '.join(f'{k}={v}' for k, v in overrides.items()) or 'current settings'})", file=sys.stderr)
+        completed = subprocess.run(command, env=env)
+        if completed.returncode != 0:
+            raise SystemExit(f"Evaluating configuration '{name}' failed with exit code {completed.returncode}.")
+        return Path(Path(result.name).read_text().strip())
+
+
+def evaluate(args: argparse.Namespace) -> Dict[str, Any]:
+    """Scores (or loads) every configuration and returns the comparison report."""
+    configurations = [_parse_config(values) for values in args.config or [["current"]]]
+    rows = []
+    for name, overrides in configurations:
+        entry = _run_configuration(args, name, overrides)
+        timing = json.loads(entry.read_text())
+        with np.load(entry.with_suffix(".npz")) as scores:
+            metrics = classification_metrics(scores["probabilities"], scores["labels"])
+        rows.append({"name": name, "overrides": overrides, **metrics, **timing})
+    for row, optimal in zip(rows, pareto_front(rows)):
+        row["pareto"] = optimal
+    return {
+        "input": args.input,
+        "long_document": args.long_document,
+        "batch_size": args.batch_size,
+        "configurations": rows,
+    }
+
+
+def print_table(report: Dict[str, Any]):
+    """Prints one line per configuration; * marks the Pareto front of F1 against throughput."""
+    def number(value: float | None, digits: int = 4) -> str:
+        return "-" if value is None else f"{value:.{digits}f}"
+
+    print(
+        f"{'configuration':<20}{'f1':>8}{'roc_auc':>9}{'ece':>8}{'fpr':>8}"
+        f"{'texts/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  pareto"
+    )
+    for row in report["configurations"]:
+        print(
+            f"{row['name']:<20}{number(row['f1']):>8}{number(row['roc_auc']):>9}{number(row['ece']):>8}"
+            f"{number(row['fpr']):>8}{number(row['throughput'], 1):>10}{number(row['latency_p50_ms'], 2):>9}"
+            f"{number(row['latency_p95_ms'], 2):>9}{number(row['latency_p99_ms'], 2):>9}  {'*' if row['pareto'] else ''}"
+        )
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.evaluation", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("input", help="CSV, Parquet or JSONL file of held-out texts.")
+    parser.add_argument("--label-column", required=True, help="0/1 labels (1 = AI-generated).")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--input-format", help="Overrides the format detected from the file extension.")
+    parser.add_argument("--config", nargs="+", action="append", metavar="NAME [KEY=VALUE ...]",
+                        help="A configuration to compare: a name followed by settings overrides. Repeatable.")
+    parser.add_argument("--batch-size", type=int, default=settings.BATCH_MAX_SIZE, help="Texts per batched call.")
+    parser.add_argument("--latency-samples", type=int, default=200, help="Texts scored one at a time for latency.")
+    parser.add_argument("--long-document", action="store_true", help="Score whole texts with overlapping windows.")
+    parser.add_argument("--aggregation", default="mean", choices=("mean", "max", "length_weighted"))
+    parser.add_argument("--limit", type=int, help="Evaluate on at most this many texts.")
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--cache-dir", default=".evaluation_cache")
+    parser.add_argument("--refresh", action="store_true", help="Re-score configurations even when cached.")
+    parser.add_argument("--output", help="Also write the report as JSON here.")
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker_output:
+        # Worker mode: score the configuration given by the environment and report the cache entry
+        settings.CACHE_ENABLED = False
+        settings.NEAR_DUPLICATE_ENABLED = False
+        Path(args.worker_output).write_text(str(score_configuration(args)))
+        return
+
+    report = evaluate(args)
+    print_table(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Wrote evaluation report to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
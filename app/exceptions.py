@@ -14,4 +14,62 @@ class ModelLoadError(RuntimeError):
 class EmptyInputError(HTTPException):
     """Indicates invalid empty input provided by the client."""
     def __init__(self, detail: str = "Input text cannot be empty or contain only whitespace."):
-        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
\ No newline at end of file
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+class ServiceOverloadedError(HTTPException):
+    """Indicates the inference executor is saturated and the client should retry later."""
+    def __init__(self, detail: str = "Service is overloaded, please retry later.", retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+class ServiceNotReadyError(HTTPException):
+    """Indicates the model is still loading or warming up."""
+    def __init__(self, detail: str = "Model is still loading, please retry shortly.", retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+class DeadlineExceededError(HTTPException):
+    """Indicates the client's deadline passed before the request could be scored."""
+    def __init__(self, detail: str = "Request deadline exceeded before it could be scored."):
+        super().__init__(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=detail)
+
+class QuotaExceededError(HTTPException):
+    """Indicates a client exceeded its concurrency or token quota."""
+    def __init__(self, detail: str = "Client quota exceeded, please retry later.", retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+class UnknownModelError(HTTPException):
+    """Indicates a request for a model name that is not in the registry."""
+    def __init__(self, name: str, available: list[str] | None = None):
+        detail = f"Model '{name}' is not registered."
+        if available:
+            detail += f" Available models: {', '.join(sorted(available))}."
+        super().__init__(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+
+class JobNotFoundError(HTTPException):
+    """Indicates an unknown bulk scoring job id."""
+    def __init__(self, job_id: str):
+        super().__init__(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job '{job_id}' not found.")
+
+class JobNotFinishedError(HTTPException):
+    """Indicates results were requested for a job that has not completed."""
+    def __init__(self, job_id: str, job_status: str):
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job '{job_id}' is {job_status}; results are available once it has completed.",
+        )
+
+class UnsupportedJobInputError(HTTPException):
+    """Indicates an uploaded job file in a format that cannot be read."""
+    def __init__(self, detail: str = "Upload a .csv, .parquet or .jsonl file."):
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
@@ -0,0 +1,307 @@
+# app/incremental.py
+import asyncio
+import json
+import logging
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.config import settings
+from app.exceptions import ModelInferenceError, ServiceNotReadyError, UnknownModelError
+from app.metrics import INCREMENTAL_SESSIONS, INCREMENTAL_WINDOWS
+from app.registry import ModelSpec, aggregate_windows, format_result
+from app.scheduler import RequestContext
+from app.services import TextDetectionService, normalize_text
+
+if TYPE_CHECKING:
+    from transformers import PreTrainedTokenizer
+
+logger = logging.getLogger(__name__)
+
+# Blocks end after sentence punctuation or a line break, so a typical edit touches one or two of them
+_BLOCK_END = re.compile(r"[.!?]+(?=\s)|\n")
+# Once a window is half full, a block whose hash is divisible by this closes it. Cuts depend only on
+# block content, so window boundaries after an edit fall back into step with the previous ones.
+_CUT_MODULUS = 4
+
+# WebSocket close codes
+_CLOSE_POLICY_VIOLATION = 1008
+_CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class _Block(NamedTuple):
+    text: str # Normalized
+    char_start: int
+    char_end: int
+
+
+class _Window(NamedTuple):
+    sequence: List[int] # Special tokens included
+    content_tokens: int
+    char_start: int
+    char_end: int
+
+
+def split_blocks(text: str) -> List[_Block]:
+    """Splits raw text into sentence/line blocks with their character spans, dropping empty ones."""
+    blocks = []
+    start = 0
+    for match in _BLOCK_END.finditer(text):
+        blocks.append((start, match.end()))
+        start = match.end()
+    blocks.append((start, len(text)))
+    result = []
+    for block_start, block_end in blocks:
+        normalized = normalize_text(text[block_start:block_end])
+        if normalized:
+            result.append(_Block(normalized, block_start, block_end))
+    return result
+
+
+def _special_tokens(tokenizer: "PreTrainedTokenizer") -> Tuple[List[int], List[int]]:
+    """The token ids the tokenizer adds before and after a sequence's content."""
+    content = tokenizer("text", add_special_tokens=False)["input_ids"]
+    full = tokenizer("text")["input_ids"]
+    for start in range(len(full) - len(content) + 1):
+        if full[start:start + len(content)] == content:
+            return full[:start], full[start + len(content):]
+    raise ValueError(f"Cannot locate the special tokens of {tokenizer.name_or_path}.")
+
+
+class IncrementalSession:
+    """
+    Document state of one live-scoring WebSocket session.
+
+    The text is split into sentence/line blocks, each tokenized once and
+    cached by its content, and consecutive blocks are packed into windows of
+    at most MODEL_MAX_LENGTH tokens. Window boundaries are content-defined, so
+    an edit changes only the windows around it, and windows are scored once
+    and cached by their token ids: the work per update scales with the size
+    of the edit rather than the document.
+    """
+
+    def __init__(
+        self,
+        spec: ModelSpec,
+        tokenizer: "PreTrainedTokenizer",
+        aggregation: str = "mean",
+        context: RequestContext | None = None,
+    ):
+        self.spec = spec
+        self.aggregation = aggregation
+        self.context = context
+        self.text = ""
+        self.revision = 0 # Number of edits applied; echoed in every score update
+        self._tokenizer = tokenizer
+        self._prefix, self._suffix = _special_tokens(tokenizer)
+        self._block_tokens: Dict[str, List[int]] = {}
+        self._window_scores: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+
+    def apply(self, message: Dict[str, Any]):
+        """
+        Applies one edit message to the document. Raises ValueError for a
+        malformed message or one that would exceed INCREMENTAL_MAX_CHARS.
+        """
+        if not isinstance(message, dict):
+            raise ValueError("Messages must be JSON objects.")
+        kind = message.get("type")
+        replacement = message.get("text")
+        if not isinstance(replacement, str):
+            raise ValueError(f"A '{kind}' message needs a 'text' string.")
+        if kind == "set":
+            text = replacement
+        elif kind == "edit":
+            start, end = message.get("start"), message.get("end")
+            if not (isinstance(start, int) and isinstance(end, int) and 0 <= start <= end <= len(self.text)):
+                raise ValueError(f"Edit range must satisfy 0 <= start <= end <= {len(self.text)}.")
+            text = self.text[:start] + replacement + self.text[end:]
+        else:
+            raise ValueError(f"Unknown message type '{kind}'; expected 'set', 'edit' or 'flush'.")
+        if len(text) > settings.INCREMENTAL_MAX_CHARS:
+            raise ValueError(f"Documents are limited to {settings.INCREMENTAL_MAX_CHARS} characters.")
+        self.text = text
+        self.revision += 1
+
+    def _plan(self) -> Tuple[List[_Window], int]:
+        """Returns the current windows and how many blocks had to be tokenized for them."""
+        blocks = split_blocks(self.text)
+        block_tokens: Dict[str, List[int]] = {}
+        new_blocks = list(dict.fromkeys(block.text for block in blocks if block.text not in self._block_tokens))
+        if new_blocks:
+            encodings = self._tokenizer(new_blocks, add_special_tokens=False)["input_ids"]
+            block_tokens.update(zip(new_blocks, encodings))
+        # Only the current blocks are kept, so the cache never outgrows the document
+        for block in blocks:
+            if block.text not in block_tokens:
+                block_tokens[block.text] = self._block_tokens[block.text]
+        self._block_tokens = block_tokens
+
+        budget = max(1, settings.MODEL_MAX_LENGTH - len(self._prefix) - len(self._suffix))
+        windows: List[_Window] = []
+        content: List[int] = []
+        span = None
+
+        def close():
+            nonlocal content, span
+            if content:
+                windows.append(_Window(self._prefix + content + self._suffix, len(content), *span))
+            content, span = [], None
+
+        for block in blocks:
+            tokens = block_tokens[block.text]
+            if len(tokens) > budget:
+                # A block longer than a window gets overlapping windows of its own, like long documents
+                close()
+                step = max(1, budget - settings.LONG_DOCUMENT_WINDOW_STRIDE)
+                for start in range(0, max(1, len(tokens) - settings.LONG_DOCUMENT_WINDOW_STRIDE), step):
+                    content, span = tokens[start:start + budget], (block.char_start, block.char_end)
+                    close()
+                continue
+            if len(content) + len(tokens) > budget:
+                close()
+            content = content + tokens
+            span = (span[0] if span else block.char_start, block.char_end)
+            if len(content) >= budget // 2 and zlib.crc32(block.text.encode("utf-8")) % _CUT_MODULUS == 0:
+                close()
+        close()
+
+        if len(windows) > settings.LONG_DOCUMENT_MAX_WINDOWS:
+            logger.warning(
+                f"Live document produced {len(windows)} windows, scoring only the first {settings.LONG_DOCUMENT_MAX_WINDOWS}."
+            )
+            windows = windows[:settings.LONG_DOCUMENT_MAX_WINDOWS]
+        return windows, len(new_blocks)
+
+    async def score(self, service: TextDetectionService) -> Dict[str, Any]:
+        """Scores the current document, running the model only on windows not scored before."""
+        started = time.perf_counter()
+        revision = self.revision
+        windows, tokenized_blocks = await asyncio.to_thread(self._plan)
+        keys = [np.asarray(window.sequence, dtype=np.int32).tobytes() for window in windows]
+        missing = list(dict.fromkeys(key for key in keys if key not in self._window_scores))
+        reused = {key for key in keys if key not in missing}
+        if missing:
+            sequences = {key: window.sequence for key, window in zip(keys, windows)}
+            probabilities = await service.score_sequences_async([sequences[key] for key in missing], self.spec, self.context)
+            self._window_scores.update(zip(missing, probabilities))
+        for key in keys:
+            self._window_scores.move_to_end(key)
+        # Recently displaced windows stay cached too, so undoing an edit is free
+        while len(self._window_scores) > max(settings.INCREMENTAL_CACHED_WINDOWS, len(keys)):
+            self._window_scores.popitem(last=False)
+        INCREMENTAL_WINDOWS.labels(outcome="rescored").inc(len(missing))
+        INCREMENTAL_WINDOWS.labels(outcome="reused").inc(len(keys) - len(missing))
+
+        update: Dict[str, Any] = {"type": "scores", "revision": revision}
+        if windows:
+            probabilities = np.stack([self._window_scores[key] for key in keys])
+            lengths = np.array([window.content_tokens for window in windows], dtype=np.float32)
+            update.update(format_result(aggregate_windows(probabilities, lengths, self.aggregation)))
+        update["windows"] = [
+            {
+                "index": index,
+                "char_start": window.char_start,
+                "char_end": window.char_end,
+                "softmax_score_class_0": float(row[0]),
+                "softmax_score_class_1": float(row[1]),
+                "reused": key in reused,
+            }
+            for index, (window, key, row) in enumerate(zip(windows, keys, (self._window_scores[key] for key in keys)))
+        ]
+        update["stats"] = {
+            "windows": len(windows),
+            "rescored": len(missing),
+            "reused": len(windows) - len(missing),
+            "tokenized_blocks": tokenized_blocks,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        return update
+
+
+async def run_session(
+    websocket: WebSocket,
+    service: TextDetectionService,
+    model: str | None,
+    aggregation: str,
+    context: RequestContext | None = None,
+):
+    """
+    Serves one live-scoring connection. The client sends
+    {"type": "set", "text": ...} to replace the document,
+    {"type": "edit", "start": ..., "end": ..., "text": ...} to replace the
+    characters [start, end), and {"type": "flush"} to be scored immediately.
+    Edits are applied as they arrive and scored once none has arrived for
+    INCREMENTAL_DEBOUNCE_MS (or INCREMENTAL_MAX_DELAY_MS after the first
+    unscored edit while typing continues). Each update is sent back as a
+    "scores" message tagged with the revision it reflects.
+    """
+    await websocket.accept()
+    try:
+        service.check_ready()
+        spec = service.registry.resolve(model)
+        tokenizer = (await asyncio.to_thread(service.registry.tokenizer_model, spec)).tokenizer
+    except (ServiceNotReadyError, UnknownModelError) as e:
+        code = _CLOSE_TRY_AGAIN_LATER if isinstance(e, ServiceNotReadyError) else _CLOSE_POLICY_VIOLATION
+        await websocket.close(code=code, reason=str(e.detail))
+        return
+    session = IncrementalSession(spec, tokenizer, aggregation, context)
+
+    # Messages are read on their own task so a slow scoring pass never blocks the socket
+    messages: asyncio.Queue = asyncio.Queue()
+
+    async def read():
+        try:
+            while True:
+                raw = await websocket.receive_text()
+                try:
+                    await messages.put(json.loads(raw))
+                except json.JSONDecodeError as e:
+                    await messages.put(ValueError(f"Invalid JSON: {e}"))
+        except WebSocketDisconnect:
+            await messages.put(None)
+
+    loop = asyncio.get_running_loop()
+    reader = loop.create_task(read())
+    INCREMENTAL_SESSIONS.inc()
+    first_pending = last_edit = None
+    try:
+        while True:
+            timeout = None
+            if last_edit is not None:
+                due = min(
+                    last_edit + settings.INCREMENTAL_DEBOUNCE_MS / 1000,
+                    first_pending + settings.INCREMENTAL_MAX_DELAY_MS / 1000,
+                )
+                timeout = max(0.0, due - loop.time())
+            try:
+                message = await asyncio.wait_for(messages.get(), timeout)
+            except asyncio.TimeoutError:
+                message = {"type": "flush"}
+            if message is None:
+                break
+            if isinstance(message, dict) and message.get("type") == "flush":
+                first_pending = last_edit = None
+                try:
+                    await websocket.send_json(await session.score(service))
+                except (ModelInferenceError, ServiceNotReadyError) as e:
+                    await websocket.send_json({"type": "error", "revision": session.revision, "detail": e.detail})
+                continue
+            try:
+                if isinstance(message, Exception):
+                    raise message
+                session.apply(message)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "revision": session.revision, "detail": str(e)})
+                continue
+            last_edit = loop.time()
+            first_pending = first_pending or last_edit
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        INCREMENTAL_SESSIONS.dec()
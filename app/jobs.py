@@ -0,0 +1,475 @@
+# app/jobs.py
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from app.config import settings
+from app.scheduler import BACKGROUND, BACKGROUND_CONTEXT, in_flight_limit
+
+logger = logging.getLogger(__name__)
+
+JOB_FORMATS = ("csv", "parquet", "jsonl")
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+_CHECKPOINT_FILE = "results.checkpoint.jsonl"
+_SCORE_COLUMNS = ("predicted_class", "predicted_label", "softmax_score_class_0", "softmax_score_class_1")
+RESULT_COLUMNS = ["row", "id", *_SCORE_COLUMNS, "error"]
+MISSING_TEXT_ERROR = "Text is missing or empty."
+
+# One input row: (row number, text or None if missing, id column value)
+InputRow = Tuple[int, Any, Any]
+
+
+def has_text(text: Any) -> bool:
+    return isinstance(text, str) and bool(text.strip())
+
+
+def result_row(row: int, row_id: Any, outcome: Dict[str, Any] | Exception | str) -> Dict[str, Any]:
+    """Flattens one prediction (or an error) into an output row with RESULT_COLUMNS."""
+    line = dict.fromkeys(RESULT_COLUMNS) | {"row": row, "id": row_id}
+    if isinstance(outcome, dict):
+        line.update({column: outcome[column] for column in _SCORE_COLUMNS})
+    elif isinstance(outcome, Exception):
+        line["error"] = getattr(outcome, "detail", None) or str(outcome)
+    else:
+        line["error"] = outcome
+    return line
+
+
+def result_schema(id_type: Any = None):
+    """Arrow schema of the result columns. Only the id column's type depends on the input."""
+    import pyarrow as pa
+
+    return pa.schema([
+        ("row", pa.int64()), ("id", id_type or pa.string()),
+        ("predicted_class", pa.int64()), ("predicted_label", pa.string()),
+        ("softmax_score_class_0", pa.float64()), ("softmax_score_class_1", pa.float64()), ("error", pa.string()),
+    ])
+
+
+def detect_format(filename: str) -> str | None:
+    """Maps an uploaded file name to one of JOB_FORMATS."""
+    suffix = Path(filename or "").suffix.lower().lstrip(".")
+    return {"pq": "parquet", "ndjson": "jsonl"}.get(suffix, suffix) if suffix else None
+
+
+class JobStore:
+    """
+    SQLite-backed job table plus one directory per job holding the upload,
+    the results checkpoint and the final results file. Several serving
+    workers can share one store; jobs are handed out through an atomic claim.
+    """
+
+    _COLUMNS = (
+        "id", "status", "input_format", "text_column", "id_column", "long_document",
+        "total_rows", "processed_rows", "failed_rows", "owner", "heartbeat_at",
+        "created_at", "started_at", "finished_at", "run_started_at", "run_start_row", "error",
+    )
+
+    def __init__(self, root: str):
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self._root / "jobs.db", check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                input_format TEXT NOT NULL,
+                text_column TEXT NOT NULL,
+                id_column TEXT,
+                long_document INTEGER NOT NULL DEFAULT 0,
+                total_rows INTEGER,
+                processed_rows INTEGER NOT NULL DEFAULT 0,
+                failed_rows INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                heartbeat_at REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                run_started_at REAL,
+                run_start_row INTEGER,
+                error TEXT
+            )
+            """
+        )
+
+    def job_dir(self, job_id: str) -> Path:
+        return self._root / job_id
+
+    def input_path(self, job: Dict[str, Any]) -> Path:
+        return self.job_dir(job["id"]) / f"input.{job['input_format']}"
+
+    def results_path(self, job: Dict[str, Any]) -> Path:
+        return self.job_dir(job["id"]) / f"results.{job['input_format']}"
+
+    def new_job_id(self) -> str:
+        job_id = uuid.uuid4().hex
+        self.job_dir(job_id).mkdir(parents=True)
+        return job_id
+
+    def create(self, job_id: str, input_format: str, text_column: str, id_column: str | None, long_document: bool):
+        """Queues a job whose input file has already been written to its directory."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, input_format, text_column, id_column, long_document, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, STATUS_QUEUED, input_format, text_column, id_column, int(long_document), time.time()),
+            )
+
+    def get(self, job_id: str) -> Dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(self._COLUMNS, row)) if row else None
+
+    def claim(self, owner: str) -> Dict[str, Any] | None:
+        """
+        Atomically takes the oldest queued job, or a running job whose owner
+        has died or stopped heartbeating, and marks it as running for `owner`.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                candidates = self._db.execute(
+                    "SELECT id, status, owner, heartbeat_at FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                    (STATUS_QUEUED, STATUS_RUNNING),
+                ).fetchall()
+                job_id = next(
+                    (
+                        job_id for job_id, status, job_owner, heartbeat_at in candidates
+                        if status == STATUS_QUEUED or self._is_stale(job_owner, heartbeat_at, now)
+                    ),
+                    None,
+                )
+                if job_id is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, heartbeat_at = ?, started_at = COALESCE(started_at, ?), "
+                        "run_started_at = ?, run_start_row = processed_rows WHERE id = ?",
+                        (STATUS_RUNNING, owner, now, now, now, job_id),
+                    )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(job_id) if job_id is not None else None
+
+    @staticmethod
+    def _is_stale(owner: str | None, heartbeat_at: float | None, now: float) -> bool:
+        if heartbeat_at is None or now - heartbeat_at > settings.JOB_LEASE_SECONDS:
+            return True
+        # A worker on this host that no longer exists can be taken over without waiting for the lease
+        host, _, pid = (owner or "").rpartition(":")
+        if host != socket.gethostname() or not pid.isdigit():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+        return False
+
+    def update(self, job_id: str, **fields: Any):
+        """Sets the given columns and refreshes the job's heartbeat."""
+        fields["heartbeat_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def release(self, owner: str):
+        """Puts this owner's running jobs back in the queue so another worker can resume them immediately."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, owner = NULL WHERE status = ? AND owner = ?",
+                (STATUS_QUEUED, STATUS_RUNNING, owner),
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def count_rows(path: Path, input_format: str, text_column: str) -> int:
+    """Counts input rows without holding the file in memory."""
+    if input_format == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    if input_format == "csv":
+        import pandas as pd
+        return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[text_column], chunksize=50_000, dtype=str))
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def iter_input_chunks(
+    path: Path, input_format: str, text_column: str, id_column: str | None, start_row: int, chunk_size: int
+) -> Iterator[List[InputRow]]:
+    """Reads the input incrementally from `start_row`, yielding chunks of (row, text, id)."""
+    if input_format == "csv":
+        import pandas as pd
+        columns = [text_column] + ([id_column] if id_column else [])
+        reader = pd.read_csv(
+            path, usecols=columns, dtype=str, keep_default_na=False,
+            skiprows=range(1, start_row + 1), chunksize=chunk_size,
+        )
+        row = start_row
+        for frame in reader:
+            # Resuming past the last row leaves pandas a single empty frame
+            if frame.empty:
+                continue
+            ids = frame[id_column].tolist() if id_column else [None] * len(frame)
+            yield [(row + i, text, ids[i]) for i, text in enumerate(frame[text_column].tolist())]
+            row += len(frame)
+
+    elif input_format == "parquet":
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        columns = [text_column] + ([id_column] if id_column else [])
+        # Whole row groups before the resume point are skipped without being read
+        first_group, row = 0, 0
+        while first_group < parquet.num_row_groups and row + parquet.metadata.row_group(first_group).num_rows <= start_row:
+            row += parquet.metadata.row_group(first_group).num_rows
+            first_group += 1
+        groups = list(range(first_group, parquet.num_row_groups))
+        skip = start_row - row
+        for batch in parquet.iter_batches(batch_size=chunk_size, row_groups=groups, columns=columns):
+            texts = batch.column(text_column).to_pylist()
+            ids = batch.column(id_column).to_pylist() if id_column else [None] * len(texts)
+            rows = [(row + i, text, ids[i]) for i, text in enumerate(texts)][skip:]
+            row += len(texts)
+            skip = max(0, skip - len(texts))
+            if rows:
+                yield rows
+
+    else:
+        chunk: List[InputRow] = []
+        row = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                if row >= start_row:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        record = None
+                    if isinstance(record, dict):
+                        chunk.append((row, record.get(text_column), record.get(id_column) if id_column else None))
+                    else:
+                        chunk.append((row, None, None))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+                row += 1
+        if chunk:
+            yield chunk
+
+
+def recover_checkpoint(checkpoint: Path) -> Tuple[int, int]:
+    """
+    Returns (rows, failed_rows) already written to the results checkpoint,
+    truncating a trailing line that was only partially written before a crash.
+    """
+    if not checkpoint.exists():
+        return 0, 0
+    rows = failed = valid_bytes = 0
+    with open(checkpoint, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            rows += 1
+            failed += json.loads(line).get("error") is not None
+            valid_bytes += len(line)
+    if valid_bytes != checkpoint.stat().st_size:
+        logger.warning(f"Truncating partially written checkpoint {checkpoint} to {rows} rows")
+        with open(checkpoint, "r+b") as f:
+            f.truncate(valid_bytes)
+    return rows, failed
+
+
+def write_results(checkpoint: Path, target: Path, output_format: str):
+    """Converts the JSONL checkpoint into the job's output format."""
+    if output_format == "jsonl":
+        os.replace(checkpoint, target)
+        return
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pq
+
+    # The id column is left out of the explicit schema so its type is inferred from the data
+    schema = result_schema()
+    if checkpoint.stat().st_size:
+        explicit = pa.schema([field for field in schema if field.name != "id"])
+        table = pa_json.read_json(checkpoint, parse_options=pa_json.ParseOptions(explicit_schema=explicit))
+        table = table.select(RESULT_COLUMNS)
+    else:
+        table = schema.empty_table()
+
+    tmp_target = target.with_name(target.name + ".tmp")
+    if output_format == "csv":
+        pa_csv.write_csv(table, tmp_target)
+    else:
+        pq.write_table(table, tmp_target)
+    os.replace(tmp_target, target)
+    checkpoint.unlink()
+
+
+class JobRunner:
+    """
+    Background loop that claims jobs from the store and scores them through
+    the service's batched async path, checkpointing every chunk so an
+    interrupted job resumes from the last completed row.
+    """
+
+    def __init__(self, store: JobStore, service):
+        self._store = store
+        self._service = service
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self._store.release, self._owner)
+
+    async def _run(self):
+        while True:
+            if not self._service.is_ready:
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL_SECONDS)
+                continue
+            job = await asyncio.to_thread(self._store.claim, self._owner)
+            if job is None:
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL_SECONDS)
+                continue
+            try:
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Job {job['id']} failed: {e}")
+                await asyncio.to_thread(
+                    self._store.update, job["id"], status=STATUS_FAILED, error=str(e), finished_at=time.time()
+                )
+
+    async def _process(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        input_path = self._store.input_path(job)
+        checkpoint = self._store.job_dir(job_id) / _CHECKPOINT_FILE
+        results_path = self._store.results_path(job)
+        if results_path.exists() and not checkpoint.exists():
+            # The previous run wrote the results but stopped before marking the job completed
+            await asyncio.to_thread(
+                self._store.update, job_id, status=STATUS_COMPLETED, finished_at=time.time(), owner=None
+            )
+            return
+
+        processed, failed = await asyncio.to_thread(recover_checkpoint, checkpoint)
+        if processed:
+            logger.info(f"Resuming job {job_id} from row {processed}")
+        if job["total_rows"] is None:
+            total = await asyncio.to_thread(count_rows, input_path, job["input_format"], job["text_column"])
+            job["total_rows"] = total
+        await asyncio.to_thread(
+            self._store.update, job_id,
+            total_rows=job["total_rows"], processed_rows=processed, failed_rows=failed, run_start_row=processed,
+        )
+
+        chunks = iter_input_chunks(
+            input_path, job["input_format"], job["text_column"], job["id_column"], processed, settings.JOB_CHUNK_SIZE
+        )
+        with open(checkpoint, "ab") as out:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                lines = await self._score_chunk(chunk, bool(job["long_document"]))
+                out.write(b"".join(json.dumps(line).encode("utf-8") + b"\n" for line in lines))
+                out.flush()
+                # The checkpoint must be durable before progress claims those rows are done
+                await asyncio.to_thread(os.fsync, out.fileno())
+                processed += len(lines)
+                failed += sum(line["error"] is not None for line in lines)
+                await asyncio.to_thread(self._store.update, job_id, processed_rows=processed, failed_rows=failed)
+
+        await asyncio.to_thread(write_results, checkpoint, results_path, job["input_format"])
+        await asyncio.to_thread(
+            self._store.update, job_id,
+            status=STATUS_COMPLETED, total_rows=processed, finished_at=time.time(), owner=None,
+        )
+        logger.info(f"Job {job_id} completed: {processed} rows, {failed} failed")
+
+    async def _score_chunk(self, chunk: List[InputRow], long_document: bool) -> List[Dict[str, Any]]:
+        """Scores the valid rows of a chunk in one batched call; rows without usable text get an inline error."""
+        lines = [result_row(row, row_id, MISSING_TEXT_ERROR) for row, _, row_id in chunk]
+        valid = [i for i, (_, text, _) in enumerate(chunk) if has_text(text)]
+
+        # Jobs run as background work: slices never exceed the admissions that class may hold, and the
+        # micro-batcher serves queued interactive and standard requests first
+        step = in_flight_limit(BACKGROUND)
+        for start in range(0, len(valid), step):
+            indices = valid[start:start + step]
+            outcomes = await self._service.predict_many_async(
+                [{"text": chunk[i][1], "long_document": long_document} for i in indices],
+                context=BACKGROUND_CONTEXT,
+            )
+            for i, outcome in zip(indices, outcomes):
+                lines[i] = result_row(chunk[i][0], chunk[i][2], outcome)
+        return lines
+
+
+def job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Shapes a stored job row into the polling response, including progress and throughput."""
+    processed = job["processed_rows"]
+    total = job["total_rows"]
+    rows_per_second = None
+    if job["run_started_at"] is not None and job["heartbeat_at"] is not None:
+        end = job["finished_at"] or job["heartbeat_at"]
+        elapsed = end - job["run_started_at"]
+        done_this_run = processed - (job["run_start_row"] or 0)
+        if elapsed > 0 and done_this_run > 0:
+            rows_per_second = done_this_run / elapsed
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "input_format": job["input_format"],
+        "total_rows": total,
+        "processed_rows": processed,
+        "failed_rows": job["failed_rows"],
+        "progress": processed / total if total else (1.0 if job["status"] == STATUS_COMPLETED else None),
+        "rows_per_second": rows_per_second,
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+    }
+
+
+@lru_cache()
+def get_job_store() -> JobStore:
+    """Dependency injector providing the singleton JobStore instance."""
+    return JobStore(settings.JOBS_DIR)
@@ -0,0 +1,70 @@
+# app/jobs_api.py
+import asyncio
+import logging
+import shutil
+
+from fastapi import APIRouter, Depends, File, Form, UploadFile, status
+from fastapi.responses import FileResponse
+
+from app.config import settings
+from app.exceptions import JobNotFinishedError, JobNotFoundError, UnsupportedJobInputError
+from app.jobs import JOB_FORMATS, STATUS_COMPLETED, JobStore, detect_format, get_job_store, job_status
+from app.schemas import JobStatus
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+_MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet", "jsonl": "application/x-ndjson"}
+
+
+def _to_status(job: dict) -> JobStatus:
+    payload = job_status(job)
+    if job["status"] == STATUS_COMPLETED:
+        payload["results_url"] = f"{settings.API_PREFIX}/jobs/{job['id']}/results"
+    return JobStatus(**payload)
+
+
+@router.post("", response_model=JobStatus, status_code=status.HTTP_202_ACCEPTED, summary="Submit a bulk scoring job")
+async def create_job(
+    file: UploadFile = File(..., description="CSV, Parquet or JSONL file with one document per row."),
+    text_column: str = Form("text", description="Column (or JSON key) holding the text to score."),
+    id_column: str | None = Form(None, description="Optional column copied into the results to join them back."),
+    long_document: bool = Form(False, description="Score each text with overlapping windows instead of truncating it."),
+    input_format: str | None = Form(None, description="Overrides the format detected from the file extension."),
+    store: JobStore = Depends(get_job_store),
+) -> JobStatus:
+    """Stores the upload and queues it for background scoring. Poll the returned job for progress."""
+    input_format = input_format or detect_format(file.filename)
+    if input_format not in JOB_FORMATS:
+        raise UnsupportedJobInputError()
+
+    job_id = store.new_job_id()
+    job = {"id": job_id, "input_format": input_format}
+    # Copied in chunks off the event loop so large uploads neither block nor sit in memory
+    with open(store.input_path(job), "wb") as destination:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, destination, 1024 * 1024)
+    store.create(job_id, input_format, text_column, id_column, long_document)
+    logger.info(f"Queued job {job_id} ({input_format}, text column '{text_column}')")
+    return _to_status(store.get(job_id))
+
+
+@router.get("/{job_id}", response_model=JobStatus, summary="Poll a bulk scoring job")
+async def get_job(job_id: str, store: JobStore = Depends(get_job_store)) -> JobStatus:
+    """Reports the job's status, progress and throughput."""
+    job = store.get(job_id)
+    if job is None:
+        raise JobNotFoundError(job_id)
+    return _to_status(job)
+
+
+@router.get("/{job_id}/results", response_class=FileResponse, summary="Download a bulk scoring job's results")
+async def get_job_results(job_id: str, store: JobStore = Depends(get_job_store)) -> FileResponse:
+    """Returns one result row per input row, in the same format as the upload."""
+    job = store.get(job_id)
+    if job is None:
+        raise JobNotFoundError(job_id)
+    if job["status"] != STATUS_COMPLETED:
+        raise JobNotFinishedError(job_id, job["status"])
+    path = store.results_path(job)
+    return FileResponse(path, media_type=_MEDIA_TYPES[job["input_format"]], filename=f"{job_id}-{path.name}")
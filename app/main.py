@@ -1,39 +1,56 @@
 # app/main.py
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
 from app.api import router as api_router
+from app.jobs import JobRunner, get_job_store
+from app.jobs_api import router as jobs_router
+from app.models_api import router as models_router
 from app.config import settings
 from app.logging_config import setup_logging
-from app.services import get_text_detection_service
+from app.metrics import mark_process_dead, render_metrics
+from app.services import TextDetectionService, get_text_detection_service
 from app.exceptions import ModelLoadError
 
 # Configure logging before application starts
 setup_logging()
 logger = logging.getLogger(__name__)
 
+async def _load_service(service: TextDetectionService):
+    """Loads the model off the event loop so the port is open while it happens."""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, service.load)
+    except (ModelLoadError, RuntimeError) as e:
+        # Liveness reports the failure so the orchestrator restarts the container
+        logger.critical(f"Fatal error during startup: {e}", exc_info=True)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handles application startup and shutdown events."""
     logger.info("Application startup: Initializing resources...")
-    try:
-        # Eagerly initialize the service on startup to load the model
-        get_text_detection_service()
-        logger.info("Text detection service initialized.")
-    except (ModelLoadError, RuntimeError) as e:
-         # Critical failure if model cannot be loaded on startup
-         logger.critical(f"Fatal error during startup: {e}", exc_info=True)
-         # Raising error here might stop server startup, depending on deployment
-         raise RuntimeError(f"Service initialization failed: {e}") from e
+    service = get_text_detection_service()
+    # Readiness flips once the model is loaded and warmed up; see /health/ready
+    load_task = asyncio.create_task(_load_service(service))
+    # Bulk jobs are picked up (or resumed) once the model is ready
+    job_runner = JobRunner(get_job_store(), service) if settings.JOBS_ENABLED else None
+    if job_runner is not None:
+        job_runner.start()
 
     yield # Application runs
 
     logger.info("Application shutdown.")
-    # Add cleanup logic here if necessary
+    if job_runner is not None:
+        await job_runner.stop()
+    if not load_task.done():
+        load_task.cancel()
+    await service.shutdown()
+    mark_process_dead()
 
 
 app = FastAPI(
@@ -78,6 +95,15 @@ async def generic_exception_handler(request: Request, exc: Exception):
 
 # --- Router Inclusion ---
 app.include_router(api_router, prefix=settings.API_PREFIX)
+app.include_router(jobs_router, prefix=settings.API_PREFIX)
+app.include_router(models_router, prefix=settings.API_PREFIX)
+
+# --- Metrics Endpoint ---
+@app.get("/metrics", summary="Prometheus metrics", tags=["Monitoring"], include_in_schema=False)
+async def metrics():
+    """Exposes Prometheus metrics in the text exposition format."""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
 
 # --- Root Endpoint ---
 @app.get("/", summary="API Root", tags=["Root"], include_in_schema=False)
@@ -0,0 +1,134 @@
+# app/metrics.py
+import os
+import resource
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Stages of the prediction hot path, in execution order
+STAGES = ("normalize", "tokenize", "device_transfer", "forward", "postprocess")
+
+_LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_LATENCY = Histogram(
+    "text_detection_stage_seconds",
+    "Time spent in each stage of the prediction path.",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+INPUT_TOKENS = Histogram(
+    "text_detection_input_tokens",
+    "Token length of each sequence sent to the model.",
+    buckets=(8, 16, 32, 64, 128, 256, 384, 512),
+)
+BATCH_SIZE = Histogram(
+    "text_detection_batch_size",
+    "Number of requests flushed together by the micro-batcher.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+QUEUE_WAIT = Histogram(
+    "text_detection_queue_wait_seconds",
+    "Time a request waited in the micro-batcher queue before its forward pass started, by priority class.",
+    ["priority"],
+    buckets=_LATENCY_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "text_detection_in_flight_requests",
+    "Prediction requests admitted and not yet answered.",
+    multiprocess_mode="livesum",
+)
+ERRORS = Counter(
+    "text_detection_errors_total",
+    "Prediction errors by exception type.",
+    ["exception"],
+)
+SCHEDULER_DECISIONS = Counter(
+    "text_detection_scheduler_decisions_total",
+    "Admission outcomes of requests that needed the model, by priority class.",
+    ["priority", "outcome"],
+)
+
+NEAR_DUPLICATE_MATCHES = Counter(
+    "text_detection_near_duplicate_matches_total",
+    "Texts matched to a recently scored near-duplicate, by whether the stored prediction was reused or only flagged.",
+    ["action"],
+)
+
+INCREMENTAL_SESSIONS = Gauge(
+    "text_detection_incremental_sessions",
+    "Open live-scoring WebSocket sessions.",
+    multiprocess_mode="livesum",
+)
+
+INCREMENTAL_WINDOWS = Counter(
+    "text_detection_incremental_windows_total",
+    "Windows of live-scored documents, by whether they were re-scored or reused from an earlier update.",
+    ["outcome"],
+)
+
+CASCADE_DECISIONS = Counter(
+    "text_detection_cascade_decisions_total",
+    "Texts decided by each stage of the cascade.",
+    ["stage"],
+)
+LOADED_MODEL_BYTES = Gauge(
+    "text_detection_loaded_model_bytes",
+    "Bytes of model weights currently loaded by the model registry.",
+    multiprocess_mode="livesum",
+)
+MODEL_EVICTIONS = Counter(
+    "text_detection_model_evictions_total",
+    "Models unloaded to stay within MODEL_MEMORY_BUDGET_MB.",
+)
+PROCESS_RSS = Gauge(
+    "text_detection_process_rss_bytes",
+    "Resident set size of the serving process.",
+    multiprocess_mode="all",
+)
+
+# Label lookups are resolved once here so the hot path only pays for observe()
+STAGE_TIMERS = {stage: STAGE_LATENCY.labels(stage) for stage in STAGES}
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def record_error(exc: BaseException):
+    """Counts an exception raised while serving a prediction."""
+    ERRORS.labels(type(exc).__name__).inc()
+
+
+def update_process_rss():
+    """Samples the current RSS from /proc, falling back to the peak RSS elsewhere."""
+    try:
+        with open("/proc/self/statm") as statm:
+            PROCESS_RSS.set(int(statm.read().split()[1]) * _PAGE_SIZE)
+    except (OSError, IndexError, ValueError):
+        # ru_maxrss is reported in kilobytes on Linux
+        PROCESS_RSS.set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Returns the Prometheus exposition payload and its content type. Under
+    multiple workers (PROMETHEUS_MULTIPROC_DIR set) every worker's samples are merged.
+    """
+    update_process_rss()
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Drops this worker's live gauges from the shared multiprocess directory."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
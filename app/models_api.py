@@ -0,0 +1,76 @@
+# app/models_api.py
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.config import settings
+from app.registry import ModelRegistry, ModelSpec
+from app.schemas import ModelInfo, ModelRegistration, ModelRegistryStatus
+from app.services import TextDetectionService, get_text_detection_service
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/models", tags=["Models"])
+
+
+def _require_admin():
+    if not settings.MODEL_ADMIN_ENABLED:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Model administration is disabled (MODEL_ADMIN_ENABLED).")
+
+
+def _model_info(registry: ModelRegistry, name: str) -> ModelInfo:
+    return next(ModelInfo(**entry) for entry in registry.status()["models"] if entry["name"] == name)
+
+
+@router.get("", response_model=ModelRegistryStatus, summary="List registered models")
+async def list_models(
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> ModelRegistryStatus:
+    """Reports every registered model, which one is the default and the memory their weights use."""
+    return ModelRegistryStatus(**service.registry.status())
+
+
+@router.post(
+    "",
+    response_model=ModelInfo,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Load a model version, optionally swapping it in as the default",
+    dependencies=[Depends(_require_admin)],
+)
+async def register_model(
+    registration: ModelRegistration,
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> ModelInfo:
+    """
+    Registers the model under `name` and loads and warms it up in the
+    background. With `make_default`, requests without a model field switch to
+    it once warmup completes; requests already admitted finish on the old one.
+    """
+    service.check_ready()
+    registry = service.registry
+    try:
+        registry.register(registration.name, ModelSpec(registration.model, registration.revision))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    registry.load_in_background(registration.name, make_default=registration.make_default)
+    logger.info(f"Loading model '{registration.name}' ({registration.model}@{registration.revision or 'main'}) in the background.")
+    return _model_info(registry, registration.name)
+
+
+@router.post(
+    "/{name}/default",
+    response_model=ModelInfo,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Swap the default model",
+    dependencies=[Depends(_require_admin)],
+)
+async def set_default_model(
+    name: str,
+    service: TextDetectionService = Depends(get_text_detection_service)
+) -> ModelInfo:
+    """Loads the registered model in the background if needed, then makes it the default."""
+    service.check_ready()
+    registry = service.registry
+    registry.resolve(name)
+    registry.load_in_background(name, make_default=True)
+    return _model_info(registry, name)
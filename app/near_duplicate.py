@@ -0,0 +1,239 @@
+# app/near_duplicate.py
+import hashlib
+import logging
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+# Shingle hashing works on chunks of this many shingles to bound the temporary (n, NUM_PERM) matrix
+_SIGNATURE_CHUNK = 4096
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: spreads every input bit over the whole 64-bit output."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class NearDuplicateIndex:
+    """
+    MinHash locality-sensitive index over recently scored normalized texts.
+
+    Each text is reduced to the MinHash signature of its word 3-grams; the
+    fraction of equal signature slots estimates the Jaccard similarity of two
+    texts. Signatures are split into bands, and texts sharing any band are
+    candidates that are then checked against `threshold`.
+
+    Memory is fixed: entries live in preallocated arrays used as a ring, so
+    the oldest entry is overwritten once `max_entries` is reached, and only
+    the stored prediction is kept, never the text. Lookups binary-search one
+    sorted array of band keys plus a short list of entries added since the
+    last compaction; compaction merges those entries into the sorted arrays
+    and drops expired ones. Safe to share between the event loop and executor threads.
+    """
+
+    NUM_PERM = 64
+    BANDS = 16 # 16 bands of 4 rows: texts above ~0.5 similarity almost always become candidates
+    SHINGLE_SIZE = 3
+
+    def __init__(
+        self,
+        threshold: float,
+        max_entries: int,
+        ttl_seconds: float = 0.0,
+        min_words: int = 20,
+        compact_every: int = 1024,
+        compact_interval_seconds: float = 300.0,
+        seed: int = 0x5EED,
+    ):
+        self._threshold = threshold
+        self._capacity = max(1, max_entries)
+        self._ttl = ttl_seconds
+        self._min_words = max(self.SHINGLE_SIZE, min_words)
+        self._compact_every = max(1, compact_every)
+        self._compact_interval = compact_interval_seconds
+        rng = np.random.default_rng(seed)
+        # Odd multipliers keep each permutation a bijection on 64-bit values
+        self._perm_a = rng.integers(0, 2**63, self.NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._perm_b = rng.integers(0, 2**63, self.NUM_PERM, dtype=np.uint64)
+
+        self._signatures = np.zeros((self._capacity, self.NUM_PERM), dtype=np.uint64)
+        self._band_keys = np.zeros((self._capacity, self.BANDS), dtype=np.uint64)
+        self._created = np.zeros(self._capacity, dtype=np.float64)
+        self._results: List[Dict[str, Any] | None] = [None] * self._capacity
+        self._next_slot = 0
+        # Every band key of the live entries in sorted order, and the slot each key belongs to.
+        # Keys are salted with their band index, so one array serves all bands.
+        self._sorted_keys = np.zeros(0, dtype=np.uint64)
+        self._sorted_slots = np.zeros(0, dtype=np.int64)
+        self._recent: List[int] = [] # Slots written since the last compaction
+        self._last_compaction = time.monotonic()
+        self._lock = threading.Lock()
+
+        self._lookups = 0
+        self._matches = 0
+        self._reused = 0
+        self._flagged = 0
+        self._skipped = 0
+        self._compactions = 0
+        self._lookup_seconds = 0.0
+
+    def signature(self, text: str, namespace: str) -> Tuple[np.ndarray, np.ndarray] | None:
+        """
+        Returns the MinHash signature of `text` and its band keys under
+        `namespace` (texts only ever match within the same namespace), or
+        None if the text is too short for a meaningful similarity.
+        """
+        words = text.lower().split()
+        if len(words) < self._min_words:
+            return None
+        word_hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+        shingles = word_hashes[:1 - self.SHINGLE_SIZE].copy()
+        for offset in range(1, self.SHINGLE_SIZE):
+            end = len(word_hashes) - self.SHINGLE_SIZE + 1 + offset
+            shingles = _mix64(shingles ^ (word_hashes[offset:end] << np.uint64(32 - offset)))
+        shingles = np.unique(shingles)
+
+        signature = np.full(self.NUM_PERM, _MASK64, dtype=np.uint64)
+        for start in range(0, len(shingles), _SIGNATURE_CHUNK):
+            chunk = shingles[start:start + _SIGNATURE_CHUNK, None]
+            np.minimum(signature, (chunk * self._perm_a + self._perm_b).min(axis=0), out=signature)
+
+        rows = signature.reshape(self.BANDS, -1)
+        band_keys = np.full(self.BANDS, np.uint64(_namespace_hash(namespace)), dtype=np.uint64)
+        band_keys ^= np.arange(self.BANDS, dtype=np.uint64)
+        for column in range(rows.shape[1]):
+            band_keys = _mix64(band_keys ^ rows[:, column])
+        return signature, band_keys
+
+    def lookup(self, text: str, namespace: str) -> Tuple[Dict[str, Any], float] | None:
+        """Returns a copy of the most similar stored prediction and its estimated similarity, if above the threshold."""
+        started = time.perf_counter()
+        hashed = self.signature(text, namespace)
+        with self._lock:
+            if hashed is None:
+                self._skipped += 1
+                return None
+            signature, band_keys = hashed
+            self._lookups += 1
+            try:
+                match = self._best_match(signature, band_keys)
+                if match is None:
+                    return None
+                slot, similarity = match
+                self._matches += 1
+                return dict(self._results[slot]), similarity
+            finally:
+                self._lookup_seconds += time.perf_counter() - started
+
+    def _candidates(self, band_keys: np.ndarray) -> np.ndarray:
+        """Slots sharing at least one band with the query. Caller holds the lock."""
+        found = []
+        starts = np.searchsorted(self._sorted_keys, band_keys, side="left")
+        ends = np.searchsorted(self._sorted_keys, band_keys, side="right")
+        for start, end in zip(starts[starts < ends], ends[starts < ends]):
+            found.append(self._sorted_slots[start:end])
+        if self._recent:
+            recent = np.fromiter(self._recent, dtype=np.int64, count=len(self._recent))
+            found.append(recent[(self._band_keys[recent] == band_keys).any(axis=1)])
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def _best_match(self, signature: np.ndarray, band_keys: np.ndarray) -> Tuple[int, float] | None:
+        """Caller holds the lock."""
+        slots = self._candidates(band_keys)
+        if len(slots) == 0:
+            return None
+        # Sorted arrays can still point at slots overwritten since the last compaction
+        slots = slots[(self._band_keys[slots] == band_keys).any(axis=1)]
+        if self._ttl > 0:
+            slots = slots[time.time() - self._created[slots] <= self._ttl]
+        if len(slots) == 0:
+            return None
+        similarities = (self._signatures[slots] == signature).mean(axis=1)
+        best = int(similarities.argmax())
+        if similarities[best] < self._threshold:
+            return None
+        return int(slots[best]), float(similarities[best])
+
+    def add(self, text: str, namespace: str, result: Dict[str, Any]):
+        """Indexes a freshly scored text, overwriting the oldest entry once the index is full."""
+        hashed = self.signature(text, namespace)
+        if hashed is None:
+            return
+        signature, band_keys = hashed
+        with self._lock:
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self._capacity
+            self._signatures[slot] = signature
+            self._band_keys[slot] = band_keys
+            self._created[slot] = time.time()
+            self._results[slot] = dict(result)
+            self._recent.append(slot)
+            if (
+                len(self._recent) >= self._compact_every
+                or time.monotonic() - self._last_compaction >= self._compact_interval
+            ):
+                self._compact()
+
+    def _compact(self):
+        """Rebuilds the sorted band arrays from the live entries, dropping expired ones. Caller holds the lock."""
+        started = time.perf_counter()
+        live = np.array([slot for slot, result in enumerate(self._results) if result is not None], dtype=np.int64)
+        if self._ttl > 0 and len(live):
+            expired = live[time.time() - self._created[live] > self._ttl]
+            for slot in expired:
+                self._results[slot] = None
+                self._band_keys[slot] = 0
+            live = np.setdiff1d(live, expired)
+        keys = self._band_keys[live].ravel()
+        order = np.argsort(keys)
+        self._sorted_keys = keys[order]
+        self._sorted_slots = np.repeat(live, self.BANDS)[order]
+        self._recent = []
+        self._last_compaction = time.monotonic()
+        self._compactions += 1
+        logger.debug(f"Compacted near-duplicate index to {len(live)} entries in {(time.perf_counter() - started) * 1000:.1f}ms.")
+
+    def record_outcome(self, reused: bool):
+        """Counts a match that was served from the index (a saved model call) or only flagged."""
+        with self._lock:
+            if reused:
+                self._reused += 1
+            else:
+                self._flagged += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns lookup counters, the model calls saved and current occupancy."""
+        with self._lock:
+            return {
+                "entries": sum(result is not None for result in self._results),
+                "max_entries": self._capacity,
+                "threshold": self._threshold,
+                "lookups": self._lookups,
+                "matches": self._matches,
+                "match_ratio": self._matches / self._lookups if self._lookups else 0.0,
+                "saved_model_calls": self._reused,
+                "flagged": self._flagged,
+                "skipped_short_texts": self._skipped,
+                "compactions": self._compactions,
+                "mean_lookup_ms": self._lookup_seconds / self._lookups * 1000 if self._lookups else 0.0,
+                "memory_bytes": int(
+                    self._signatures.nbytes + self._band_keys.nbytes + self._created.nbytes
+                    + self._sorted_keys.nbytes + self._sorted_slots.nbytes
+                ),
+            }
+
+
+def _namespace_hash(namespace: str) -> int:
+    return int.from_bytes(hashlib.blake2b(namespace.encode("utf-8"), digest_size=8).digest(), "little")
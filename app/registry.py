@@ -0,0 +1,767 @@
+# app/registry.py
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.exceptions import ModelLoadError, UnknownModelError
+from app.metrics import CASCADE_DECISIONS, INPUT_TOKENS, LOADED_MODEL_BYTES, MODEL_EVICTIONS, STAGE_TIMERS
+
+# torch and transformers are imported lazily so the API can bind its port immediately
+if TYPE_CHECKING:
+    import torch
+    from transformers import PreTrainedTokenizer
+    from app.backends import InferenceBackend
+    from app.services import PredictionRequest
+
+logger = logging.getLogger(__name__)
+
+# Cascade stages reported in the "decided_by" field of each result
+STAGE_FIRST = "first_stage"
+STAGE_FULL = "full_model"
+
+
+class ModelSpec(NamedTuple):
+    """Identifies one model version: a Hub id (or directory) and revision, plus an optional pinned local copy."""
+    name: str
+    revision: str | None = None
+    local_dir: str | None = None # Loaded from here instead of the Hub when set
+
+    @property
+    def source(self) -> str:
+        return self.local_dir or self.name
+
+    def __str__(self) -> str:
+        return f"{self.name}@{self.revision or 'main'}"
+
+    @classmethod
+    def parse(cls, reference: str) -> "ModelSpec":
+        """Parses "hub-id-or-dir[@revision]"."""
+        name, _, revision = reference.partition("@")
+        return cls(name, revision or None)
+
+
+def primary_model_spec() -> ModelSpec:
+    """The model configured by MODEL_NAME, MODEL_REVISION and MODEL_LOCAL_DIR."""
+    return ModelSpec(settings.MODEL_NAME, settings.MODEL_REVISION, settings.MODEL_LOCAL_DIR)
+
+
+def format_result(probabilities) -> Dict[str, Any]:
+    """Converts one row of class probabilities into the response payload."""
+    predicted_class_id = int(probabilities.argmax())
+    return {
+        "softmax_score_class_0": float(probabilities[0]),
+        "softmax_score_class_1": float(probabilities[1]),
+        "predicted_class": predicted_class_id,
+        "predicted_label": "AI-generated" if predicted_class_id == 1 else "Human-written"
+    }
+
+
+def aggregate_windows(probabilities: np.ndarray, lengths: np.ndarray, aggregation: str) -> np.ndarray:
+    """Combines per-window class probabilities into document probabilities ("mean", "max" or "length_weighted")."""
+    if aggregation == "max":
+        return probabilities[int(probabilities[:, 1].argmax())]
+    if aggregation == "length_weighted":
+        return (probabilities * lengths[:, None]).sum(axis=0) / lengths.sum()
+    return probabilities.mean(axis=0)
+
+
+class LoadedModel:
+    """
+    One model version and everything needed to score with it: tokenizer,
+    inference backend and, with the cascade enabled, its first stage. The
+    tokenizer is kept when the weights are unloaded, so evicted models can
+    still tokenize and are reloaded transparently on their next use.
+    """
+
+    def __init__(self, spec: ModelSpec):
+        self.spec = spec
+        self.memory_bytes = 0
+        self.last_used = 0.0
+        self.in_use = 0 # Forward passes currently holding the weights; guarded by the registry lock
+        self._load_lock = threading.Lock()
+        self._tokenizer: "PreTrainedTokenizer | None" = None
+        self._backend: "InferenceBackend | None" = None
+        self._stage_backend: "InferenceBackend | None" = None
+        self._cascade_band: Tuple[float, float] | None = None
+        self._num_labels: int = 2
+        self._device: "torch.device | None" = None
+
+    @property
+    def tokenizer(self) -> "PreTrainedTokenizer | None":
+        return self._tokenizer
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._backend is not None
+
+    def _hub_kwargs(self) -> Dict[str, Any]:
+        """Returns the Hub arguments for this model."""
+        if settings.HF_OFFLINE:
+            # Must be set before huggingface_hub is first imported
+            os.environ["HF_HUB_OFFLINE"] = "1"
+            os.environ["TRANSFORMERS_OFFLINE"] = "1"
+        return {
+            "token": settings.HF_TOKEN,
+            "revision": self.spec.revision,
+            "local_files_only": settings.HF_OFFLINE,
+        }
+
+    def load_tokenizer(self):
+        """Loads only the tokenizer, for processes that tokenize but never run the model."""
+        with self._load_lock:
+            if self._tokenizer is None:
+                self._load_tokenizer()
+
+    def _load_tokenizer(self):
+        from transformers import AutoTokenizer
+
+        logger.info(f"Loading tokenizer: {self.spec.source}")
+        self._tokenizer = AutoTokenizer.from_pretrained(self.spec.source, **self._hub_kwargs())
+
+    def load(self, device: "torch.device", on_loaded: Callable[[], None] | None = None):
+        """
+        Loads the weights (and tokenizer) and runs the warmup batch, calling
+        `on_loaded` in between. Does nothing if already loaded.
+        """
+        with self._load_lock:
+            if self._backend is not None:
+                return
+            started = time.perf_counter()
+            self._device = device
+            if self._tokenizer is None:
+                self._load_tokenizer()
+            self._load_model()
+            if on_loaded is not None:
+                on_loaded()
+            self._warmup()
+            logger.info(
+                f"Model '{self.spec}' loaded and warmed up in {time.perf_counter() - started:.2f}s "
+                f"({self.memory_bytes / 2**20:.0f} MiB)."
+            )
+
+    def unload(self):
+        """
+        Drops the weights; the tokenizer stays so the model can keep tokenizing.
+        Memory is returned once the caller runs free_memory().
+        """
+        with self._load_lock:
+            self._backend = None
+            self._stage_backend = None
+            self.memory_bytes = 0
+
+    def free_memory(self):
+        gc.collect()
+        if self._device is not None and self._device.type == "cuda":
+            import torch
+
+            torch.cuda.empty_cache()
+
+    def _load_model(self):
+        """Loads the model from a pinned local snapshot or the Hugging Face Hub."""
+        from transformers import AutoModelForSequenceClassification
+        from app.backends import build_backend
+
+        source, hub_kwargs = self.spec.source, self._hub_kwargs()
+        try:
+            logger.info(f"Loading model: {source}")
+            model_kwargs = {}
+            if settings.MODEL_ATTN_IMPLEMENTATION:
+                # e.g. "flash_attention_2" lets ModernBERT run its unpadded attention path
+                model_kwargs["attn_implementation"] = settings.MODEL_ATTN_IMPLEMENTATION
+            load_kwargs = {"use_safetensors": settings.MODEL_USE_SAFETENSORS, "low_cpu_mem_usage": True, **hub_kwargs}
+            if settings.SHARED_WEIGHTS_DIR and self._device.type == "cpu":
+                # Every worker on the host maps the same read-only weights file
+                from app.shared_weights import load_shared_model
+
+                model = load_shared_model(source, load_kwargs, model_kwargs, model_id=str(self.spec))
+                if settings.INFERENCE_BACKEND in ("onnx", "int8"):
+                    logger.warning(f"INFERENCE_BACKEND='{settings.INFERENCE_BACKEND}' builds private weights; SHARED_WEIGHTS_DIR only saves memory for 'eager' and 'compile'.")
+            else:
+                # safetensors weights are memory-mapped and copied straight into the model
+                model = AutoModelForSequenceClassification.from_pretrained(source, **load_kwargs, **model_kwargs)
+
+            if model and self._device:
+                model.to(self._device)
+                model.eval() # Set model to evaluation mode for inference
+                logger.info(f"Model '{source}' loaded to {self._device}.")
+            else:
+                raise ModelLoadError("Model or device invalid after loading attempt.")
+
+            self._num_labels = model.config.num_labels
+            logger.info(f"Building inference backend: {settings.INFERENCE_BACKEND}")
+            self._backend = build_backend(
+                settings.INFERENCE_BACKEND, model, self._tokenizer, self._device, model_id=str(self.spec)
+            )
+            # What the backend keeps resident: an int8 copy or ONNX graph replaces the eager weights
+            memory_bytes = self._backend.memory_bytes()
+            if settings.CASCADE_ENABLED:
+                memory_bytes += self._load_cascade(hub_kwargs)
+            self.memory_bytes = memory_bytes
+        except ModelLoadError:
+            self._backend = None
+            raise
+        except Exception as e:
+            self._backend = None
+            logger.error(f"Failed to load model or tokenizer '{source}': {e}", exc_info=True)
+            # Catching general Exception, specific ones (ImportError, OSError) handled by base class
+            raise ModelLoadError(f"Failed loading resources: {e}") from e
+
+    def _load_cascade(self, hub_kwargs: Dict[str, Any]) -> int:
+        """
+        Loads the first-stage model, if one is configured, and the band of
+        scores escalated past it. Returns the first-stage backend's resident size in bytes.
+        """
+        from transformers import AutoModelForSequenceClassification
+        from app.backends import build_backend
+
+        lower, upper = settings.CASCADE_LOWER, settings.CASCADE_UPPER
+        if settings.CASCADE_THRESHOLDS_PATH:
+            from app.calibration import load_thresholds
+
+            lower, upper = load_thresholds(settings.CASCADE_THRESHOLDS_PATH)
+        if not 0.0 <= lower <= upper <= 1.0:
+            raise ModelLoadError(f"Invalid cascade band [{lower}, {upper}]; expected 0 <= lower <= upper <= 1.")
+        self._cascade_band = (lower, upper)
+
+        memory_bytes = 0
+        if settings.CASCADE_MODEL_NAME:
+            logger.info(f"Loading cascade first-stage model: {settings.CASCADE_MODEL_NAME}")
+            stage_model = AutoModelForSequenceClassification.from_pretrained(
+                settings.CASCADE_MODEL_NAME,
+                use_safetensors=settings.MODEL_USE_SAFETENSORS,
+                low_cpu_mem_usage=True,
+                **{**hub_kwargs, "revision": None},
+            )
+            if stage_model.config.num_labels != self._num_labels:
+                raise ModelLoadError(
+                    f"Cascade model has {stage_model.config.num_labels} labels, the main model has {self._num_labels}."
+                )
+            stage_model.to(self._device)
+            stage_model.eval()
+            self._stage_backend = build_backend(
+                settings.INFERENCE_BACKEND, stage_model, self._tokenizer, self._device,
+                model_id=f"{settings.CASCADE_MODEL_NAME}@main",
+            )
+            memory_bytes = self._stage_backend.memory_bytes()
+        logger.info(
+            f"Cascade enabled: {settings.CASCADE_PREFIX_TOKENS}-token first stage on "
+            f"{settings.CASCADE_MODEL_NAME or 'the main model'}, escalating scores in [{lower:.4f}, {upper:.4f}]."
+        )
+        return memory_bytes
+
+    def _warmup(self):
+        """Runs WARMUP_BATCH_SIZE synthetic texts through every length bucket."""
+        from app.services import PredictionRequest
+
+        if settings.WARMUP_BATCH_SIZE <= 0:
+            return
+        for bucket in self._length_buckets():
+            text = " ".join(["warmup"] * max(1, bucket - self._tokenizer.num_special_tokens_to_add()))
+            # The cascade is bypassed so every bucket of the full model gets compiled/allocated
+            requests = [PredictionRequest(text)] * settings.WARMUP_BATCH_SIZE
+            tokenized = self.tokenize_requests(requests)
+            self.predict_tokenized(requests, tokenized, cascade=False)
+            if self._stage_backend is not None:
+                prefixes = self._first_stage_sequences([sequences[0] for sequences in tokenized])
+                self._forward_sequences(prefixes, self._stage_backend)
+
+    def tokenize_requests(self, requests: List["PredictionRequest"]) -> List[List[List[int]]]:
+        """
+        Returns the token id sequences to score for each normalized request: one
+        truncated sequence, or one per window in long-document mode, followed
+        by one truncated sequence per segment. Needs only the tokenizer, so it
+        can run in processes that never load the model.
+        """
+        tokenized: List[List[List[int]]] = [[] for _ in requests]
+        segment_sequences: List[List[List[int]]] = [[] for _ in requests]
+        with STAGE_TIMERS["tokenize"].time():
+            short = [i for i, request in enumerate(requests) if not request.long_document]
+            # Short documents and every segment share one tokenizer call
+            texts = [requests[i].text for i in short]
+            segment_owners = [i for i, request in enumerate(requests) for _ in request.segments]
+            texts += [segment.text for request in requests for segment in request.segments]
+            if texts:
+                # No padding here: each sequence is padded only to the longest member of its length bucket
+                encodings = self._tokenizer(
+                    texts,
+                    padding=False,
+                    truncation=True,
+                    max_length=settings.MODEL_MAX_LENGTH,
+                )["input_ids"]
+                for i, input_ids in zip(short, encodings):
+                    tokenized[i] = [input_ids]
+                for i, input_ids in zip(segment_owners, encodings[len(short):]):
+                    segment_sequences[i].append(input_ids)
+
+            for i, request in enumerate(requests):
+                if request.long_document:
+                    tokenized[i] = self._tokenize_windows(request.text)
+        return [sequences + segments for sequences, segments in zip(tokenized, segment_sequences)]
+
+    def predict_tokenized(
+        self, requests: List["PredictionRequest"], tokenized: List[List[List[int]]], cascade: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Scores the output of tokenize_requests and formats one result per request.
+        With the cascade enabled, confident texts are decided by the first stage
+        and only the rest pay for the full model. Segments always go to the full
+        model, in the same padded batches as the documents.
+        """
+        # Each request owns the slice spans[i] of the flat list of document sequences to score,
+        # and segment_spans[i] of the segment sequences that trail them in tokenized[i]
+        sequences: List[List[int]] = []
+        spans: List[Tuple[int, int]] = []
+        segment_sequences: List[List[int]] = []
+        segment_spans: List[Tuple[int, int]] = []
+        for request, request_sequences in zip(requests, tokenized):
+            count = len(request_sequences) - len(request.segments)
+            spans.append((len(sequences), len(sequences) + count))
+            sequences.extend(request_sequences[:count])
+            segment_spans.append((len(segment_sequences), len(segment_sequences) + len(request.segments)))
+            segment_sequences.extend(request_sequences[count:])
+
+        probabilities = np.zeros((len(sequences), self._num_labels), dtype=np.float32)
+        use_cascade = cascade and self._cascade_band is not None
+        decided_by = [STAGE_FULL] * len(requests)
+        escalated = list(range(len(requests)))
+        if use_cascade:
+            escalated = self._run_first_stage(requests, sequences, spans, probabilities, decided_by)
+
+        full = [index for i in escalated for index in range(*spans[i])]
+        segment_probabilities = np.zeros((len(segment_sequences), self._num_labels), dtype=np.float32)
+        if full or segment_sequences:
+            scored = self._forward_unique([sequences[index] for index in full] + segment_sequences)
+            probabilities[full] = scored[:len(full)]
+            segment_probabilities = scored[len(full):]
+
+        with STAGE_TIMERS["postprocess"].time():
+            results = []
+            for request, (start, end), stage, segment_span in zip(requests, spans, decided_by, segment_spans):
+                if request.long_document:
+                    result = self._aggregate_windows(request, sequences[start:end], probabilities[start:end])
+                else:
+                    result = format_result(probabilities[start])
+                if use_cascade:
+                    result["decided_by"] = stage
+                    CASCADE_DECISIONS.labels(stage).inc()
+                if request.segments:
+                    result["segments"] = [
+                        {
+                            "index": index,
+                            "char_start": segment.char_start,
+                            "char_end": segment.char_end,
+                            "softmax_score_class_1": float(row[1]),
+                        }
+                        for index, (segment, row) in enumerate(zip(request.segments, segment_probabilities[slice(*segment_span)]))
+                    ]
+                results.append(result)
+        return results
+
+    def _forward_unique(self, sequences: List[List[int]]) -> np.ndarray:
+        """
+        Runs the full model over sequences, scoring repeated ones only once: a
+        one-sentence document and its single segment, or a sentence quoted twice.
+        """
+        unique: Dict[Tuple[int, ...], int] = {}
+        positions = [unique.setdefault(tuple(sequence), len(unique)) for sequence in sequences]
+        distinct = [list(sequence) for sequence in unique]
+        for sequence in distinct:
+            INPUT_TOKENS.observe(len(sequence))
+        return self._forward_sequences(distinct)[positions]
+
+    def _first_stage_sequences(self, sequences: List[List[int]]) -> List[List[int]]:
+        """Truncates sequences to CASCADE_PREFIX_TOKENS, keeping the closing separator token."""
+        limit = max(2, settings.CASCADE_PREFIX_TOKENS)
+        sep_token_id = self._tokenizer.sep_token_id
+        prefixes = []
+        for sequence in sequences:
+            if len(sequence) <= limit:
+                prefixes.append(sequence)
+            elif sep_token_id is not None and sequence[-1] == sep_token_id:
+                prefixes.append(sequence[:limit - 1] + sequence[-1:])
+            else:
+                prefixes.append(sequence[:limit])
+        return prefixes
+
+    def _run_first_stage(
+        self,
+        requests: List["PredictionRequest"],
+        sequences: List[List[int]],
+        spans: List[Tuple[int, int]],
+        probabilities: np.ndarray,
+        decided_by: List[str],
+    ) -> List[int]:
+        """
+        Scores single-sequence requests with the cheap first stage, fills in the
+        probabilities of those it decides and returns the requests to escalate.
+        """
+        candidates = self.cascade_candidates(requests, [sequences[start] for start, _ in spans])
+        if not candidates:
+            return list(range(len(requests)))
+
+        prefixes = self._first_stage_sequences([sequences[spans[i][0]] for i in candidates])
+        for prefix in prefixes:
+            INPUT_TOKENS.observe(len(prefix))
+        stage_probabilities = self._forward_sequences(prefixes, self._stage_backend or self._backend)
+
+        lower, upper = self._cascade_band
+        decided = set()
+        for i, row in zip(candidates, stage_probabilities):
+            # The band itself is inclusive: borderline scores always get the full model
+            if row[1] < lower or row[1] > upper:
+                probabilities[spans[i][0]] = row
+                decided_by[i] = STAGE_FIRST
+                decided.add(i)
+        return [i for i in range(len(requests)) if i not in decided]
+
+    def cascade_candidates(self, requests: List["PredictionRequest"], first_sequences: List[List[int]]) -> List[int]:
+        """
+        Indices of the requests the cascade sends to its first stage, given each
+        request's first sequence. Long documents always go to the full model, and
+        without a separate first-stage model a text that already fits in the
+        prefix skips straight to it.
+        """
+        return [
+            i for i, (request, sequence) in enumerate(zip(requests, first_sequences))
+            if not request.long_document
+            and (self._stage_backend is not None or len(sequence) > settings.CASCADE_PREFIX_TOKENS)
+        ]
+
+    def score_cascade_stages(self, sequences: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the first-stage and full-model class probabilities of every
+        sequence, without applying the band. Used by app.calibration.
+        """
+        first = self._forward_sequences(self._first_stage_sequences(sequences), self._stage_backend or self._backend)
+        return first, self._forward_sequences(sequences)
+
+    def score_sequences(self, sequences: List[List[int]]) -> np.ndarray:
+        """Class probabilities of already tokenized sequences (special tokens included) under the full model."""
+        for sequence in sequences:
+            INPUT_TOKENS.observe(len(sequence))
+        return self._forward_sequences(sequences)
+
+    def _tokenize_windows(self, processed_text: str) -> List[List[int]]:
+        """Splits a text into overlapping token windows of at most MODEL_MAX_LENGTH tokens."""
+        encodings = self._tokenizer(
+            processed_text,
+            padding=False,
+            truncation=True,
+            max_length=settings.MODEL_MAX_LENGTH,
+            stride=settings.LONG_DOCUMENT_WINDOW_STRIDE,
+            return_overflowing_tokens=True,
+        )
+        windows = encodings["input_ids"]
+        if len(windows) > settings.LONG_DOCUMENT_MAX_WINDOWS:
+            logger.warning(
+                f"Document produced {len(windows)} windows, scoring only the first {settings.LONG_DOCUMENT_MAX_WINDOWS}."
+            )
+            windows = windows[:settings.LONG_DOCUMENT_MAX_WINDOWS]
+        return windows
+
+    def _aggregate_windows(
+        self, request: "PredictionRequest", windows: List[List[int]], probabilities: np.ndarray
+    ) -> Dict[str, Any]:
+        """Combines per-window probabilities into a document verdict and lists each window's scores."""
+        special_tokens = self._tokenizer.num_special_tokens_to_add()
+        lengths = np.array([max(1, len(window) - special_tokens) for window in windows], dtype=np.float32)
+        document = aggregate_windows(probabilities, lengths, request.aggregation)
+
+        # Consecutive windows advance by their content length minus the configured overlap
+        step = max(1, settings.MODEL_MAX_LENGTH - special_tokens - settings.LONG_DOCUMENT_WINDOW_STRIDE)
+        result = format_result(document)
+        result["windows"] = [
+            {
+                "index": index,
+                "token_start": index * step,
+                "token_end": index * step + int(length),
+                "softmax_score_class_0": float(row[0]),
+                "softmax_score_class_1": float(row[1]),
+            }
+            for index, (length, row) in enumerate(zip(lengths, probabilities))
+        ]
+        return result
+
+    def _length_buckets(self) -> List[int]:
+        """Returns the sorted bucket boundaries, capped at MODEL_MAX_LENGTH."""
+        buckets = sorted({b for b in settings.LENGTH_BUCKETS if 0 < b < settings.MODEL_MAX_LENGTH})
+        return buckets + [settings.MODEL_MAX_LENGTH]
+
+    def _forward_sequences(self, sequences: List[List[int]], backend: "InferenceBackend | None" = None) -> np.ndarray:
+        """
+        Scores already tokenized sequences and returns an (n, num_labels) array
+        of class probabilities in input order. Sequences are grouped into length
+        buckets and each forward pass is padded only to its longest member.
+        Runs the main model unless another backend is given.
+        """
+        import torch.nn.functional as F
+
+        backend = backend or self._backend
+        buckets = self._length_buckets()
+        grouped: Dict[int, List[int]] = {}
+        for index, sequence in enumerate(sequences):
+            bucket = next((b for b in buckets if len(sequence) <= b), buckets[-1])
+            grouped.setdefault(bucket, []).append(index)
+
+        probabilities = np.zeros((len(sequences), self._num_labels), dtype=np.float32)
+        max_batch_size = max(1, settings.BATCH_MAX_SIZE)
+        for bucket in sorted(grouped):
+            # Sorting by length keeps each sub-batch's padding as tight as possible
+            indices = sorted(grouped[bucket], key=lambda i: len(sequences[i]))
+            for start in range(0, len(indices), max_batch_size):
+                chunk = indices[start:start + max_batch_size]
+                with STAGE_TIMERS["device_transfer"].time():
+                    inputs = self._pad_sequences([sequences[i] for i in chunk])
+                with STAGE_TIMERS["forward"].time():
+                    logits = backend(**inputs)
+                with STAGE_TIMERS["postprocess"].time():
+                    probabilities[chunk] = F.softmax(logits.float(), dim=1).cpu().numpy()
+        return probabilities
+
+    def _pad_sequences(self, sequences: List[List[int]]) -> Dict[str, "torch.Tensor"]:
+        """Right-pads token id lists to the longest one and moves them to the model device."""
+        import torch
+
+        width = max(1, max(len(sequence) for sequence in sequences))
+        pad_token_id = self._tokenizer.pad_token_id if self._tokenizer.pad_token_id is not None else 0
+        input_ids = torch.full((len(sequences), width), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        for row, sequence in enumerate(sequences):
+            input_ids[row, :len(sequence)] = torch.tensor(sequence, dtype=torch.long)
+            attention_mask[row, :len(sequence)] = 1
+        return {
+            "input_ids": input_ids.to(self._device),
+            "attention_mask": attention_mask.to(self._device),
+        }
+
+
+class ModelRegistry:
+    """
+    Holds every model version the service can score with, keyed by ModelSpec,
+    and the names requests select them by. Models are loaded on first use (or
+    ahead of time by load_in_background) and the least recently used ones are
+    unloaded whenever the loaded weights exceed MODEL_MEMORY_BUDGET_MB. The
+    default model and models running a forward pass are never unloaded.
+    Safe to use from the event loop and executor threads.
+    """
+
+    # Load states reported per registered name
+    STATE_REGISTERED = "registered"
+    STATE_LOADING = "loading"
+    STATE_READY = "ready"
+    STATE_FAILED = "failed"
+    STATE_EVICTED = "evicted"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: "OrderedDict[ModelSpec, LoadedModel]" = OrderedDict() # Least recently used first
+        self._names: Dict[str, ModelSpec] = {
+            name: ModelSpec.parse(reference) for name, reference in settings.MODEL_REGISTRY.items()
+        }
+        self._names[settings.MODEL_DEFAULT_NAME] = primary_model_spec()
+        self._default = settings.MODEL_DEFAULT_NAME
+        self._states: Dict[str, Tuple[str, str | None]] = {name: (self.STATE_REGISTERED, None) for name in self._names}
+        self.device: "torch.device | None" = None
+
+    @property
+    def default_name(self) -> str:
+        return self._default
+
+    @property
+    def default_spec(self) -> ModelSpec:
+        return self._names[self._default]
+
+    def resolve(self, name: str | None) -> ModelSpec:
+        """Returns the model version a request for `name` (None for the default) is scored with."""
+        with self._lock:
+            if name is None:
+                return self._names[self._default]
+            if name not in self._names:
+                raise UnknownModelError(name, list(self._names))
+            return self._names[name]
+
+    def _entry(self, spec: ModelSpec) -> LoadedModel:
+        with self._lock:
+            if spec not in self._models:
+                self._models[spec] = LoadedModel(spec)
+            return self._models[spec]
+
+    def tokenizer_model(self, spec: ModelSpec) -> LoadedModel:
+        """Returns the entry for `spec` with at least its tokenizer loaded."""
+        model = self._entry(spec)
+        model.load_tokenizer()
+        return model
+
+    def hold(self, spec: ModelSpec) -> LoadedModel:
+        """
+        Pins `spec` against eviction without loading it. The service holds the
+        version a request was resolved to from admission until its result is
+        back, so a model swapped out of the default slot stays loaded until
+        its in-flight requests have drained.
+        """
+        model = self._entry(spec)
+        with self._lock:
+            model.in_use += 1
+        return model
+
+    def release(self, model: LoadedModel):
+        with self._lock:
+            model.in_use -= 1
+            drained = model.in_use == 0
+        if drained:
+            self._evict()
+
+    def tokenizer(self, spec: ModelSpec) -> "PreTrainedTokenizer | None":
+        """Returns the tokenizer of `spec` if it has been loaded."""
+        model = self._models.get(spec)
+        return model.tokenizer if model is not None else None
+
+    def acquire(self, spec: ModelSpec, on_loaded: Callable[[], None] | None = None) -> LoadedModel:
+        """
+        Returns the loaded model for `spec`, loading it first if needed, and
+        pins it against eviction until release() is called.
+        """
+        model = self.hold(spec)
+        try:
+            model.load(self.device, on_loaded)
+        except BaseException:
+            self.release(model)
+            raise
+        with self._lock:
+            model.last_used = time.time()
+            self._models.move_to_end(spec)
+        self._evict()
+        return model
+
+    def load(
+        self, name: str, make_default: bool = False, on_loaded: Callable[[], None] | None = None
+    ) -> LoadedModel:
+        """Loads and warms up a registered model, recording its state, and optionally makes it the default."""
+        spec = self.resolve(name)
+        with self._lock:
+            self._states[name] = (self.STATE_LOADING, None)
+        try:
+            model = self.acquire(spec, on_loaded)
+        except Exception as e:
+            with self._lock:
+                self._states[name] = (self.STATE_FAILED, str(e))
+            raise
+        try:
+            with self._lock:
+                self._states[name] = (self.STATE_READY, None)
+            if make_default:
+                # Still pinned here, so the budget can't evict it between loading and the swap
+                self.set_default(name)
+        finally:
+            self.release(model)
+        return model
+
+    def register(self, name: str, spec: ModelSpec):
+        """Adds or repoints a name; requests already resolved keep the version they were given."""
+        with self._lock:
+            if name == self._default and self._names.get(name) != spec:
+                raise ValueError(f"'{name}' is the default model; register the new version under another name and swap to it.")
+            self._names[name] = spec
+            self._states[name] = (self.STATE_REGISTERED, None)
+
+    def set_default(self, name: str):
+        """Atomically routes requests without a model field to `name`, which must already be loaded."""
+        with self._lock:
+            spec = self._names.get(name)
+            if spec is None:
+                raise UnknownModelError(name, list(self._names))
+            model = self._models.get(spec)
+            if model is None or not model.is_loaded:
+                raise ModelLoadError(f"Model '{name}' must be loaded before it becomes the default.")
+            previous, self._default = self._default, name
+        logger.info(f"Default model switched from '{previous}' to '{name}' ({spec}).")
+        # The previous default is now an ordinary eviction candidate
+        self._evict()
+
+    def load_in_background(self, name: str, make_default: bool = False) -> threading.Thread:
+        """Loads and warms up `name` on a background thread, then swaps it in as the default if asked."""
+        def run():
+            try:
+                self.load(name, make_default)
+            except Exception as e:
+                logger.error(f"Background load of model '{name}' failed: {e}", exc_info=True)
+
+        thread = threading.Thread(target=run, name=f"model-load-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def _evict(self):
+        """Unloads least recently used models until the loaded weights fit MODEL_MEMORY_BUDGET_MB."""
+        if settings.MODEL_MEMORY_BUDGET_MB is None:
+            self._update_gauges()
+            return
+        budget = settings.MODEL_MEMORY_BUDGET_MB * 2**20
+        victims = []
+        with self._lock:
+            used = sum(model.memory_bytes for model in self._models.values())
+            default_spec = self._names[self._default]
+            for spec, model in self._models.items():
+                if used <= budget:
+                    break
+                if not model.is_loaded or model.in_use or spec == default_spec:
+                    continue
+                logger.info(f"Evicting model '{spec}' ({model.memory_bytes / 2**20:.0f} MiB) to stay within the memory budget.")
+                used -= model.memory_bytes
+                # Unloaded under the lock: acquire() pins under the same lock, so a model is
+                # either pinned before it could be chosen here or reloaded by the next acquire()
+                model.unload()
+                victims.append(model)
+                MODEL_EVICTIONS.inc()
+        for model in victims:
+            model.free_memory()
+        if used > budget:
+            logger.warning(
+                f"Loaded models use {used / 2**20:.0f} MiB, above MODEL_MEMORY_BUDGET_MB={settings.MODEL_MEMORY_BUDGET_MB}, "
+                "but every remaining model is the default or in use."
+            )
+        self._update_gauges()
+
+    def _update_gauges(self):
+        LOADED_MODEL_BYTES.set(sum(model.memory_bytes for model in list(self._models.values())))
+
+    def status(self) -> Dict[str, Any]:
+        """Describes every registered name and the memory its weights use."""
+        with self._lock:
+            entries = []
+            for name, spec in self._names.items():
+                model = self._models.get(spec)
+                state, error = self._states.get(name, (self.STATE_REGISTERED, None))
+                loaded = model is not None and model.is_loaded
+                if state != self.STATE_LOADING:
+                    # Models are also loaded on first use and unloaded by the budget, outside load()
+                    if loaded:
+                        state, error = self.STATE_READY, None
+                    elif state == self.STATE_READY:
+                        state = self.STATE_EVICTED
+                entries.append({
+                    "name": name,
+                    "model": spec.name,
+                    "revision": spec.revision,
+                    "default": name == self._default,
+                    "state": state,
+                    "loaded": loaded,
+                    "memory_bytes": model.memory_bytes if model is not None else 0,
+                    "last_used": model.last_used or None if model is not None else None,
+                    "in_use": model.in_use if model is not None else 0,
+                    "error": error,
+                })
+            return {
+                "default": self._default,
+                "memory_budget_bytes": (
+                    int(settings.MODEL_MEMORY_BUDGET_MB * 2**20) if settings.MODEL_MEMORY_BUDGET_MB is not None else None
+                ),
+                "memory_bytes": sum(model.memory_bytes for model in self._models.values()),
+                "models": entries,
+            }
@@ -0,0 +1,218 @@
+# app/scheduler.py
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Dict, NamedTuple
+
+from fastapi import HTTPException, status
+from starlette.requests import HTTPConnection
+
+from app.config import settings
+from app.exceptions import QuotaExceededError
+from app.metrics import SCHEDULER_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first; the index is the rank used to order the micro-batcher queue
+PRIORITY_CLASSES = ("interactive", "standard", "background")
+INTERACTIVE, STANDARD, BACKGROUND = PRIORITY_CLASSES
+
+API_KEY_HEADER = "X-API-Key"
+PRIORITY_HEADER = "X-Priority"
+DEADLINE_HEADER = "X-Deadline-Ms" # Time budget in milliseconds, relative to when the request arrived
+
+
+class RequestContext(NamedTuple):
+    """Who a request is for, how urgent it is, and when its result stops being useful."""
+    client_id: str
+    priority: str = STANDARD
+    deadline: float | None = None # time.monotonic() after which the result is no longer needed
+
+    @property
+    def rank(self) -> int:
+        return PRIORITY_CLASSES.index(self.priority)
+
+    def remaining(self) -> float | None:
+        """Seconds left before the deadline, or None without one."""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+
+# Used for work the service schedules itself, such as bulk jobs
+BACKGROUND_CONTEXT = RequestContext("jobs", BACKGROUND)
+
+
+def _bad_header(header: str, detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid {header} header: {detail}")
+
+
+def _build_context(connection: HTTPConnection, unmapped_max_priority: str) -> RequestContext:
+    """
+    Builds the RequestContext of an HTTP or WebSocket request. X-Priority
+    picks the class, capped at the highest class the client's API key allows
+    in SCHEDULER_API_KEYS. Clients without a mapped key are capped at
+    `unmapped_max_priority` and identified by their address: any header they
+    send is their own choice, so it cannot be trusted to key their quotas.
+    """
+    headers = connection.headers
+    api_key = headers.get(API_KEY_HEADER)
+    mapped = api_key is not None and api_key in settings.SCHEDULER_API_KEYS
+    allowed = settings.SCHEDULER_API_KEYS[api_key] if mapped else unmapped_max_priority
+    requested = headers.get(PRIORITY_HEADER, settings.SCHEDULER_DEFAULT_PRIORITY).strip().lower()
+    if requested not in PRIORITY_CLASSES:
+        raise _bad_header(PRIORITY_HEADER, f"expected one of {', '.join(PRIORITY_CLASSES)}.")
+    priority = PRIORITY_CLASSES[max(PRIORITY_CLASSES.index(requested), PRIORITY_CLASSES.index(allowed))]
+
+    deadline = None
+    budget = headers.get(DEADLINE_HEADER)
+    if budget is not None:
+        try:
+            milliseconds = float(budget)
+        except ValueError:
+            milliseconds = math.nan
+        # A NaN deadline would never expire and would break the micro-batcher's heap ordering
+        if not math.isfinite(milliseconds):
+            raise _bad_header(DEADLINE_HEADER, "expected a finite number of milliseconds.")
+        deadline = time.monotonic() + milliseconds / 1000
+
+    if mapped:
+        # Keys are never kept in memory or logged in the clear
+        client_id = "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    else:
+        client_id = "addr:" + (connection.client.host if connection.client else "anonymous")
+    return RequestContext(client_id, priority, deadline)
+
+
+def request_context(connection: HTTPConnection) -> RequestContext:
+    """FastAPI dependency: the RequestContext of a single-text or live request."""
+    return _build_context(connection, settings.SCHEDULER_MAX_PRIORITY)
+
+
+def batch_request_context(connection: HTTPConnection) -> RequestContext:
+    """FastAPI dependency: the RequestContext of a /predict/batch request, where unmapped clients get a lower cap."""
+    return _build_context(connection, settings.SCHEDULER_BATCH_MAX_PRIORITY)
+
+
+def estimate_tokens(text: str, long_document: bool) -> int:
+    """
+    Model tokens a normalized text will cost, estimated at four characters
+    per token before it is tokenized. Short-mode texts are truncated, so they
+    never cost more than one window.
+    """
+    limit = settings.MODEL_MAX_LENGTH
+    if long_document:
+        limit *= settings.LONG_DOCUMENT_MAX_WINDOWS
+    return min(limit, len(text) // 4 + 2)
+
+
+class _ClientState:
+    __slots__ = ("in_flight", "tokens", "refilled_at")
+
+    def __init__(self, tokens: float):
+        self.in_flight = 0
+        self.tokens = tokens
+        self.refilled_at = time.monotonic()
+
+
+class ClientQuotas:
+    """
+    Per-client limits on requests in flight and on model tokens per minute
+    (a token bucket holding up to one minute of budget). None disables a
+    limit. As with global admission, a single oversized admission still
+    goes through for an otherwise idle client.
+    """
+
+    def __init__(self, max_in_flight: int | None, tokens_per_minute: int | None):
+        self._max_in_flight = max_in_flight
+        self._tokens_per_minute = tokens_per_minute
+        self._clients: Dict[str, _ClientState] = {}
+        self._released: asyncio.Event | None = None
+
+    def _state(self, client_id: str) -> _ClientState:
+        state = self._clients.get(client_id)
+        if state is None:
+            state = self._clients[client_id] = _ClientState(float(self._tokens_per_minute or 0))
+        if self._tokens_per_minute:
+            now = time.monotonic()
+            state.tokens = min(
+                float(self._tokens_per_minute),
+                state.tokens + (now - state.refilled_at) * self._tokens_per_minute / 60,
+            )
+            state.refilled_at = now
+        return state
+
+    def _check(self, state: _ClientState, requests: int, tokens: int) -> str | None:
+        """Returns the limit the admission would break, if any."""
+        if self._max_in_flight and state.in_flight and state.in_flight + requests > self._max_in_flight:
+            return "concurrency"
+        if self._tokens_per_minute and state.tokens < min(tokens, self._tokens_per_minute):
+            return "tokens"
+        return None
+
+    async def acquire(self, context: RequestContext, requests: int, tokens: int, wait: bool):
+        """
+        Admits `requests` requests costing `tokens` tokens for the client.
+        Raises QuotaExceededError when over a limit unless `wait` is set, in
+        which case it waits for the client's requests to finish or its bucket to refill.
+        """
+        while True:
+            state = self._state(context.client_id)
+            exceeded = self._check(state, requests, tokens)
+            if exceeded is None:
+                break
+            if exceeded == "tokens":
+                retry_after = (min(tokens, self._tokens_per_minute) - state.tokens) * 60 / self._tokens_per_minute
+            else:
+                retry_after = settings.OVERLOAD_RETRY_AFTER_SECONDS
+            if not wait:
+                SCHEDULER_DECISIONS.labels(context.priority, f"rejected_{exceeded}").inc()
+                raise QuotaExceededError(
+                    detail=f"Client exceeded its {'token' if exceeded == 'tokens' else 'concurrency'} quota.",
+                    retry_after=max(1, math.ceil(retry_after)),
+                )
+            if self._released is None:
+                self._released = asyncio.Event()
+            self._released.clear()
+            try:
+                await asyncio.wait_for(self._released.wait(), retry_after if exceeded == "tokens" else None)
+            except asyncio.TimeoutError:
+                pass
+        state.in_flight += requests
+        state.tokens -= tokens
+
+    def release(self, context: RequestContext, requests: int, refund_tokens: int = 0):
+        """Ends `requests` requests of the client, returning tokens that were charged but never used."""
+        state = self._clients.get(context.client_id)
+        if state is None:
+            return
+        state.in_flight -= requests
+        if refund_tokens and self._tokens_per_minute:
+            state.tokens = min(float(self._tokens_per_minute), state.tokens + refund_tokens)
+        if state.in_flight == 0 and (not self._tokens_per_minute or state.tokens >= self._tokens_per_minute):
+            # Idle clients with a full bucket carry no state worth keeping
+            del self._clients[context.client_id]
+        if self._released is not None:
+            self._released.set()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """In-flight requests and remaining token budget of every client with state."""
+        return {
+            client_id: {"in_flight": state.in_flight, "tokens_available": round(self._state(client_id).tokens, 1)}
+            for client_id, state in list(self._clients.items())
+        }
+
+
+def in_flight_limit(priority: str) -> int:
+    """
+    Global in-flight admissions available to a priority class. Lower classes
+    leave SCHEDULER_INTERACTIVE_RESERVE slots free for interactive requests,
+    and background work is further capped at SCHEDULER_BACKGROUND_SHARE, so
+    it only uses capacity higher classes leave spare.
+    """
+    limit = settings.INFERENCE_MAX_IN_FLIGHT
+    if priority != INTERACTIVE:
+        limit -= settings.SCHEDULER_INTERACTIVE_RESERVE
+    if priority == BACKGROUND:
+        limit = min(limit, int(settings.INFERENCE_MAX_IN_FLIGHT * settings.SCHEDULER_BACKGROUND_SHARE))
+    return max(1, limit)
@@ -1,10 +1,16 @@
 # app/schemas.py
+from typing import Any, Dict, List, Literal
+
 from pydantic import BaseModel, Field, field_validator
 from app.config import settings
 
 class TextInput(BaseModel):
     """Request schema for text prediction."""
     text: str = Field(..., min_length=1, description="The text content to be analyzed.")
+    long_document: bool = Field(False, description="Score the whole text with overlapping token windows instead of truncating it.")
+    aggregation: Literal["mean", "max", "length_weighted"] = Field("mean", description="How window scores are combined into the document verdict in long-document mode.")
+    model: str | None = Field(None, description="Registry name of the model to score with; defaults to the current default model.")
+    segmentation: Literal["none", "sentence", "paragraph"] | None = Field(None, description="Also score each sentence or paragraph, in the same batch as the document; defaults to SEGMENTATION_DEFAULT.")
 
     @field_validator('text')
     @classmethod
@@ -13,15 +19,148 @@ class TextInput(BaseModel):
             raise ValueError("Text cannot be empty or contain only whitespace.")
         return value
 
+class WindowScore(BaseModel):
+    """Scores for one token window of a long document."""
+    index: int = Field(..., description="Position of the window within the document.")
+    token_start: int = Field(..., description="Offset of the window's first content token.")
+    token_end: int = Field(..., description="Offset one past the window's last content token.")
+    softmax_score_class_0: float = Field(..., ge=0, le=1)
+    softmax_score_class_1: float = Field(..., ge=0, le=1)
+
+class SegmentScore(BaseModel):
+    """AI-generated score for one sentence or paragraph of the input."""
+    index: int
+    char_start: int = Field(..., description="Offset of the segment's first character in the submitted text.")
+    char_end: int = Field(..., description="Offset one past the segment's last character.")
+    softmax_score_class_1: float = Field(..., ge=0, le=1)
+
+class NearDuplicateMatch(BaseModel):
+    """A recently scored text this input is a near-duplicate of."""
+    similarity: float = Field(..., ge=0, le=1, description="Estimated Jaccard similarity of the two texts' word 3-grams.")
+    reused: bool = Field(..., description="Whether the stored prediction was returned instead of running the model.")
+
 class PredictionOutput(BaseModel):
     """Response schema for text prediction."""
     softmax_score_class_0: float = Field(..., ge=0, le=1, description="Softmax probability score for class 0 (Human-written).")
     softmax_score_class_1: float = Field(..., ge=0, le=1, description="Softmax probability score for class 1 (AI-generated).")
     predicted_class: int = Field(..., description="Predicted class index (0 for Human, 1 for AI).")
     predicted_label: str = Field(..., description="Predicted class label ('Human-written' or 'AI-generated').")
+    windows: List[WindowScore] | None = Field(None, description="Per-window scores, only returned in long-document mode.")
+    decided_by: Literal["first_stage", "full_model"] | None = Field(None, description="Cascade stage that produced the verdict, only returned when the cascade is enabled.")
+    near_duplicate: NearDuplicateMatch | None = Field(None, description="Set when the text nearly duplicates a recently scored one.")
+    segments: List[SegmentScore] | None = Field(None, description="Per-segment scores, only returned when segmentation is requested.")
+
+class ModelInfo(BaseModel):
+    """One registered model name and the version it points to."""
+    name: str
+    model: str = Field(..., description="Hugging Face Hub id or local directory.")
+    revision: str | None = None
+    default: bool
+    state: str = Field(..., description="One of 'registered', 'loading', 'ready', 'evicted' or 'failed'.")
+    loaded: bool
+    memory_bytes: int = 0
+    last_used: float | None = None
+    in_use: int = Field(0, description="Admitted requests and forward passes pinning the model.")
+    error: str | None = None
+
+class ModelRegistryStatus(BaseModel):
+    """Response schema for the model registry."""
+    default: str
+    memory_budget_bytes: int | None = None
+    memory_bytes: int
+    models: List[ModelInfo]
+
+class ModelRegistration(BaseModel):
+    """Request schema for loading a model version into the registry."""
+    name: str = Field(..., min_length=1, description="Name requests select the model by.")
+    model: str = Field(..., min_length=1, description="Hugging Face Hub id or local directory.")
+    revision: str | None = Field(None, description="Branch, tag or commit hash on the Hub.")
+    make_default: bool = Field(False, description="Swap the default to this model once it is loaded and warmed up.")
+
+class CacheStats(BaseModel):
+    """Response schema for prediction cache counters."""
+    enabled: bool
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    hit_ratio: float = 0.0
+    memory_entries: int = 0
+    disk_enabled: bool = False
 
-class HealthCheck(BaseModel):
-    """Response schema for health check."""
-    message: str = "OK"
+class NearDuplicateStats(BaseModel):
+    """Response schema for near-duplicate index counters."""
+    enabled: bool
+    mode: str | None = None
+    entries: int = 0
+    max_entries: int = 0
+    threshold: float | None = None
+    lookups: int = 0
+    matches: int = 0
+    match_ratio: float = 0.0
+    saved_model_calls: int = Field(0, description="Predictions served from a near-duplicate instead of the model.")
+    flagged: int = 0
+    skipped_short_texts: int = 0
+    compactions: int = 0
+    mean_lookup_ms: float = 0.0
+    memory_bytes: int = 0
+
+class ThreadProfileInfo(BaseModel):
+    """Thread layout chosen for this worker and, when benchmarked, what it measured."""
+    intra_op_threads: int | None
+    inter_op_threads: int | None
+    pin_cpus: bool
+    source: Literal["static", "persisted", "benchmark"]
+    throughput: float | None = Field(None, description="Sequences per second on the benchmark batches.")
+    latency_p50_ms: float | None = None
+    latency_p99_ms: float | None = None
+    candidates: List[Dict[str, Any]] = Field([], description="Every layout the benchmark measured.")
+
+class ThreadDiagnostics(BaseModel):
+    """Response schema for the thread and CPU affinity diagnostics."""
+    autotune_enabled: bool
+    profile: ThreadProfileInfo | None
+    profile_path: str | None
+    torch_num_threads: int
+    torch_num_interop_threads: int
+    host_cpus: int
+    affinity: List[int] | None
+
+class ClientQuotaUsage(BaseModel):
+    """Quota usage of one client."""
+    in_flight: int
+    tokens_available: float = Field(..., description="Remaining model token budget; 0 when no token quota is set.")
+
+class SchedulerStats(BaseModel):
+    """Response schema for the scheduler diagnostics."""
+    in_flight: int
+    limits: Dict[str, int] = Field(..., description="In-flight admissions available to each priority class.")
+    clients: Dict[str, ClientQuotaUsage]
+
+class LivenessStatus(BaseModel):
+    """Response schema for the liveness probe."""
+    service: str = settings.PROJECT_NAME
+    status: str = Field(..., description="'alive', or 'failed' if the model could not be loaded.")
+    detail: str | None = None
+
+class ReadinessStatus(BaseModel):
+    """Response schema for the readiness probe."""
     service: str = settings.PROJECT_NAME
-    status: str = "Running"
\ No newline at end of file
+    ready: bool
+    state: str = Field(..., description="One of 'starting', 'loading', 'warming_up', 'ready' or 'failed'.")
+    time_to_ready_seconds: float | None = None
+
+class JobStatus(BaseModel):
+    """Response schema for a bulk scoring job."""
+    job_id: str
+    status: str = Field(..., description="One of 'queued', 'running', 'completed' or 'failed'.")
+    input_format: str
+    total_rows: int | None = Field(None, description="Known once the job has started.")
+    processed_rows: int = 0
+    failed_rows: int = Field(0, description="Rows that were missing text or could not be scored.")
+    progress: float | None = Field(None, ge=0, le=1)
+    rows_per_second: float | None = Field(None, description="Throughput of the current (or last) run of the job.")
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+    results_url: str | None = Field(None, description="Download link, set once the job has completed.")
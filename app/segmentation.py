@@ -0,0 +1,64 @@
+# app/segmentation.py
+import math
+import re
+from typing import List, NamedTuple, Tuple
+
+SEGMENTATION_UNITS = ("sentence", "paragraph")
+
+# Sentences end after terminal punctuation (and any closing quotes or brackets) or a line break.
+# Splitting happens on the raw text: normalize_text strips the punctuation these rules rely on.
+_SENTENCE_END = re.compile(r"[.!?]+[\"'”’)\]]*(?=\s)|\n")
+_PARAGRAPH_END = re.compile(r"\n\s*\n")
+
+
+class Segment(NamedTuple):
+    """A sentence or paragraph of a request, scored alongside the whole document."""
+    char_start: int # Offsets into the raw request text
+    char_end: int
+    text: str # Normalized
+
+
+def split_spans(text: str, unit: str) -> List[Tuple[int, int]]:
+    """Character spans of the sentences or paragraphs of `text`, trimmed of surrounding whitespace."""
+    pattern = _PARAGRAPH_END if unit == "paragraph" else _SENTENCE_END
+    spans = []
+    start = 0
+    for match in pattern.finditer(text):
+        spans.append((start, match.end()))
+        start = match.end()
+    spans.append((start, len(text)))
+
+    trimmed = []
+    for span_start, span_end in spans:
+        chunk = text[span_start:span_end]
+        stripped = chunk.strip()
+        if stripped:
+            offset = span_start + len(chunk) - len(chunk.lstrip())
+            trimmed.append((offset, offset + len(stripped)))
+    return trimmed
+
+
+def plan_spans(text: str, unit: str, min_chars: int, max_segments: int) -> List[Tuple[int, int]]:
+    """
+    Splits `text` into spans to score. Spans shorter than `min_chars` are
+    merged into the next one (too little text to judge on its own), and past
+    `max_segments` consecutive spans are grouped so every part of the text
+    keeps a score.
+    """
+    merged: List[Tuple[int, int]] = []
+    pending = None
+    for start, end in split_spans(text, unit):
+        pending = (pending[0], end) if pending else (start, end)
+        if pending[1] - pending[0] >= min_chars:
+            merged.append(pending)
+            pending = None
+    if pending:
+        if merged:
+            merged[-1] = (merged[-1][0], pending[1])
+        else:
+            merged.append(pending)
+
+    if len(merged) > max(1, max_segments):
+        group = math.ceil(len(merged) / max(1, max_segments))
+        merged = [(merged[i][0], merged[min(i + group, len(merged)) - 1][1]) for i in range(0, len(merged), group)]
+    return merged
@@ -0,0 +1,40 @@
+# app/serve.py
+import logging
+
+import uvicorn
+
+from app.config import settings
+from app.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """
+    Starts SERVING_WORKERS uvicorn worker processes. When SHARED_WEIGHTS_DIR is
+    set, the weights snapshot is written once here, before the workers fork,
+    so that every worker maps the same file instead of racing to build it.
+    """
+    setup_logging()
+    if settings.SHARED_WEIGHTS_DIR:
+        from app.shared_weights import materialize_shared_weights
+
+        load_kwargs = {
+            "token": settings.HF_TOKEN,
+            "revision": settings.MODEL_REVISION,
+            "local_files_only": settings.HF_OFFLINE,
+            "use_safetensors": settings.MODEL_USE_SAFETENSORS,
+            "low_cpu_mem_usage": True,
+        }
+        materialize_shared_weights(settings.MODEL_LOCAL_DIR or settings.MODEL_NAME, load_kwargs)
+
+    logger.info(f"Starting {settings.SERVING_WORKERS} worker(s) on {settings.SERVER_HOST}:{settings.SERVER_PORT}")
+    uvicorn.run(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=settings.SERVING_WORKERS,
+    )
+
+
+if __name__ == "__main__":
+    main()
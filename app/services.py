@@ -1,34 +1,291 @@
 # app/services.py
+import asyncio
+import itertools
 import logging
+import math
+import multiprocessing
+import os
 import string
-from typing import Dict, Any
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Any, List, Callable, NamedTuple, Tuple
 from functools import lru_cache
 
-import torch
-import torch.nn.functional as F
-from transformers import (
-    AutoTokenizer,
-    AutoModelForSequenceClassification,
-    PreTrainedTokenizer,
-    PreTrainedModel
-)
+import numpy as np
 
+from app.cache import PredictionCache
 from app.config import settings
-from app.exceptions import ModelLoadError, ModelInferenceError
+from app.exceptions import (
+    ModelLoadError,
+    ModelInferenceError,
+    ServiceNotReadyError,
+    DeadlineExceededError,
+    ServiceOverloadedError,
+    UnknownModelError,
+)
+from app.metrics import (
+    BATCH_SIZE,
+    IN_FLIGHT,
+    QUEUE_WAIT,
+    STAGE_TIMERS,
+    NEAR_DUPLICATE_MATCHES,
+    SCHEDULER_DECISIONS,
+    record_error,
+    update_process_rss,
+)
+from app.near_duplicate import NearDuplicateIndex
+from app.registry import ModelRegistry, ModelSpec
+from app.scheduler import PRIORITY_CLASSES, STANDARD, ClientQuotas, RequestContext, estimate_tokens, in_flight_limit
+from app.segmentation import Segment, plan_spans
+
+# torch and transformers are imported lazily in load() so the API can bind its port immediately
+if TYPE_CHECKING:
+    import torch
+    from transformers import PreTrainedTokenizer
+
+    from app.autotune import ThreadProfile
 
 logger = logging.getLogger(__name__)
 
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+
+def normalize_text(text: str) -> str:
+    """Applies the same punctuation stripping used when the model was trained."""
+    return text.translate(_PUNCTUATION_TABLE).strip()
+
+
+def segment_text(text: str, unit: str | None) -> Tuple[Segment, ...]:
+    """Splits raw text into the normalized sentences or paragraphs to score, keeping their raw offsets."""
+    unit = unit or settings.SEGMENTATION_DEFAULT
+    if unit == "none":
+        return ()
+    segments = []
+    for start, end in plan_spans(text, unit, settings.SEGMENTATION_MIN_CHARS, settings.SEGMENTATION_MAX_SEGMENTS):
+        normalized = normalize_text(text[start:end])
+        if normalized:
+            segments.append(Segment(start, end, normalized))
+    return tuple(segments)
+
+
+def _thresholds_fingerprint() -> List[Any] | None:
+    """Path, size and modification time of CASCADE_THRESHOLDS_PATH, so a recalibrated band gets new cache keys."""
+    path = settings.CASCADE_THRESHOLDS_PATH
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [path]
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+class PredictionRequest(NamedTuple):
+    """A normalized text plus the options that control how it is scored."""
+    text: str
+    long_document: bool = False
+    aggregation: str = "mean" # "mean", "max" or "length_weighted"; only used for long documents
+    model: ModelSpec | None = None # Version resolved at admission; None scores with the current default
+    segments: Tuple[Segment, ...] = () # Sentences or paragraphs to score alongside the document
+
+    def estimated_tokens(self) -> int:
+        """Model tokens the request will cost, segments included; see scheduler.estimate_tokens."""
+        return estimate_tokens(self.text, self.long_document) + sum(
+            estimate_tokens(segment.text, False) for segment in self.segments
+        )
+
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction calls into a shared queue and flushes them
+    as one batched forward pass once `max_batch_size` items are waiting or
+    `max_wait_ms` has elapsed since the first item of the batch arrived.
+    Forward passes run on `executor`, at most `max_concurrent_batches` at a time.
+    The queue is ordered by priority rank, then deadline, then arrival, so
+    higher-priority items always fill a batch first, and items whose deadline
+    passed while queued are failed instead of scored.
+    """
+
+    def __init__(
+        self,
+        predict_batch_fn: Callable[[List[Any]], List[Dict[str, Any]]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        executor: Executor | None = None,
+        max_concurrent_batches: int = 1,
+    ):
+        self._predict_batch_fn = predict_batch_fn
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._executor = executor
+        self._max_concurrent_batches = max(1, max_concurrent_batches)
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._flushes: set[asyncio.Task] = set()
+        self._arrivals = itertools.count() # Keeps equal priorities and deadlines first in, first out
+
+    def _ensure_started(self):
+        """Starts the flush loop on the running event loop if it isn't running yet."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.PriorityQueue()
+            self._slots = asyncio.Semaphore(self._max_concurrent_batches)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item: Any, rank: int = 0, deadline: float | None = None) -> Dict[str, Any]:
+        """
+        Queues a single item and waits for its slot of the batched result.
+        Lower ranks are scored first; `deadline` is a time.monotonic() value.
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        deadline = math.inf if deadline is None else deadline
+        await self._queue.put((rank, deadline, next(self._arrivals), item, future, loop.time()))
+        return await future
+
+    async def _collect(self) -> List[Tuple[int, float, int, Any, asyncio.Future, float]]:
+        """Waits for the first item, then gathers more until the batch is full or the wait expires."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self._max_wait
+        while len(batch) < self._max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        """Flush loop: waits for a free executor slot, then collects and dispatches the next batch."""
+        while True:
+            # Items keep accumulating in the queue while every slot is busy,
+            # so batches grow naturally under load.
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            flush = asyncio.get_running_loop().create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[int, float, int, Any, asyncio.Future, float]]):
+        """Runs one batched forward pass on the executor and fans results back to each future."""
+        try:
+            now = asyncio.get_running_loop().time()
+            for rank, _, _, _, _, enqueued_at in batch:
+                QUEUE_WAIT.labels(PRIORITY_CLASSES[rank]).observe(now - enqueued_at)
+            expired_by = time.monotonic()
+            for rank, deadline, _, _, future, _ in batch:
+                if deadline < expired_by and not future.done():
+                    SCHEDULER_DECISIONS.labels(PRIORITY_CLASSES[rank], "expired").inc()
+                    future.set_exception(DeadlineExceededError())
+            # Requests whose clients already went away (or gave up) don't need a forward pass
+            batch = [(item, future) for _, _, _, item, future, _ in batch if not future.done()]
+            if not batch:
+                return
+            items = [item for item, _ in batch]
+            BATCH_SIZE.observe(len(batch))
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._predict_batch_fn, items
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            update_process_rss()
+        finally:
+            self._slots.release()
+
+    async def stop(self):
+        """Cancels the flush loop and fails any requests still waiting in the queue."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            future = self._queue.get_nowait()[4]
+            if not future.done():
+                future.set_exception(ModelInferenceError("Prediction service is shutting down."))
+
+
+def _predict_batch_in_worker(requests: List[PredictionRequest]) -> List[Dict[str, Any]]:
+    """Entry point for process-pool workers; each worker loads its own service instance on first use."""
+    service = get_text_detection_service()
+    service.load()
+    return service._predict_normalized(requests)
+
+
+def _score_sequences_in_worker(sequences: List[List[int]], spec: ModelSpec) -> np.ndarray:
+    """Process-pool entry point for TextDetectionService.score_sequences."""
+    service = get_text_detection_service()
+    service.load()
+    return service.score_sequences(sequences, spec)
+
+
+def _init_process_worker(torch_threads: int):
+    """Gives pool workers the thread count chosen by this process instead of tuning their own."""
+    settings.TORCH_NUM_THREADS = torch_threads
+    settings.AUTOTUNE_ENABLED = False
+
+
+def _build_executor() -> Executor:
+    """Creates the dedicated inference executor configured in settings."""
+    workers = max(1, settings.INFERENCE_WORKERS)
+    if settings.INFERENCE_EXECUTOR == "process":
+        import torch
+
+        # Spawned workers load their own copy of the model on first use; they inherit this process's CPU affinity
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process_worker,
+            initargs=(torch.get_num_threads(),),
+        )
+    if settings.INFERENCE_EXECUTOR != "thread":
+        logger.warning(f"Unknown INFERENCE_EXECUTOR '{settings.INFERENCE_EXECUTOR}', falling back to 'thread'.")
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+
+
 class TextDetectionService:
     """
     Manages the AI text detection model loading and inference.
-    Implemented as a Singleton to prevent reloading the model.
+    Implemented as a Singleton that owns the batcher, cache and admission
+    control; the models themselves live in its ModelRegistry, so several
+    versions can be served and the default swapped without a restart.
+    Construction is cheap; the default model is loaded by load(), which the
+    application runs in the background so liveness is reported immediately.
     """
     _instance = None
-    _tokenizer: PreTrainedTokenizer | None = None
-    _model: PreTrainedModel | None = None
-    _device: torch.device | None = None
+    _device: "torch.device | None" = None
     _initialized: bool = False # Class-level flag to ensure single initialization
 
+    # Lifecycle states reported by the health endpoints
+    STATE_STARTING = "starting"
+    STATE_LOADING = "loading"
+    STATE_WARMING_UP = "warming_up"
+    STATE_READY = "ready"
+    STATE_FAILED = "failed"
+
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(TextDetectionService, cls).__new__(cls)
@@ -39,13 +296,119 @@ class TextDetectionService:
             return # Prevent re-initialization
 
         logger.info("Initializing TextDetectionService...")
-        self._determine_device()
-        self._load_model_and_tokenizer()
+        self._state = self.STATE_STARTING
+        self._load_error: str | None = None
+        self._load_lock = threading.Lock()
+        self._time_to_ready: float | None = None
+        self._in_flight = 0
+        self._capacity_freed: asyncio.Event | None = None
+        self._executor: Executor | None = None
+        self._batcher: MicroBatcher | None = None
+        self._cache: PredictionCache | None = None
+        self._registry = ModelRegistry()
+        self._quotas = ClientQuotas(settings.CLIENT_MAX_IN_FLIGHT, settings.CLIENT_TOKENS_PER_MINUTE)
+        if settings.CACHE_ENABLED:
+            self._cache = PredictionCache(
+                max_entries=settings.CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.CACHE_TTL_SECONDS,
+                disk_path=settings.CACHE_DISK_PATH,
+            )
+        self._thread_profile: "ThreadProfile | None" = None
+        self._near_duplicates: NearDuplicateIndex | None = None
+        if settings.NEAR_DUPLICATE_ENABLED:
+            self._near_duplicates = NearDuplicateIndex(
+                threshold=settings.NEAR_DUPLICATE_THRESHOLD,
+                max_entries=settings.NEAR_DUPLICATE_MAX_ENTRIES,
+                ttl_seconds=settings.NEAR_DUPLICATE_TTL_SECONDS,
+                min_words=settings.NEAR_DUPLICATE_MIN_WORDS,
+                compact_interval_seconds=settings.NEAR_DUPLICATE_COMPACT_INTERVAL_SECONDS,
+            )
         TextDetectionService._initialized = True
-        logger.info(f"TextDetectionService initialized on device: {self._device}")
+
+    def load(self):
+        """
+        Loads the default model and runs the warmup batch. Safe to call more than
+        once; only the first call does any work. Raises ModelLoadError on failure.
+        """
+        with self._load_lock:
+            if self._state == self.STATE_READY:
+                return
+            started = time.perf_counter()
+
+            def loaded():
+                logger.info(f"Model loaded in {time.perf_counter() - started:.2f}s.")
+                self._state = self.STATE_WARMING_UP
+
+            try:
+                self._state = self.STATE_LOADING
+                self._configure_threads()
+                self._determine_device()
+                self._registry.device = self._device
+                self._registry.load(self._registry.default_name, on_loaded=loaded)
+                if settings.AUTOTUNE_ENABLED and self._device.type == "cpu":
+                    self._autotune()
+            except Exception as e:
+                self._state = self.STATE_FAILED
+                self._load_error = str(e)
+                if isinstance(e, ModelLoadError):
+                    raise
+                raise ModelLoadError(f"Failed loading resources: {e}") from e
+
+            self._time_to_ready = time.perf_counter() - started
+            self._state = self.STATE_READY
+            logger.info(
+                f"TextDetectionService ready on device {self._device} after {self._time_to_ready:.2f}s.",
+                extra={"time_to_ready_seconds": round(self._time_to_ready, 3)},
+            )
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def is_ready(self) -> bool:
+        return self._state == self.STATE_READY
+
+    @property
+    def load_error(self) -> str | None:
+        return self._load_error
+
+    @property
+    def tokenizer(self) -> "PreTrainedTokenizer | None":
+        """The default model's tokenizer, once loaded."""
+        return self._registry.tokenizer(self._registry.default_spec)
+
+    @property
+    def time_to_ready(self) -> float | None:
+        """Seconds load() took to load the model and finish warmup."""
+        return self._time_to_ready
+
+    def _configure_threads(self):
+        """Partitions torch threads between serving workers, using this host's tuned profile when there is one."""
+        from app.autotune import configure_threads
+
+        self._thread_profile = configure_threads()
+
+    def _autotune(self):
+        """Benchmarks thread layouts on the loaded default model unless a stored profile was applied."""
+        from app.autotune import tune
+
+        model = self._registry.acquire(self._registry.default_spec)
+        try:
+            self._thread_profile = tune(model, self._thread_profile)
+        finally:
+            self._registry.release(model)
+
+    def thread_diagnostics(self) -> Dict[str, Any]:
+        """Reports the thread profile in effect and the resulting torch and affinity settings."""
+        from app.autotune import diagnostics
+
+        return diagnostics(self._thread_profile)
 
     def _determine_device(self):
         """Sets the computation device (CUDA or CPU)."""
+        import torch
+
         if torch.cuda.is_available():
             self._device = torch.device("cuda")
             logger.info("Using CUDA device for inference.")
@@ -54,73 +417,460 @@ class TextDetectionService:
             logger.info("Using CPU device for inference.")
         settings.DEVICE = str(self._device)
 
-    def _load_model_and_tokenizer(self):
-        """Loads the tokenizer and model from Hugging Face Hub."""
-        try:
-            logger.info(f"Loading tokenizer: {settings.MODEL_NAME}")
-            self._tokenizer = AutoTokenizer.from_pretrained(settings.MODEL_NAME, token=settings.HF_TOKEN)
-            logger.info(f"Loading model: {settings.MODEL_NAME}")
-            self._model = AutoModelForSequenceClassification.from_pretrained(settings.MODEL_NAME, token=settings.HF_TOKEN)
-
-            if self._model and self._device:
-                self._model.to(self._device)
-                self._model.eval() # Set model to evaluation mode for inference
-                logger.info(f"Model '{settings.MODEL_NAME}' loaded to {self._device}.")
-            else:
-                raise ModelLoadError("Model or device invalid after loading attempt.")
-        except Exception as e:
-            logger.error(f"Failed to load model or tokenizer '{settings.MODEL_NAME}': {e}", exc_info=True)
-            # Catching general Exception, specific ones (ImportError, OSError) handled by base class
-            raise ModelLoadError(f"Failed loading resources: {e}") from e
+    def load_tokenizer(self):
+        """Loads only the default model's tokenizer, for processes that tokenize but never run the model."""
+        self._registry.tokenizer_model(self._registry.default_spec)
+
+    def predict(
+        self,
+        text: str,
+        long_document: bool = False,
+        aggregation: str = "mean",
+        model: str | None = None,
+        segmentation: str | None = None,
+    ) -> Dict[str, Any]:
+        """Runs inference on a single input text."""
+        return self.predict_batch(
+            [text], long_document=long_document, aggregation=aggregation, model=model, segmentation=segmentation
+        )[0]
 
+    def predict_batch(
+        self,
+        texts: List[str],
+        long_document: bool = False,
+        aggregation: str = "mean",
+        model: str | None = None,
+        segmentation: str | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Runs inference on several texts in one batched forward pass, skipping cached ones."""
+        spec = self._registry.resolve(model)
+        with STAGE_TIMERS["normalize"].time():
+            requests = [
+                PredictionRequest(normalize_text(text), long_document, aggregation, spec, segment_text(text, segmentation))
+                for text in texts
+            ]
+        results: List[Dict[str, Any] | None] = [self._cache_lookup(request) for request in requests]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = self._predict_normalized([requests[i] for i in missing])
+            for i, result in zip(missing, computed):
+                self._cache_store(requests[i], result)
+                results[i] = result
+        return results
 
-    def predict(self, text: str) -> Dict[str, Any]:
-        """Runs inference on the input text."""
-        if not TextDetectionService._initialized or not self._model or not self._tokenizer or not self._device:
+    def _predict_normalized(self, requests: List[PredictionRequest]) -> List[Dict[str, Any]]:
+        """
+        Runs one batched forward pass per model over requests whose text was
+        already passed through normalize_text. Long documents are split into
+        overlapping windows and every window of every request shares the same
+        bucketed batches.
+        """
+        if not self.is_ready:
              logger.error("Prediction attempt on uninitialized service.")
              raise ModelInferenceError("Prediction service is not ready.")
+        # Note: Prediction continues even if a processed text is empty, tokenizer/model might handle it.
+
+        try:
+            return self.predict_tokenized(requests, self.tokenize_requests(requests))
+        except ModelInferenceError:
+            raise
+        except Exception as e:
+            logger.error(f"Model inference failed: {e}", exc_info=True)
+            raise ModelInferenceError(f"Inference error: {e}")
+
+    def _group_by_model(self, requests: List[PredictionRequest]) -> Dict[ModelSpec, List[int]]:
+        """Groups request indices by the model version they are scored with; None means the current default."""
+        default_spec = self._registry.default_spec
+        groups: Dict[ModelSpec, List[int]] = {}
+        for i, request in enumerate(requests):
+            groups.setdefault(request.model or default_spec, []).append(i)
+        return groups
+
+    def tokenize_requests(self, requests: List[PredictionRequest]) -> List[List[List[int]]]:
+        """
+        Returns the token id sequences to score for each normalized request: one
+        truncated sequence, or one per window in long-document mode. Needs only
+        the tokenizer, so it can run in processes that never load the model.
+        """
+        tokenized: List[List[List[int]]] = [[] for _ in requests]
+        for spec, indices in self._group_by_model(requests).items():
+            model = self._registry.tokenizer_model(spec)
+            for i, sequences in zip(indices, model.tokenize_requests([requests[i] for i in indices])):
+                tokenized[i] = sequences
+        return tokenized
 
-        processed_text = text.translate(str.maketrans('', '', string.punctuation)).strip()
-        # Note: Prediction continues even if processed_text is empty, tokenizer/model might handle it.
+    def predict_tokenized(
+        self, requests: List[PredictionRequest], tokenized: List[List[List[int]]], cascade: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Scores the output of tokenize_requests and formats one result per request,
+        running each model's share of the requests as its own batched pass.
+        """
+        results: List[Dict[str, Any] | None] = [None] * len(requests)
+        for spec, indices in self._group_by_model(requests).items():
+            # Pinned for the duration of the pass so the registry can't evict it underneath
+            model = self._registry.acquire(spec)
+            try:
+                outcomes = model.predict_tokenized([requests[i] for i in indices], [tokenized[i] for i in indices], cascade)
+            finally:
+                self._registry.release(model)
+            for i, result in zip(indices, outcomes):
+                results[i] = result
+        return results
 
+    def cascade_candidates(self, requests: List[PredictionRequest], first_sequences: List[List[int]]) -> List[int]:
+        """Indices of the requests the default model's cascade sends to its first stage. Used by app.calibration."""
+        self.check_ready()
+        model = self._registry.acquire(self._registry.default_spec)
         try:
-            inputs = self._tokenizer(
-                processed_text,
-                padding="max_length",
-                truncation=True,
-                max_length=settings.MODEL_MAX_LENGTH,
-                return_tensors="pt"
-            ).to(self._device) # Move inputs to the correct device directly
-
-            # Disable gradient calculations for efficiency
-            with torch.no_grad():
-                outputs = self._model(**inputs)
-                logits = outputs.logits
-                probabilities = F.softmax(logits, dim=1).squeeze()
-
-            probabilities_cpu = probabilities.cpu().numpy()
-            predicted_class_id = probabilities_cpu.argmax().item()
-
-            result = {
-                "softmax_score_class_0": float(probabilities_cpu[0]),
-                "softmax_score_class_1": float(probabilities_cpu[1]),
-                "predicted_class": int(predicted_class_id),
-                "predicted_label": "AI-generated" if predicted_class_id == 1 else "Human-written"
-            }
-            return result
+            return model.cascade_candidates(requests, first_sequences)
+        finally:
+            self._registry.release(model)
+
+    def score_cascade_stages(self, sequences: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the first-stage and full-model class probabilities of every
+        sequence under the default model, without applying the band. Used by app.calibration.
+        """
+        self.check_ready()
+        model = self._registry.acquire(self._registry.default_spec)
+        try:
+            return model.score_cascade_stages(sequences)
+        finally:
+            self._registry.release(model)
 
+    def score_sequences(self, sequences: List[List[int]], model: ModelSpec | None = None) -> np.ndarray:
+        """Class probabilities of already tokenized sequences under one model version."""
+        if not self.is_ready:
+            raise ModelInferenceError("Prediction service is not ready.")
+        model = self._registry.acquire(model or self._registry.default_spec)
+        try:
+            return model.score_sequences(sequences)
         except Exception as e:
             logger.error(f"Model inference failed: {e}", exc_info=True)
             raise ModelInferenceError(f"Inference error: {e}")
+        finally:
+            self._registry.release(model)
+
+    async def score_sequences_async(
+        self, sequences: List[List[int]], model: ModelSpec, context: RequestContext | None = None
+    ) -> np.ndarray:
+        """
+        Runs score_sequences on the inference executor as one admitted request,
+        waiting for capacity and client quota instead of rejecting. Used by
+        incremental sessions, whose windows are already tokenized.
+        """
+        context = context or RequestContext("local", settings.SCHEDULER_DEFAULT_PRIORITY)
+        self.check_ready()
+        await self._until_deadline(self._admit(context, 1, sum(len(sequence) for sequence in sequences), wait=True), context)
+        held = self._registry.hold(model)
+        try:
+            self._get_batcher() # Creates the executor
+            if isinstance(self._executor, ProcessPoolExecutor):
+                call = (_score_sequences_in_worker, sequences, model)
+            else:
+                call = (self.score_sequences, sequences, model)
+            return await asyncio.get_running_loop().run_in_executor(self._executor, *call)
+        finally:
+            self._registry.release(held)
+            self._finish(context, 1)
+
+    @property
+    def registry(self) -> ModelRegistry:
+        return self._registry
+
+    def _get_batcher(self) -> MicroBatcher:
+        """Lazily creates the executor and batcher so process-pool workers never spawn their own."""
+        if self._batcher is None:
+            self._executor = _build_executor()
+            predict_batch_fn = _predict_batch_in_worker if isinstance(self._executor, ProcessPoolExecutor) else self._predict_normalized
+            self._batcher = MicroBatcher(
+                predict_batch_fn,
+                max_batch_size=settings.BATCH_MAX_SIZE,
+                max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+                executor=self._executor,
+                max_concurrent_batches=settings.INFERENCE_WORKERS,
+            )
+        return self._batcher
+
+    def check_ready(self):
+        """Raises ServiceNotReadyError unless the model is loaded and warmed up."""
+        if self.is_ready:
+            return
+        if self._state == self.STATE_FAILED:
+            raise ServiceNotReadyError(detail="Model failed to load.", retry_after=settings.OVERLOAD_RETRY_AFTER_SECONDS)
+        raise ServiceNotReadyError(retry_after=settings.OVERLOAD_RETRY_AFTER_SECONDS)
+
+    async def _acquire_capacity(self, count: int, wait: bool, priority: str = STANDARD):
+        """
+        Admits `count` requests against the in-flight limit of their priority
+        class, at most INFERENCE_MAX_IN_FLIGHT. Raises ServiceOverloadedError
+        when saturated unless `wait` is set, in which case it waits until
+        enough in-flight requests have finished.
+        """
+        limit = in_flight_limit(priority)
+
+        def fits() -> bool:
+            # A single oversized admission is still allowed through an idle service
+            return self._in_flight == 0 or self._in_flight + count <= limit
+
+        if not fits():
+            if not wait:
+                logger.warning(f"Rejecting {priority} prediction request: {self._in_flight} requests already in flight.")
+                SCHEDULER_DECISIONS.labels(priority, "rejected_capacity").inc()
+                raise ServiceOverloadedError(retry_after=settings.OVERLOAD_RETRY_AFTER_SECONDS)
+            if self._capacity_freed is None:
+                self._capacity_freed = asyncio.Event()
+            while not fits():
+                self._capacity_freed.clear()
+                await self._capacity_freed.wait()
+        self._in_flight += count
+        IN_FLIGHT.inc(count)
+
+    def _release_capacity(self, count: int):
+        self._in_flight -= count
+        IN_FLIGHT.dec(count)
+        if self._capacity_freed is not None:
+            self._capacity_freed.set()
+
+    async def _admit(self, context: RequestContext, count: int, tokens: int, wait: bool):
+        """
+        Charges `count` requests costing `tokens` model tokens to the client's
+        quotas, then admits them against the global in-flight limit of their
+        priority class. Work whose deadline already passed is refused.
+        """
+        remaining = context.remaining()
+        if remaining is not None and remaining <= 0:
+            SCHEDULER_DECISIONS.labels(context.priority, "expired").inc(count)
+            raise DeadlineExceededError()
+        await self._quotas.acquire(context, count, tokens, wait)
+        try:
+            await self._acquire_capacity(count, wait, context.priority)
+        except BaseException:
+            self._quotas.release(context, count, refund_tokens=tokens)
+            raise
+        SCHEDULER_DECISIONS.labels(context.priority, "admitted").inc(count)
+
+    def _finish(self, context: RequestContext, count: int):
+        self._release_capacity(count)
+        self._quotas.release(context, count)
+
+    async def _until_deadline(self, awaitable, context: RequestContext):
+        """Awaits `awaitable`, giving up with DeadlineExceededError once the context's deadline passes."""
+        remaining = context.remaining()
+        if remaining is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, max(0.0, remaining))
+        except asyncio.TimeoutError:
+            # Cancelling a queued submission makes the batcher skip it
+            SCHEDULER_DECISIONS.labels(context.priority, "expired").inc()
+            raise DeadlineExceededError()
+
+    def scheduler_stats(self) -> Dict[str, Any]:
+        """Reports in-flight admissions, per-class limits and per-client quota usage."""
+        return {
+            "in_flight": self._in_flight,
+            "limits": {priority: in_flight_limit(priority) for priority in PRIORITY_CLASSES},
+            "clients": self._quotas.stats(),
+        }
+
+    async def predict_async(
+        self,
+        text: str,
+        long_document: bool = False,
+        aggregation: str = "mean",
+        model: str | None = None,
+        context: RequestContext | None = None,
+        segmentation: str | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Runs inference on the dedicated executor through the micro-batcher,
+        sharing a forward pass with concurrent requests. Rejects the call
+        immediately once its priority class's share of INFERENCE_MAX_IN_FLIGHT
+        or its client's quota is used up, and fails it once its deadline passes.
+        The model version is fixed at admission, so a concurrent swap of the
+        default never changes (or unloads) the model a request is scored with.
+        """
+        context = context or RequestContext("local", settings.SCHEDULER_DEFAULT_PRIORITY)
+        try:
+            self.check_ready()
+            spec = self._registry.resolve(model)
+            with STAGE_TIMERS["normalize"].time():
+                request = PredictionRequest(
+                    normalize_text(text), long_document, aggregation, spec, segment_text(text, segmentation)
+                )
+            cached = self._cache_lookup(request)
+            if cached is not None:
+                return cached
+
+            await self._admit(context, 1, request.estimated_tokens(), wait=False)
+            held = self._registry.hold(spec)
+            try:
+                submission = self._get_batcher().submit(request, context.rank, context.deadline)
+                result = await self._until_deadline(submission, context)
+            finally:
+                self._registry.release(held)
+                self._finish(context, 1)
+            self._cache_store(request, result)
+            return result
+        except Exception as e:
+            record_error(e)
+            raise
+
+    async def predict_many_async(
+        self, items: List[Dict[str, Any]], context: RequestContext | None = None
+    ) -> List[Dict[str, Any] | Exception]:
+        """
+        Scores several inputs (dicts with a "text" key and optional scoring
+        options) through the micro-batcher. Waits for executor capacity and
+        client quota instead of rejecting (up to the deadline), and returns an
+        exception in place of each failed item rather than failing the whole call.
+        """
+        context = context or RequestContext("local", settings.SCHEDULER_DEFAULT_PRIORITY)
+        self.check_ready()
+        results: List[Dict[str, Any] | Exception | None] = [None] * len(items)
+        requests: List[PredictionRequest | None] = [None] * len(items)
+        with STAGE_TIMERS["normalize"].time():
+            for i, item in enumerate(items):
+                try:
+                    spec = self._registry.resolve(item.get("model"))
+                except UnknownModelError as e:
+                    record_error(e)
+                    results[i] = e
+                    continue
+                requests[i] = PredictionRequest(
+                    normalize_text(item["text"]),
+                    item.get("long_document", False),
+                    item.get("aggregation", "mean"),
+                    spec,
+                    segment_text(item["text"], item.get("segmentation")),
+                )
+        for i, request in enumerate(requests):
+            if request is not None:
+                results[i] = self._cache_lookup(request)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        tokens = sum(requests[i].estimated_tokens() for i in missing)
+        await self._until_deadline(self._admit(context, len(missing), tokens, wait=True), context)
+        held = [self._registry.hold(requests[i].model) for i in missing]
+        try:
+            batcher = self._get_batcher()
+            computed = await asyncio.gather(
+                *(self._until_deadline(batcher.submit(requests[i], context.rank, context.deadline), context) for i in missing),
+                return_exceptions=True,
+            )
+        finally:
+            for model in held:
+                self._registry.release(model)
+            self._finish(context, len(missing))
+        for i, result in zip(missing, computed):
+            if isinstance(result, Exception):
+                record_error(result)
+            else:
+                self._cache_store(requests[i], result)
+            results[i] = result
+        return results
+
+    def _cache_namespace(self, request: PredictionRequest) -> List[Any]:
+        """Everything besides the normalized text that can change a prediction."""
+        spec = request.model or self._registry.default_spec
+        namespace = [spec.name, spec.revision, settings.MODEL_MAX_LENGTH, settings.INFERENCE_BACKEND]
+        if request.long_document:
+            namespace += [
+                "long_document", request.aggregation,
+                settings.LONG_DOCUMENT_WINDOW_STRIDE, settings.LONG_DOCUMENT_MAX_WINDOWS,
+            ]
+        if settings.CASCADE_ENABLED:
+            namespace += [
+                "cascade", settings.CASCADE_MODEL_NAME, settings.CASCADE_PREFIX_TOKENS,
+                settings.CASCADE_LOWER, settings.CASCADE_UPPER, _thresholds_fingerprint(),
+            ]
+        if request.segments:
+            # Offsets refer to the raw text, which normalization can shift, so they are part of the key
+            namespace += ["segments", [(segment.char_start, segment.char_end) for segment in request.segments]]
+        return namespace
+
+    def _cache_key(self, request: PredictionRequest) -> str:
+        """Keys a normalized text by everything that can change its prediction."""
+        return PredictionCache.make_key(request.text, *self._cache_namespace(request))
+
+    def _near_duplicate_namespace(self, request: PredictionRequest) -> str:
+        return PredictionCache.make_key("", *self._cache_namespace(request))
+
+    def _cache_lookup(self, request: PredictionRequest) -> Dict[str, Any] | None:
+        """
+        Returns the exact cached prediction, or in "reuse" mode the stored
+        prediction of a near-duplicate text, marked with its similarity.
+        """
+        if self._cache is not None:
+            cached = self._cache.get(self._cache_key(request))
+            if cached is not None:
+                return dict(cached)
+        # A near-duplicate's segment offsets would not line up with this text
+        if self._near_duplicates is None or settings.NEAR_DUPLICATE_MODE != "reuse" or request.segments:
+            return None
+        match = self._near_duplicates.lookup(request.text, self._near_duplicate_namespace(request))
+        if match is None:
+            return None
+        result, similarity = match
+        self._near_duplicates.record_outcome(reused=True)
+        NEAR_DUPLICATE_MATCHES.labels(action="reused").inc()
+        result["near_duplicate"] = {"similarity": similarity, "reused": True}
+        return result
+
+    def _cache_store(self, request: PredictionRequest, result: Dict[str, Any]):
+        """
+        Caches a computed prediction. In "flag" mode, `result` is also marked
+        in place when a near-duplicate of the text was scored recently.
+        """
+        if self._cache is not None:
+            self._cache.put(self._cache_key(request), dict(result))
+        if self._near_duplicates is None or request.segments:
+            return
+        namespace = self._near_duplicate_namespace(request)
+        match = None
+        if settings.NEAR_DUPLICATE_MODE == "flag":
+            match = self._near_duplicates.lookup(request.text, namespace)
+        self._near_duplicates.add(request.text, namespace, result)
+        if match is not None:
+            self._near_duplicates.record_outcome(reused=False)
+            NEAR_DUPLICATE_MATCHES.labels(action="flagged").inc()
+            result["near_duplicate"] = {"similarity": match[1], "reused": False}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Returns prediction cache counters."""
+        if self._cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._cache.stats()}
+
+    def near_duplicate_stats(self) -> Dict[str, Any]:
+        """Returns near-duplicate index counters, including the model calls it saved."""
+        if self._near_duplicates is None:
+            return {"enabled": False}
+        return {"enabled": True, "mode": settings.NEAR_DUPLICATE_MODE, **self._near_duplicates.stats()}
+
+    @property
+    def in_flight(self) -> int:
+        """Number of admitted requests that are queued or running."""
+        return self._in_flight
+
+    async def shutdown(self):
+        """Stops background batching work and the inference executor."""
+        if self._batcher is not None:
+            await self._batcher.stop()
+            self._batcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._cache is not None:
+            self._cache.close()
 
 
 @lru_cache()
 def get_text_detection_service() -> TextDetectionService:
     """Dependency injector providing the singleton TextDetectionService instance."""
-    try:
-        # Instantiation handles the initialization logic via __init__
-        return TextDetectionService()
-    except ModelLoadError as e:
-         logger.critical(f"Failed to get/initialize TextDetectionService: {e}", exc_info=True)
-         # Propagate runtime error if service cannot be instantiated (e.g., model load failed)
-         raise RuntimeError(f"Service initialization failed: {e}") from e
\ No newline at end of file
+    # Instantiation is cheap; the model itself is loaded by TextDetectionService.load()
+    return TextDetectionService()
\ No newline at end of file
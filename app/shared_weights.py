@@ -0,0 +1,103 @@
+# app/shared_weights.py
+import fcntl
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict
+
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification, PreTrainedModel
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WEIGHTS_FILE = "weights.pt"
+
+
+def shared_weights_dir(model_id: str | None = None) -> Path:
+    """Directory holding the read-only weights snapshot for a model version ("name@revision"), by default the configured one."""
+    model_id = model_id or f"{settings.MODEL_NAME}@{settings.MODEL_REVISION or 'main'}"
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_id)
+    return Path(settings.SHARED_WEIGHTS_DIR) / slug
+
+
+def materialize_shared_weights(source: str, load_kwargs: Dict[str, Any], model_id: str | None = None) -> Path:
+    """
+    Writes every parameter and buffer of the model to a single uncompressed
+    torch file that worker processes can memory-map. Only the first caller
+    does the work; concurrent callers block on a file lock until it exists.
+    """
+    target = shared_weights_dir(model_id)
+    target.mkdir(parents=True, exist_ok=True)
+    weights_path = target / _WEIGHTS_FILE
+    with open(target / ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if weights_path.exists():
+                return target
+            logger.info(f"Materializing shared weights for '{source}' in {target}")
+            model = AutoModelForSequenceClassification.from_pretrained(source, **load_kwargs)
+            tensors = {name: param.detach() for name, param in model.named_parameters()}
+            # Non-persistent buffers (e.g. rotary frequencies) are not in state_dict, so collect them explicitly
+            tensors.update({name: buffer for name, buffer in model.named_buffers()})
+            tmp_path = weights_path.with_suffix(".tmp")
+            torch.save(tensors, tmp_path)
+            model.config.save_pretrained(target)
+            # Rename last so workers never map a partially written file
+            os.replace(tmp_path, weights_path)
+            return target
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_shared_model(
+    source: str, load_kwargs: Dict[str, Any], model_kwargs: Dict[str, Any], model_id: str | None = None
+) -> PreTrainedModel:
+    """
+    Builds the model on the meta device and points every parameter and buffer
+    at the memory-mapped snapshot, so all workers on the host share the same
+    page-cache pages instead of holding private copies.
+    """
+    target = materialize_shared_weights(source, {**load_kwargs, **model_kwargs}, model_id)
+    config = AutoConfig.from_pretrained(target, **model_kwargs)
+    with torch.device("meta"):
+        model = AutoModelForSequenceClassification.from_config(config)
+
+    tensors = torch.load(target / _WEIGHTS_FILE, mmap=True, weights_only=True, map_location="cpu")
+    for name, tensor in tensors.items():
+        module_name, _, attr = name.rpartition(".")
+        module = model.get_submodule(module_name)
+        if attr in module._parameters:
+            module._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+        else:
+            module._buffers[attr] = tensor
+    model.tie_weights()
+
+    still_meta = [name for name, tensor in [*model.named_parameters(), *model.named_buffers()] if tensor.is_meta]
+    if still_meta:
+        raise RuntimeError(f"Shared weights snapshot in {target} is missing tensors: {still_meta[:5]}")
+    logger.info(f"Mapped shared weights from {target / _WEIGHTS_FILE}")
+    return model.eval()
+
+
+def configure_worker_threads():
+    """
+    Splits the host's cores between serving workers so they don't oversubscribe
+    the CPU. TORCH_NUM_THREADS overrides the automatic split.
+    """
+    threads = settings.TORCH_NUM_THREADS
+    if threads is None and settings.SERVING_WORKERS > 1:
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+        threads = max(1, cores // settings.SERVING_WORKERS)
+    if threads is None:
+        return
+    torch.set_num_threads(threads)
+    if settings.SERVING_WORKERS > 1:
+        try:
+            # Only allowed before any inter-op parallel work has started in this process
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+    logger.info(f"Using {threads} torch intra-op threads per worker ({settings.SERVING_WORKERS} workers).")
@@ -0,0 +1,163 @@
+# benchmarks/__main__.py
+"""
+Offline benchmark suite for the serving path.
+
+    python -m benchmarks run --output results.json
+    python -m benchmarks compare baseline.json results.json
+
+By default a tiny randomly initialized ModernBERT is built locally, so no
+network access is needed. Pass --model-dir to benchmark a real snapshot.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _configure_environment(args: argparse.Namespace):
+    """Points the app at the benchmark model. Must run before app.config is imported."""
+    if args.model_dir:
+        model_dir = Path(args.model_dir)
+    else:
+        from benchmarks.tiny_model import build_tiny_model
+
+        model_dir = build_tiny_model(Path(tempfile.gettempdir()) / "text-detection-tiny-modernbert", seed=args.seed)
+    os.environ["MODEL_LOCAL_DIR"] = str(model_dir)
+    os.environ.setdefault("MODEL_NAME", str(model_dir))
+    os.environ["HF_OFFLINE"] = "true"
+    # Measure the model, not the prediction cache
+    os.environ["CACHE_ENABLED"] = "false"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+async def _run_load_tests(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import httpx
+
+    from app.config import settings
+    from app.main import app
+    from benchmarks.load_test import run_load_test, wait_until_ready
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            await wait_until_ready(client, settings.API_PREFIX)
+            for concurrency in args.concurrency:
+                for words in args.text_lengths:
+                    results.append(await run_load_test(client, settings.API_PREFIX, concurrency, args.requests, words))
+    return results
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    _configure_environment(args)
+
+    import torch
+
+    from app.config import settings
+    from app.services import get_text_detection_service
+    from benchmarks.micro import run_micro_benchmarks
+
+    torch.manual_seed(args.seed)
+    service = get_text_detection_service()
+    service.load()
+
+    results = run_micro_benchmarks(service, args.batch_sizes, args.text_lengths, args.repeat)
+    if not args.skip_load_test:
+        results += asyncio.run(_run_load_tests(args))
+
+    return {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "model": settings.MODEL_LOCAL_DIR or settings.MODEL_NAME,
+            "inference_backend": settings.INFERENCE_BACKEND,
+            "batch_max_size": settings.BATCH_MAX_SIZE,
+            "batch_max_wait_ms": settings.BATCH_MAX_WAIT_MS,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def _result_key(result: Dict[str, Any]) -> tuple:
+    return (
+        result["benchmark"], result.get("text_words"), result.get("batch_size"), result.get("concurrency"),
+    )
+
+
+def compare(baseline_path: str, candidate_path: str):
+    """Prints p50/p95 latency and throughput changes between two result files."""
+    baseline = {_result_key(r): r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    candidate = json.loads(Path(candidate_path).read_text())["results"]
+    print(f"{'benchmark':<14}{'words':>7}{'batch':>7}{'conc':>6}{'p50 ms':>18}{'p95 ms':>18}{'throughput':>14}")
+    for result in candidate:
+        before = baseline.get(_result_key(result))
+        if before is None:
+            continue
+        throughput_key = "requests_per_second" if "requests_per_second" in result else "items_per_second"
+        change = result[throughput_key] / before[throughput_key] - 1 if before[throughput_key] else 0.0
+        print(
+            f"{result['benchmark']:<14}{result.get('text_words') or '-':>7}{result.get('batch_size') or '-':>7}"
+            f"{result.get('concurrency') or '-':>6}"
+            f"{before['p50_ms']:>8.2f} -> {result['p50_ms']:<7.2f}{before['p95_ms']:>8.2f} -> {result['p95_ms']:<7.2f}"
+            f"{change:>+13.1%}"
+        )
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subcommands.add_parser("run", help="Run the benchmark suite.")
+    run_parser.add_argument("--model-dir", help="Local model snapshot; defaults to a tiny random ModernBERT.")
+    run_parser.add_argument("--batch-sizes", type=_int_list, default=[1, 8, 32])
+    run_parser.add_argument("--text-lengths", type=_int_list, default=[32, 128, 480], help="Words per text.")
+    run_parser.add_argument("--concurrency", type=_int_list, default=[1, 16, 64])
+    run_parser.add_argument("--requests", type=int, default=200, help="Requests per load-test configuration.")
+    run_parser.add_argument("--repeat", type=int, default=20, help="Timed calls per micro-benchmark.")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--skip-load-test", action="store_true")
+    run_parser.add_argument("--output", help="Write JSON results here instead of stdout.")
+
+    compare_parser = subcommands.add_parser("compare", help="Compare two result files.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        compare(args.baseline, args.candidate)
+        return
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(report)
+        print(f"Wrote benchmark results to {args.output}", file=sys.stderr)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/load_test.py
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict
+
+import httpx
+
+from benchmarks.micro import summarize
+from benchmarks.tiny_model import synthetic_text
+
+
+async def wait_until_ready(client: httpx.AsyncClient, api_prefix: str, timeout: float = 300.0):
+    """Polls the readiness probe until the model is loaded and warmed up."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = await client.get(f"{api_prefix}/health/ready")
+        if response.status_code == 200:
+            return
+        if response.json().get("state") == "failed":
+            raise RuntimeError("Model failed to load; see the service logs.")
+        await asyncio.sleep(0.1)
+    raise TimeoutError("Service did not become ready in time.")
+
+
+async def run_load_test(
+    client: httpx.AsyncClient, api_prefix: str, concurrency: int, total_requests: int, text_words: int
+) -> Dict[str, Any]:
+    """
+    Sends `total_requests` POST /predict calls from `concurrency` concurrent
+    clients and reports latency percentiles and requests per second.
+    Texts are unique so the prediction cache never answers for the model.
+    """
+    texts = [synthetic_text(text_words, seed=i) for i in range(total_requests)]
+    latencies = []
+    statuses: Counter = Counter()
+    next_index = iter(range(total_requests))
+
+    async def worker():
+        for index in next_index:
+            start = time.perf_counter()
+            response = await client.post(f"{api_prefix}/predict", json={"text": texts[index]})
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - started
+
+    stats = summarize(latencies, 1)
+    stats.pop("items_per_second")
+    return {
+        "benchmark": "load_test",
+        "concurrency": concurrency,
+        "text_words": text_words,
+        "requests": total_requests,
+        "requests_per_second": total_requests / elapsed if elapsed > 0 else 0.0,
+        "status_counts": {str(code): count for code, count in sorted(statuses.items())},
+        **stats,
+    }
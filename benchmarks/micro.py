@@ -0,0 +1,63 @@
+# benchmarks/micro.py
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.tiny_model import synthetic_text
+
+
+def summarize(durations: List[float], items_per_call: int) -> Dict[str, float]:
+    """Latency percentiles in milliseconds plus throughput in items per second."""
+    values = np.asarray(durations, dtype=np.float64)
+    return {
+        "calls": len(durations),
+        "mean_ms": float(values.mean() * 1000),
+        "p50_ms": float(np.percentile(values, 50) * 1000),
+        "p95_ms": float(np.percentile(values, 95) * 1000),
+        "p99_ms": float(np.percentile(values, 99) * 1000),
+        "items_per_second": float(items_per_call * len(values) / values.sum()) if values.sum() > 0 else 0.0,
+    }
+
+
+def time_calls(fn: Callable[[], Any], repeat: int, items_per_call: int = 1) -> Dict[str, float]:
+    """Calls `fn` once untimed, then `repeat` times timed."""
+    fn()
+    durations = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return summarize(durations, items_per_call)
+
+
+def run_micro_benchmarks(
+    service, batch_sizes: List[int], text_lengths: List[int], repeat: int
+) -> List[Dict[str, Any]]:
+    """Times text normalization, tokenization and TextDetectionService.predict_batch."""
+    from app.config import settings
+    from app.services import normalize_text
+
+    results = []
+    for words in text_lengths:
+        texts = [synthetic_text(words, seed=i) for i in range(max(batch_sizes))]
+        results.append({
+            "benchmark": "normalize", "text_words": words, "batch_size": 1,
+            **time_calls(lambda: normalize_text(texts[0]), repeat * 10),
+        })
+        for batch_size in batch_sizes:
+            batch = texts[:batch_size]
+            normalized = [normalize_text(text) for text in batch]
+            results.append({
+                "benchmark": "tokenize", "text_words": words, "batch_size": batch_size,
+                **time_calls(
+                    lambda: service.tokenizer(normalized, padding=False, truncation=True, max_length=settings.MODEL_MAX_LENGTH),
+                    repeat,
+                    batch_size,
+                ),
+            })
+            results.append({
+                "benchmark": "predict_batch", "text_words": words, "batch_size": batch_size,
+                **time_calls(lambda: service.predict_batch(batch), repeat, batch_size),
+            })
+    return results
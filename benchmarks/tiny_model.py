@@ -0,0 +1,73 @@
+# benchmarks/tiny_model.py
+import random
+from pathlib import Path
+
+# Words used both to build the tiny vocabulary and to generate benchmark texts
+VOCABULARY = [
+    "the", "a", "of", "and", "to", "in", "is", "that", "it", "was", "for", "on", "are", "with", "as",
+    "model", "text", "human", "written", "article", "essay", "story", "data", "learning", "language",
+    "network", "research", "writer", "reader", "generated", "detect", "sentence", "paragraph", "word",
+    "modern", "transformer", "attention", "training", "evaluation", "result", "people", "time", "world",
+]
+
+
+def synthetic_text(num_words: int, seed: int = 0) -> str:
+    """Deterministic pseudo-English text with punctuation, roughly one token per word."""
+    rng = random.Random(seed)
+    words = []
+    for i in range(num_words):
+        word = rng.choice(VOCABULARY)
+        words.append(word + ("." if i % 12 == 11 else "," if i % 5 == 4 else ""))
+    return " ".join(words)
+
+
+def build_tiny_model(directory: str | Path, seed: int = 0) -> Path:
+    """
+    Saves a randomly initialized ModernBERT classifier and a matching word-level
+    tokenizer to `directory`, entirely offline. Reuses the directory if it exists.
+    """
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    from transformers import AutoModelForSequenceClassification, ModernBertConfig, PreTrainedTokenizerFast
+
+    directory = Path(directory)
+    if (directory / "config.json").exists() and (directory / "tokenizer.json").exists():
+        return directory
+    directory.mkdir(parents=True, exist_ok=True)
+
+    special_tokens = ["[PAD]", "[CLS]", "[SEP]", "[UNK]", "[MASK]"]
+    vocab = {token: i for i, token in enumerate(special_tokens + VOCABULARY)}
+    tokenizer = Tokenizer(models.WordLevel(vocab=vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        pair="[CLS] $A [SEP] $B [SEP]",
+        special_tokens=[("[CLS]", vocab["[CLS]"]), ("[SEP]", vocab["[SEP]"])],
+    )
+    PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        pad_token="[PAD]",
+        cls_token="[CLS]",
+        sep_token="[SEP]",
+        unk_token="[UNK]",
+        mask_token="[MASK]",
+        model_max_length=8192,
+    ).save_pretrained(directory)
+
+    torch.manual_seed(seed)
+    config = ModernBertConfig(
+        vocab_size=len(vocab),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        max_position_embeddings=1024,
+        num_labels=2,
+        pad_token_id=vocab["[PAD]"],
+        cls_token_id=vocab["[CLS]"],
+        sep_token_id=vocab["[SEP]"],
+        bos_token_id=vocab["[CLS]"],
+        eos_token_id=vocab["[SEP]"],
+    )
+    AutoModelForSequenceClassification.from_config(config).save_pretrained(directory)
+    return directory
@@ -0,0 +1,329 @@
+"""Distills the fine-tuned ModernBERT detector into a smaller student for CPU serving.
+
+    TEACHER_MODEL_PATH=./saved_model_ai python training/model_training/distill_mbertt.py
+
+Reuses the data preparation and token cache of model_training_mbertt.py. The
+teacher scores every training and test example once, in length-sorted
+batches, and its logits are saved under TEACHER_LOGITS_DIR; later runs (for
+example with a different student size) load them instead of running the
+teacher again. The student keeps the teacher's tokenizer and either a subset
+of its layers (initialized from the matching teacher layers) or, with
+STUDENT_HIDDEN_SIZE, a narrower width trained from scratch. It is trained on
+a blend of the softened teacher distribution and the labels, then saved with
+the tokenizer to STUDENT_OUTPUT_DIR, a directory the service loads as
+MODEL_NAME, CASCADE_MODEL_NAME or a MODEL_REGISTRY entry. A report with the
+student's F1 delta and CPU speedup against the teacher is written next to it.
+"""
+
+import torch
+import torch.nn.functional as F
+import numpy as np
+from datasets import Dataset
+from transformers import (
+    AutoTokenizer,
+    AutoModelForSequenceClassification,
+    AutoConfig,
+    DataCollatorWithPadding,
+    PreTrainedModel,
+    PreTrainedTokenizerBase,
+    TrainingArguments,
+)
+from sklearn.metrics import f1_score
+import gc
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Dict, List
+
+from model_training_mbertt import (
+    DATA_PATH,
+    MAX_LENGTH,
+    LengthGroupedTrainer,
+    compute_metrics,
+    load_tokenized_dataset,
+    token_cache_key,
+)
+
+
+TEACHER_MODEL_PATH = os.getenv("TEACHER_MODEL_PATH", "./saved_model_ai")
+STUDENT_OUTPUT_DIR = os.getenv("STUDENT_OUTPUT_DIR", "./saved_model_ai_student")
+TEACHER_LOGITS_DIR = os.getenv("TEACHER_LOGITS_DIR", "teacher_logits")
+TEACHER_BATCH_SIZE = int(os.getenv("TEACHER_BATCH_SIZE", "64"))
+# Student shape: fewer layers than the teacher, and optionally a narrower hidden size
+STUDENT_NUM_LAYERS = int(os.getenv("STUDENT_NUM_LAYERS", "6"))
+STUDENT_HIDDEN_SIZE = int(os.getenv("STUDENT_HIDDEN_SIZE", "0")) or None
+# Loss = ALPHA * KL(student || teacher at TEMPERATURE) * TEMPERATURE^2 + (1 - ALPHA) * cross-entropy on labels
+DISTILLATION_TEMPERATURE = float(os.getenv("DISTILLATION_TEMPERATURE", "2.0"))
+DISTILLATION_ALPHA = float(os.getenv("DISTILLATION_ALPHA", "0.5"))
+# CPU timing sample for the speedup report
+SPEED_SAMPLE_SIZE = int(os.getenv("SPEED_SAMPLE_SIZE", "256"))
+SPEED_BATCH_SIZE = int(os.getenv("SPEED_BATCH_SIZE", "8"))
+
+# Matches the layer index in parameter names such as "model.layers.3.attn.Wqkv.weight"
+_LAYER_INDEX = re.compile(r"(\.layers?\.)(\d+)\.")
+
+def teacher_fingerprint(teacher_path: str = TEACHER_MODEL_PATH) -> str:
+    """_Identifies the teacher weights: file sizes and times for a local directory, else the Hub id._"""
+    if not os.path.isdir(teacher_path):
+        return teacher_path
+    files = []
+    for name in sorted(os.listdir(teacher_path)):
+        stat = os.stat(os.path.join(teacher_path, name))
+        files.append([name, stat.st_size, int(stat.st_mtime)])
+    return json.dumps([os.path.abspath(teacher_path), files])
+
+def pad_batch(sequences: List[List[int]], tokenizer: PreTrainedTokenizerBase, device: torch.device) -> Dict[str, torch.Tensor]:
+    """_Pads token id lists to the longest one in the batch and moves them to the device._"""
+    batch = tokenizer.pad({"input_ids": sequences}, return_tensors="pt")
+    return {key: value.to(device) for key, value in batch.items()}
+
+@torch.no_grad()
+def score_logits(
+    model: PreTrainedModel,
+    tokenizer: PreTrainedTokenizerBase,
+    dataset: Dataset,
+    batch_size: int = TEACHER_BATCH_SIZE,
+) -> np.ndarray:
+    """_Returns the model's logits for every row of a tokenized split, in row order._
+
+    Rows are scored in batches of similar length so little compute is spent
+    on padding.
+
+    Args:
+        model (PreTrainedModel): _model to run, already on its device._
+        tokenizer (PreTrainedTokenizerBase): _tokenizer used for padding._
+        dataset (Dataset): _split with input_ids and length columns._
+        batch_size (int): _rows per forward pass._
+
+    Returns:
+        np.ndarray: _(rows, num_labels) float32 logits._
+    """
+    model.eval()
+    device = next(model.parameters()).device
+    order = np.argsort(np.asarray(dataset["length"]), kind="stable")
+    logits = np.zeros((len(dataset), model.config.num_labels), dtype=np.float32)
+    for start in range(0, len(order), batch_size):
+        indices = order[start:start + batch_size]
+        inputs = pad_batch(dataset.select(indices)["input_ids"], tokenizer, device)
+        logits[indices] = model(**inputs).logits.float().cpu().numpy()
+    return logits
+
+def load_teacher_logits(
+    teacher: PreTrainedModel,
+    tokenizer: PreTrainedTokenizerBase,
+    tokenized: Dict[str, Dataset],
+    cache_dir: str = TEACHER_LOGITS_DIR,
+) -> Dict[str, np.ndarray]:
+    """_Returns the teacher's logits for every split, running the teacher only on the first run._
+
+    Logits are saved as .npy files under cache_dir, keyed by the token cache
+    (which fixes the row order) and the teacher weights.
+
+    Args:
+        teacher (PreTrainedModel): _teacher model, already on its device._
+        tokenizer (PreTrainedTokenizerBase): _shared tokenizer._
+        tokenized (Dict[str, Dataset]): _tokenized splits from load_tokenized_dataset._
+        cache_dir (str): _directory holding logit caches._
+
+    Returns:
+        Dict[str, np.ndarray]: _(rows, num_labels) logits per split._
+    """
+    description = json.dumps([token_cache_key(tokenizer), teacher_fingerprint()])
+    key = hashlib.sha256(description.encode("utf-8")).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f"logits-{key}")
+    if os.path.isdir(cache_path):
+        print(f"Loading teacher logits from {cache_path}")
+        return {split: np.load(os.path.join(cache_path, f"{split}.npy")) for split in tokenized}
+
+    tmp_path = cache_path + ".tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    logits = {}
+    for split, dataset in tokenized.items():
+        started = time.perf_counter()
+        logits[split] = score_logits(teacher, tokenizer, dataset)
+        np.save(os.path.join(tmp_path, f"{split}.npy"), logits[split])
+        print(f"Scored {len(dataset)} {split} rows with the teacher in {time.perf_counter() - started:.1f}s")
+    # Renamed into place only once every split is written, so an interrupted run is never reused
+    os.replace(tmp_path, cache_path)
+    print(f"Saved teacher logits to {cache_path}")
+    return logits
+
+def load_model(path: str) -> PreTrainedModel:
+    """_Loads a sequence classifier on the GPU when available, else the CPU._"""
+    model = AutoModelForSequenceClassification.from_pretrained(path)
+    if torch.cuda.is_available():
+        model.cuda()
+    return model.eval()
+
+def build_student(teacher: PreTrainedModel) -> PreTrainedModel:
+    """_Builds the student from the teacher's config with fewer layers and, optionally, a narrower width._
+
+    At the teacher's width the student starts from evenly spaced teacher
+    layers (always including the first), plus the teacher's embeddings and
+    classification head. A narrower student is initialized from scratch.
+
+    Args:
+        teacher (PreTrainedModel): _fine-tuned teacher._
+
+    Returns:
+        PreTrainedModel: _student classifier with the teacher's labels._
+    """
+    config = AutoConfig.from_pretrained(TEACHER_MODEL_PATH)
+    teacher_layers = config.num_hidden_layers
+    config.num_hidden_layers = min(STUDENT_NUM_LAYERS, teacher_layers)
+    kept = np.linspace(0, teacher_layers - 1, config.num_hidden_layers).round().astype(int).tolist()
+    if getattr(config, "layer_types", None):
+        # Kept layers keep their attention type (global or sliding-window)
+        config.layer_types = [config.layer_types[index] for index in kept]
+    if STUDENT_HIDDEN_SIZE and STUDENT_HIDDEN_SIZE != config.hidden_size:
+        # Heads keep the teacher's size, and the feed-forward block keeps its ratio to the hidden size
+        head_size = config.hidden_size // config.num_attention_heads
+        config.intermediate_size = config.intermediate_size * STUDENT_HIDDEN_SIZE // config.hidden_size
+        config.num_attention_heads = max(1, STUDENT_HIDDEN_SIZE // head_size)
+        config.hidden_size = config.num_attention_heads * head_size
+        return AutoModelForSequenceClassification.from_config(config)
+
+    student = AutoModelForSequenceClassification.from_config(config)
+    renumber = {teacher_index: student_index for student_index, teacher_index in enumerate(kept)}
+    state = {}
+    for name, tensor in teacher.state_dict().items():
+        match = _LAYER_INDEX.search(name)
+        if match:
+            if int(match.group(2)) not in renumber:
+                continue
+            name = name[:match.start()] + f"{match.group(1)}{renumber[int(match.group(2))]}." + name[match.end():]
+        state[name] = tensor
+    missing, _ = student.load_state_dict(state, strict=False)
+    print(f"Initialized student from teacher layers {kept}" + (f"; {len(missing)} tensors left untrained" if missing else ""))
+    return student
+
+class DistillationTrainer(LengthGroupedTrainer):
+    """_Trainer that fits the student to the teacher's softened logits as well as the labels._"""
+    def __init__(self, *args, temperature: float, alpha: float, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._temperature = temperature
+        self._alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        teacher_logits = inputs.pop("teacher_logits")
+        outputs = model(**inputs)
+        logits = outputs.logits
+        soft_loss = F.kl_div(
+            F.log_softmax(logits / self._temperature, dim=-1),
+            F.softmax(teacher_logits / self._temperature, dim=-1),
+            reduction="batchmean",
+        ) * self._temperature ** 2
+        hard_loss = F.cross_entropy(logits, inputs["labels"])
+        loss = self._alpha * soft_loss + (1 - self._alpha) * hard_loss
+        return (loss, outputs) if return_outputs else loss
+
+@torch.no_grad()
+def measure_cpu_throughput(model: PreTrainedModel, tokenizer: PreTrainedTokenizerBase, dataset: Dataset) -> Dict:
+    """_Times CPU inference over a fixed sample of test rows, in the serving path's batch size._
+
+    Args:
+        model (PreTrainedModel): _model to time; moved to the CPU._
+        tokenizer (PreTrainedTokenizerBase): _tokenizer used for padding._
+        dataset (Dataset): _tokenized test split._
+
+    Returns:
+        Dict: _rows per second and mean batch latency in milliseconds._
+    """
+    model = model.cpu().eval()
+    sample = dataset.select(range(min(SPEED_SAMPLE_SIZE, len(dataset))))["input_ids"]
+    batches = [sample[start:start + SPEED_BATCH_SIZE] for start in range(0, len(sample), SPEED_BATCH_SIZE)]
+    cpu = torch.device("cpu")
+    model(**pad_batch(batches[0], tokenizer, cpu))  # Warm-up
+    started = time.perf_counter()
+    for batch in batches:
+        model(**pad_batch(batch, tokenizer, cpu))
+    elapsed = time.perf_counter() - started
+    return {"rows_per_second": len(sample) / elapsed, "batch_latency_ms": elapsed / len(batches) * 1000}
+
+def distill() -> Dict:
+    # Clear GPU memory
+    torch.cuda.empty_cache()
+    gc.collect()
+
+    # The student shares the teacher's tokenizer, so the token cache from training is reused as is
+    tokenizer = AutoTokenizer.from_pretrained(TEACHER_MODEL_PATH)
+    tokenized = load_tokenized_dataset(tokenizer)
+    teacher = load_model(TEACHER_MODEL_PATH)
+    logits = load_teacher_logits(teacher, tokenizer, tokenized)
+
+    train_dataset = tokenized["train"].add_column("teacher_logits", logits["train"].tolist())
+    test_dataset = tokenized["test"].add_column("teacher_logits", logits["test"].tolist())
+    train_lengths = train_dataset["length"]
+    # Unused columns are kept so teacher_logits reaches compute_loss; length is dropped here instead
+    train_dataset = train_dataset.remove_columns("length")
+    test_dataset = test_dataset.remove_columns("length")
+
+    student = build_student(teacher)
+    training_args = TrainingArguments(
+        output_dir="distilled_modern_bert",
+        learning_rate=1e-4,
+        per_device_train_batch_size=16,
+        per_device_eval_batch_size=16,
+        num_train_epochs=3,
+        lr_scheduler_type="linear",
+        optim="adamw_torch",
+        weight_decay=1e-2,
+        logging_strategy="epoch",
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        load_best_model_at_end=True,
+        metric_for_best_model="f1",
+        fp16=torch.cuda.is_available(),
+        remove_unused_columns=False,
+        dataloader_num_workers=2,
+        push_to_hub=False,
+        report_to=[],
+    )
+    trainer = DistillationTrainer(
+        model=student,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=test_dataset,
+        data_collator=DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8),
+        compute_metrics=compute_metrics,
+        train_lengths=train_lengths,
+        temperature=DISTILLATION_TEMPERATURE,
+        alpha=DISTILLATION_ALPHA,
+    )
+    trainer.train()
+
+    # Saved with the tokenizer so the directory loads directly as a serving model
+    student = trainer.model
+    student.save_pretrained(STUDENT_OUTPUT_DIR)
+    tokenizer.save_pretrained(STUDENT_OUTPUT_DIR)
+
+    labels = np.asarray(test_dataset["labels"])
+    teacher_f1 = f1_score(labels, logits["test"].argmax(axis=1), average="weighted")
+    student_f1 = f1_score(labels, trainer.predict(test_dataset).predictions.argmax(axis=1), average="weighted")
+    teacher_speed = measure_cpu_throughput(teacher, tokenizer, tokenized["test"])
+    student_speed = measure_cpu_throughput(student, tokenizer, tokenized["test"])
+    report = {
+        "teacher": TEACHER_MODEL_PATH,
+        "student": STUDENT_OUTPUT_DIR,
+        "student_layers": student.config.num_hidden_layers,
+        "student_hidden_size": student.config.hidden_size,
+        "teacher_parameters": sum(p.numel() for p in teacher.parameters()),
+        "student_parameters": sum(p.numel() for p in student.parameters()),
+        "teacher_f1": teacher_f1,
+        "student_f1": student_f1,
+        "f1_delta": student_f1 - teacher_f1,
+        "teacher_cpu": teacher_speed,
+        "student_cpu": student_speed,
+        "cpu_speedup": student_speed["rows_per_second"] / teacher_speed["rows_per_second"],
+        "max_length": MAX_LENGTH,
+        "data": DATA_PATH,
+    }
+    with open(os.path.join(STUDENT_OUTPUT_DIR, "distillation_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("Distillation Results:", json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    distill()
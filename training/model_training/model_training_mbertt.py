@@ -12,30 +12,36 @@ Original file is located at
 # !pip install -U transformers>=4.48.0
 
 import torch
-import pandas as pd
 import numpy as np
-from datasets import Dataset, DatasetDict
-from sklearn.model_selection import train_test_split
-import torch
+from datasets import Dataset, DatasetDict, load_from_disk
 from transformers import (
     AutoTokenizer,
     AutoModelForSequenceClassification,
     AutoConfig,
+    DataCollatorWithPadding,
+    PreTrainedTokenizerBase,
     TrainingArguments,
     Trainer,
 )
+from transformers.trainer_pt_utils import LengthGroupedSampler
 import string
 from sklearn.metrics import f1_score
+from sklearn.model_selection import train_test_split
 import gc
-from typing import Optional, Tuple, Dict
-
+import hashlib
+import json
+import os
+from typing import List, Optional, Tuple, Dict
 
-# Clear GPU memory
-torch.cuda.empty_cache()
-gc.collect()
 
-# Load and preprocess the dataset
-df = pd.read_csv('/content/drive/MyDrive/final_data_1.csv')
+MODEL_CHECKPOINT = "answerdotai/ModernBERT-base"
+MAX_LENGTH = 512
+# A CSV export, or the memory-mapped Arrow file built by training/utils/utils.py
+DATA_PATH = os.getenv("TRAINING_DATA_PATH", "/content/drive/MyDrive/final_data_1.csv")
+TOKEN_CACHE_DIR = os.getenv("TOKEN_CACHE_DIR", "token_cache")
+NUM_PROC = max(1, os.cpu_count() or 1)
+# Bump whenever preprocessing or tokenization changes so stale token caches are rebuilt
+TOKEN_CACHE_VERSION = 1
 
 # Remove punctuation
 def remove_punctuation(text:str) -> Optional[str]:
@@ -49,62 +55,130 @@ def remove_punctuation(text:str) -> Optional[str]:
     """
     return text.translate(str.maketrans('', '', string.punctuation))
 
-def preprocess_and_split(df: pd.Dataframe = df) -> Tuple[pd.DataFrame]:
+def load_raw_dataset(data_path: str = DATA_PATH) -> Dataset:
+    """_Loads the text and label columns without reading them into memory._
+
+    Args:
+        data_path (str): _CSV file, or Arrow file from training/utils/utils.py._
+
+    Returns:
+        Dataset: _an Arrow-backed, memory-mapped dataset._
+    """
+    if data_path.endswith(".arrow"):
+        dataset = Dataset.from_file(data_path)
+    else:
+        dataset = Dataset.from_csv(data_path)
+    return dataset.select_columns(["text", "label"])
+
+def preprocess_and_split(dataset: Dataset, num_proc: int = NUM_PROC) -> DatasetDict:
     """_Applies text cleaning preprocessing and performs train test
     split._
 
     Args:
-        df (pd.Dataframe, optional): _dataframe to clean and split._. Defaults to df.
+        dataset (Dataset): _dataset to clean and split._
+        num_proc (int): _worker processes for the cleaning pass._
 
     Returns:
-        Tuple[pd.DataFrame]: _Tuple of train_df and test_df._
+        DatasetDict: _train and test splits._
     """
-    df['text'] = df['text'].apply(remove_punctuation)
-    # Split into train and test
-    train_df, test_df = train_test_split(df, test_size=0.3, random_state=23)
-    
-    return train_df, test_df
-
-train_df, test_df = preprocess_and_split()
-
-# Convert to HuggingFace Dataset
-train_data = Dataset.from_pandas(train_df)
-test_data = Dataset.from_pandas(test_df)
-train_data = train_data.remove_columns(["__index_level_0__"])
-test_data = test_data.remove_columns(["__index_level_0__"])
-
-dataset_dict = DatasetDict({
-    'train': train_data,
-    'test': test_data
-})
-
-# Tokenizer and model setup
-tokenizer = AutoTokenizer.from_pretrained("answerdotai/ModernBERT-base")
-
-# Reduce max_length to save memory
-def tokenizer_function(example):
-    return tokenizer(
-        example["text"],
-        padding="max_length",
-        truncation=True,
-        max_length=512,  # Reduced from 650, kept running into cuda out of memory error
-        return_tensors="pt"
+    # Split into train and test. The indices come from sklearn so the held-out set
+    # is the same as when the split was taken from the full DataFrame.
+    train_indices, test_indices = train_test_split(np.arange(len(dataset)), test_size=0.3, random_state=23)
+    splits = DatasetDict({
+        'train': dataset.select(train_indices),
+        'test': dataset.select(test_indices)
+    })
+    splits = splits.filter(lambda text: isinstance(text, str), input_columns="text", num_proc=num_proc)
+    return splits.map(
+        lambda batch: {"text": [remove_punctuation(text) for text in batch["text"]]},
+        batched=True,
+        num_proc=num_proc,
     )
 
-# Tokenize the dataset
-tokenized_train_dataset = dataset_dict["train"].map(tokenizer_function, batched=True)
-tokenized_test_dataset = dataset_dict["test"].map(tokenizer_function, batched=True)
+def tokenizer_function(batch: Dict, tokenizer: PreTrainedTokenizerBase, max_length: int = MAX_LENGTH) -> Dict:
+    # No padding here: batches are padded to their longest member by the collator.
+    # Attention masks are rebuilt by the collator too, so only the ids and lengths are stored.
+    encodings = tokenizer(batch["text"], truncation=True, max_length=max_length, return_attention_mask=False)
+    return {
+        "input_ids": encodings["input_ids"],
+        "length": [len(ids) for ids in encodings["input_ids"]],
+    }
+
+def token_cache_key(tokenizer: PreTrainedTokenizerBase, data_path: str = DATA_PATH, max_length: int = MAX_LENGTH) -> str:
+    """_Identifies a tokenized dataset by the tokenizer's vocabulary and settings and the source data file._"""
+    if tokenizer.is_fast:
+        vocabulary = tokenizer.backend_tokenizer.to_str()
+    else:
+        vocabulary = json.dumps(tokenizer.get_vocab(), sort_keys=True)
+    stat = os.stat(data_path)
+    description = {
+        "version": TOKEN_CACHE_VERSION,
+        "tokenizer": tokenizer.name_or_path,
+        "vocabulary": hashlib.sha256(vocabulary.encode("utf-8")).hexdigest(),
+        "max_length": max_length,
+        "data": [os.path.abspath(data_path), stat.st_size, int(stat.st_mtime)],
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def load_tokenized_dataset(
+    tokenizer: PreTrainedTokenizerBase,
+    data_path: str = DATA_PATH,
+    cache_dir: str = TOKEN_CACHE_DIR,
+    max_length: int = MAX_LENGTH,
+    num_proc: int = NUM_PROC,
+) -> DatasetDict:
+    """_Returns the tokenized train/test splits, tokenizing only on the first run._
+
+    The result is saved as Arrow files under cache_dir, keyed by
+    token_cache_key, and later runs memory-map it instead of re-tokenizing.
 
-# Print a sample
-print(tokenized_test_dataset[0])
+    Args:
+        tokenizer (PreTrainedTokenizerBase): _tokenizer the model is trained with._
+        data_path (str): _CSV or Arrow source file._
+        cache_dir (str): _directory holding token caches._
+        max_length (int): _truncation length._
+        num_proc (int): _tokenization worker processes._
 
-# Load model config and model for classification
-config = AutoConfig.from_pretrained("answerdotai/ModernBERT-base", num_labels=2)
-model = AutoModelForSequenceClassification.from_config(config)
+    Returns:
+        DatasetDict: _splits with input_ids, length and labels columns._
+    """
+    cache_path = os.path.join(cache_dir, f"tokens-{token_cache_key(tokenizer, data_path, max_length)}")
+    if os.path.exists(os.path.join(cache_path, "dataset_dict.json")):
+        print(f"Loading token cache from {cache_path}")
+        return load_from_disk(cache_path)
+
+    dataset_dict = preprocess_and_split(load_raw_dataset(data_path), num_proc=num_proc)
+    tokenized = dataset_dict.map(
+        tokenizer_function,
+        batched=True,
+        num_proc=num_proc,
+        remove_columns=["text"],
+        fn_kwargs={"tokenizer": tokenizer, "max_length": max_length},
+    ).rename_column('label', 'labels')
+
+    # Saved under a temporary name first so an interrupted run never leaves a partial cache behind
+    tmp_path = cache_path + ".tmp"
+    tokenized.save_to_disk(tmp_path)
+    os.replace(tmp_path, cache_path)
+    print(f"Saved token cache to {cache_path}")
+    return load_from_disk(cache_path)
+
+class LengthGroupedTrainer(Trainer):
+    """_Trainer whose training batches group examples of similar length, using the cached lengths._
+
+    Combined with dynamic padding, most batches carry little padding. The
+    lengths are passed in because the Trainer drops the length column
+    before it builds the sampler.
+    """
+    def __init__(self, *args, train_lengths: List[int], **kwargs):
+        super().__init__(*args, **kwargs)
+        self._train_lengths = train_lengths
 
-# Prepare datasets
-train_dataset = tokenized_train_dataset.remove_columns(['text']).rename_column('label', 'labels')
-test_dataset = tokenized_test_dataset.remove_columns(['text']).rename_column('label', 'labels')
+    def _get_train_sampler(self, *args, **kwargs):
+        return LengthGroupedSampler(
+            self.args.train_batch_size * self.args.gradient_accumulation_steps,
+            lengths=self._train_lengths,
+        )
 
 # Metric function
 def compute_metrics(eval_pred) -> Dict:
@@ -113,69 +187,90 @@ def compute_metrics(eval_pred) -> Dict:
     score = f1_score(labels, predictions, average="weighted")
     return {"f1": score}
 
-# Training arguments with memory-optimized params
-training_args = TrainingArguments(
-    output_dir="fine_tuned_modern_bert",
-    learning_rate=5e-5,
-    per_device_train_batch_size=8,  # Reduced from 32
-    per_device_eval_batch_size=8,   # Reduced from 32
-    num_train_epochs=3,
-    lr_scheduler_type="linear",
-    optim="adamw_torch",
-    adam_beta1=0.9,
-    adam_beta2=0.98,
-    adam_epsilon=1e-6,
-    weight_decay=8e-6,
-    logging_strategy="epoch",
-    eval_strategy="epoch",
-    save_strategy="epoch",
-    load_best_model_at_end=True,
-    fp16=True,  # Mixed precision for memory efficiency
-    gradient_checkpointing=True,  # Save GPU memory
-    push_to_hub=False,
-)
+def train() -> Tuple[AutoModelForSequenceClassification, PreTrainedTokenizerBase]:
+    # Clear GPU memory
+    torch.cuda.empty_cache()
+    gc.collect()
+
+    # Tokenizer and model setup
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_CHECKPOINT)
+
+    # Tokenize the dataset (cached after the first run)
+    tokenized = load_tokenized_dataset(tokenizer)
+    train_dataset = tokenized["train"]
+    test_dataset = tokenized["test"]
+
+    # Print a sample
+    print(test_dataset[0])
+
+    # Load model config and model for classification
+    config = AutoConfig.from_pretrained(MODEL_CHECKPOINT, num_labels=2)
+    model = AutoModelForSequenceClassification.from_config(config)
+
+    # Training arguments with memory-optimized params
+    training_args = TrainingArguments(
+        output_dir="fine_tuned_modern_bert",
+        learning_rate=5e-5,
+        per_device_train_batch_size=8,  # Batches are padded to their longest member, so this can be raised
+        per_device_eval_batch_size=8,
+        num_train_epochs=3,
+        lr_scheduler_type="linear",
+        optim="adamw_torch",
+        adam_beta1=0.9,
+        adam_beta2=0.98,
+        adam_epsilon=1e-6,
+        weight_decay=8e-6,
+        logging_strategy="epoch",
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        load_best_model_at_end=True,
+        fp16=True,  # Mixed precision for memory efficiency
+        gradient_checkpointing=True,  # Save GPU memory
+        dataloader_num_workers=2,
+        push_to_hub=False,
+    )
 
-# Create Trainer
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    train_dataset=train_dataset,
-    eval_dataset=test_dataset,
-    compute_metrics=compute_metrics,
-)
+    # Create Trainer
+    trainer = LengthGroupedTrainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=test_dataset,
+        # Pads each batch to its longest sequence (rounded up to a multiple of 8 for tensor cores)
+        data_collator=DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8),
+        compute_metrics=compute_metrics,
+        train_lengths=train_dataset["length"],
+    )
 
-# Start training
-trainer.train()
+    # Start training
+    trainer.train()
 
-evaluation_results = trainer.evaluate()
+    evaluation_results = trainer.evaluate()
 
-print("Evaluation Results:", evaluation_results)
+    print("Evaluation Results:", evaluation_results)
 
-# Save the trained model
-model.save_pretrained("./saved_model_ai")
-# Save the tokenizer
-tokenizer.save_pretrained("./saved_model_ai")
+    # Save the trained model
+    model.save_pretrained("./saved_model_ai")
+    # Save the tokenizer
+    tokenizer.save_pretrained("./saved_model_ai")
 
-def predict(text):
+    return model, tokenizer
+
+def predict(text, model, tokenizer):
     # Preprocess input text
-    text = text.translate(str.maketrans('', '', string.punctuation))
+    text = remove_punctuation(text)
 
-    # Tokenize
+    # Tokenize; a single text needs no padding
     inputs = tokenizer(
         text,
-        padding="max_length",
         truncation=True,
-        max_length=512,
+        max_length=MAX_LENGTH,
         return_tensors="pt"
     )
 
-    # Move inputs to GPU if available
-    if torch.cuda.is_available():
-        inputs = {key: val.cuda() for key, val in inputs.items()}
-        model.cuda()
-
-    # Set model to evaluation mode
-    model.eval()
+    # Inputs follow the model, which is placed on its device once by the caller
+    device = next(model.parameters()).device
+    inputs = {key: val.to(device) for key, val in inputs.items()}
 
     with torch.no_grad():
         outputs = model(**inputs)
@@ -186,6 +281,10 @@ def predict(text):
     return (probs[0].item(), probs[1].item(), predicted_class_id)
 
 if __name__ == "__main__":
+    model, tokenizer = train()
+    if torch.cuda.is_available():
+        model.cuda()
+    # Set model to evaluation mode
+    model.eval()
     some_text = input('Paste: ')
-    predict(some_text)
-
+    print(predict(some_text, model, tokenizer))
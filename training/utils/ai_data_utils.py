@@ -1,23 +1,15 @@
-from google import genai
-import pandas as pd
-import time
-import itertools
+import argparse
+import asyncio
+import json
 import os
-from dotenv import load_dotenv
 import random
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Protocol, Set
 
-load_dotenv()
-
+import pandas as pd
+from dotenv import load_dotenv
 
-GEMINI_API_KEY_1 = os.getenv("GEMINI_API_KEY_1")
-GEMINI_API_KEY_2 = os.getenv("GEMINI_API_KEY_2")
-GEMINI_API_KEY_3 = os.getenv("GEMINI_API_KEY_3")
-# List of your API keys
-api_keys = [
-    GEMINI_API_KEY_1,
-    GEMINI_API_KEY_2,
-    GEMINI_API_KEY_3
-]
 
 # list of fields
 list_of_fields = [
@@ -39,11 +31,15 @@ list_of_fields = [
     "Internet of Things", "Big Data", "Augmented Reality", "Virtual Reality", "Systems Administration"
 ]
 
-# Create iterators that cycles through the API keys and list of fields
-api_key_iterator = itertools.cycle(api_keys)
+DEFAULT_MODEL = "gemini-2.0-flash"
+# Allowed request rate per API key; the free tier of gemini-2.0-flash allows 15 requests per minute
+DEFAULT_REQUESTS_PER_MINUTE = 15
+# HTTP status codes that are worth retrying; any other client error fails the sample immediately
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
 
-def get_prompt(field: list = list_of_fields) -> str:
-    chosen_field = random.choice(field)
+def get_prompt(field: list = list_of_fields, rng: Optional[random.Random] = None) -> str:
+    chosen_field = (rng or random).choice(field)
     final_prompt = f"""You are an expert in the field of {chosen_field} who is also very skilled
     at writing very good and impactful medium article. Your task is to write a very detailed
     medium article of at least 700 words on any interesting topic of your choice within
@@ -52,49 +48,258 @@ def get_prompt(field: list = list_of_fields) -> str:
     """
     return final_prompt
 
-def generate_text(prompt, api_key):
+
+def load_api_keys() -> List[str]:
+    """Reads GEMINI_API_KEY_1, GEMINI_API_KEY_2, ... from the environment (and .env)."""
+    load_dotenv()
+    keys = [value for name, value in sorted(os.environ.items()) if name.startswith("GEMINI_API_KEY_") and value]
+    return keys
+
+
+class TextGenerationClient(Protocol):
+    """Anything that can turn a prompt into text with a given API key."""
+    async def generate(self, prompt: str, api_key: str) -> str: ...
+
+
+class GeminiClient:
+    """Async Gemini client, one underlying client per API key. `base_url` points it at a stub server."""
+
+    def __init__(self, model: str = DEFAULT_MODEL, base_url: Optional[str] = None):
+        self.model = model
+        self.base_url = base_url
+        self._clients: Dict[str, object] = {}
+
+    def _client(self, api_key: str):
+        if api_key not in self._clients:
+            from google import genai
+            from google.genai import types
+
+            http_options = types.HttpOptions(base_url=self.base_url) if self.base_url else None
+            self._clients[api_key] = genai.Client(api_key=api_key, http_options=http_options)
+        return self._clients[api_key]
+
+    async def generate(self, prompt: str, api_key: str) -> str:
+        response = await self._client(api_key).aio.models.generate_content(model=self.model, contents=[prompt])
+        return response.text
+
+
+class TokenBucket:
+    """Per-key rate limiter. Tokens may go negative: a negative balance is a queue of reservations."""
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token reserved now could be used."""
+        self._refill(now)
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+    def reserve(self, now: float) -> float:
+        """Takes one token and returns how long the caller must wait before using it."""
+        wait = self.delay(now)
+        self.tokens -= 1.0
+        return wait
+
+    def penalize(self, seconds: float):
+        """Pushes the next token back, e.g. after the server answered 429 for this key."""
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class KeyPool:
     """
-    Generate text using the specified API key and prompt.
+    Hands each request to whichever key can serve it soonest, so the total
+    request rate approaches the sum of every key's quota instead of being
+    limited by the slowest key in a fixed rotation.
     """
-    # Initialize the genai client with the current API key
-    client = genai.Client(api_key=api_key)
 
-    # Generate content based on the prompt
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[prompt]
-    )
+    def __init__(self, api_keys: List[str], requests_per_minute: float, burst: int = 1):
+        if not api_keys:
+            raise ValueError("At least one API key is required.")
+        self.buckets = {key: TokenBucket(requests_per_minute, burst) for key in api_keys}
+
+    async def acquire(self) -> str:
+        now = time.monotonic()
+        # No await between choosing and reserving, so concurrent workers never race for a token
+        key = min(self.buckets, key=lambda k: self.buckets[k].delay(now))
+        wait = self.buckets[key].reserve(now)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return key
+
+    def penalize(self, api_key: str, seconds: float):
+        self.buckets[api_key].penalize(seconds)
+
 
-    return response.text  # Extract the text from the response
+def _status_code(error: Exception) -> Optional[int]:
+    """Best-effort HTTP status of a client error (google-genai sets .code, httpx responses .status_code)."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if code is None and response is not None:
+        code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
 
-# Initialize an empty list to store the generated text
-data = []
 
-for i in range(500):
-    # Get the next API key from the iterator
-    current_api_key = next(api_key_iterator)
+class CheckpointWriter:
+    """Appends one JSON line per finished sample, so a crash loses at most the samples in flight."""
 
-    # Define your prompt here
-    prompt = get_prompt()
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = None
+
+    def completed_ids(self) -> Set[int]:
+        """Sample ids already generated successfully; a partially written last line is dropped."""
+        if not self.path.exists():
+            return set()
+        done: Set[int] = set()
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                valid_bytes += len(line)
+                record = json.loads(line)
+                if record.get("text"):
+                    done.add(record["sample_id"])
+        if valid_bytes != self.path.stat().st_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_bytes)
+        return done
+
+    def write(self, record: Dict):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def generate_dataset(
+    num_samples: int,
+    checkpoint_path: Path,
+    client: TextGenerationClient,
+    api_keys: List[str],
+    concurrency: int = 8,
+    requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+    max_retries: int = 5,
+    base_backoff: float = 2.0,
+    max_backoff: float = 60.0,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """
+    Generates samples 0..num_samples-1, skipping those already in the
+    checkpoint. Each sample's prompt depends only on the seed and its id,
+    so a resumed run asks for exactly the samples that are missing.
+
+    Returns:
+        Dict[str, float]: generated, failed and skipped counts plus samples per minute.
+    """
+    writer = CheckpointWriter(checkpoint_path)
+    done = writer.completed_ids()
+    pending: asyncio.Queue = asyncio.Queue()
+    for sample_id in range(num_samples):
+        if sample_id not in done:
+            pending.put_nowait(sample_id)
+    pool = KeyPool(api_keys, requests_per_minute)
+    stats = {"generated": 0, "failed": 0, "skipped": len(done)}
+    started = time.monotonic()
+
+    async def generate_one(sample_id: int) -> Dict:
+        rng = random.Random(seed * 1_000_003 + sample_id)
+        prompt = get_prompt(rng=rng)
+        last_error: Optional[Exception] = None
+        for attempt in range(max_retries + 1):
+            api_key = await pool.acquire()
+            try:
+                text = await client.generate(prompt, api_key)
+                if not text:
+                    raise ValueError("Empty response.")
+                return {"sample_id": sample_id, "text": text}
+            except Exception as e:
+                last_error = e
+                code = _status_code(e)
+                if code is not None and code not in RETRYABLE_STATUS_CODES:
+                    break
+                backoff = min(max_backoff, base_backoff * 2 ** attempt) * (0.5 + rng.random() / 2)
+                if code == 429:
+                    # This key is over quota; let the other keys carry the load meanwhile
+                    pool.penalize(api_key, backoff)
+                print(f"Sample {sample_id} attempt {attempt + 1} failed ({e}); retrying in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+        return {"sample_id": sample_id, "text": None, "error": str(last_error)}
+
+    async def worker():
+        while True:
+            try:
+                sample_id = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            record = await generate_one(sample_id)
+            writer.write(record)
+            if record["text"]:
+                stats["generated"] += 1
+                print(f"Generated text number {sample_id + 1} successfully")
+            else:
+                stats["failed"] += 1
+                print(f"Error generating text for row {sample_id + 1}: {record['error']}")
 
     try:
-        # Generate text using the current API key
-        generated_text = generate_text(prompt, current_api_key)
-        # Append the generated text to the data list
-        data.append(generated_text)
-        print(f'Generated text number {i+1} successfully')
-    except Exception as e:
-        # Handle exceptions (e.g., API errors)
-        print(f"Error generating text for row {i+1}: {e}")
-        data.append(None)  # Append None if an error occurs
-
-    # Wait for 3 seconds before the next iteration to switch API keys
-    time.sleep(3)
-
-# Create a DataFrame from the data list
-df = pd.DataFrame(data, columns=['GeneratedText'])
-
-# Save the DataFrame to a CSV file
-df.to_csv('generated_texts_two.csv', index=False)
-
-print("Text generation complete. Data saved to 'generated_texts.csv'.")
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        writer.close()
+    elapsed = time.monotonic() - started
+    stats["samples_per_minute"] = stats["generated"] / elapsed * 60 if elapsed > 0 else 0.0
+    return stats
+
+
+def export_csv(checkpoint_path: Path, csv_path: Path):
+    """Writes the successful samples as the GeneratedText CSV read by utils.load_ai_data."""
+    with open(checkpoint_path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    texts = {record["sample_id"]: record["text"] for record in records if record.get("text")}
+    df = pd.DataFrame([texts[i] for i in sorted(texts)], columns=['GeneratedText'])
+    df.to_csv(csv_path, index=False)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate AI-written articles with Gemini for the training set.")
+    parser.add_argument("--num-samples", type=int, default=500)
+    parser.add_argument("--output", default="generated_texts_two.csv")
+    parser.add_argument("--checkpoint", help="JSONL checkpoint; defaults to the output path with a .jsonl suffix.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=float, default=DEFAULT_REQUESTS_PER_MINUTE, help="Per API key.")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--base-url", help="Alternative API endpoint, e.g. a local stub server.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    output = Path(args.output)
+    checkpoint = Path(args.checkpoint) if args.checkpoint else output.with_suffix(".jsonl")
+    stats = asyncio.run(generate_dataset(
+        args.num_samples,
+        checkpoint,
+        GeminiClient(model=args.model, base_url=args.base_url),
+        load_api_keys(),
+        concurrency=args.concurrency,
+        requests_per_minute=args.requests_per_minute,
+        max_retries=args.max_retries,
+        seed=args.seed,
+    ))
+    export_csv(checkpoint, output)
+    print(f"Text generation complete: {stats}. Data saved to '{output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,350 @@
 import pandas as pd
 import numpy as np
 import kagglehub
+import hashlib
+import json
 import os
+import string
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 
+import pyarrow as pa
+
+# Bump whenever preprocessing, deduplication or sampling changes so stale caches are rebuilt
+DATASET_CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join('data', 'cache')
+CHUNK_SIZE = 20_000
+
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+DATASET_SCHEMA = pa.schema([
+    ('text', pa.large_string()),
+    ('label', pa.int64()),
+    ('source', pa.string()),
+    ('content_hash', pa.uint64()),
+])
+
+
+class DataSource(NamedTuple):
+    """A CSV file contributing rows to the training set.
+
+    Rows are labelled from `label_column` or, if it is None, all get `label`.
+    `sample_sizes` maps a label to how many unique rows to sample for it;
+    None keeps every unique row, and labels missing from it are dropped.
+    `seed` overrides the build's sampling seed for this source.
+    """
+    name: str
+    path: str
+    text_column: str
+    label_column: Optional[str] = None
+    label: Optional[int] = None
+    sample_sizes: Optional[Dict[int, int]] = None
+    seed: Optional[int] = None
+
+
+def preprocess_text(text: str) -> str:
+    """Applies the punctuation stripping used for training and serving."""
+    return text.translate(PUNCTUATION_TABLE).strip()
+
+
+def content_hashes(texts: List[str]) -> np.ndarray:
+    """64-bit content hashes of preprocessed texts, insensitive to whitespace differences."""
+    return np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(' '.join(text.split()).encode('utf-8'), digest_size=8).digest(), 'little')
+            for text in texts
+        ),
+        dtype=np.uint64,
+        count=len(texts),
+    )
+
+
+def sampling_keys(hashes: np.ndarray, seed: int) -> np.ndarray:
+    """Maps content hashes to uniform pseudo-random keys (splitmix64).
+
+    Keeping the rows with the smallest keys is a uniform sample that does not
+    depend on chunk size or row order, so rebuilding with the same seed
+    always selects the same rows.
+    """
+    with np.errstate(over='ignore'):
+        x = hashes ^ np.uint64(seed * 0x9E3779B97F4A7C15 % 2**64)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
 
-def load_ai_data() -> pd.DataFrame:
-    """_summary_
+
+class ContentHashIndex:
+    """Exact set of content hashes seen so far, stored as one sorted uint64 array (8 bytes per text)."""
+
+    def __init__(self):
+        self._hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add_new(self, hashes: np.ndarray) -> np.ndarray:
+        """Adds a chunk of hashes and returns a mask of the rows seen for the first time."""
+        _, first = np.unique(hashes, return_index=True)
+        is_new = np.zeros(len(hashes), dtype=bool)
+        is_new[first] = True
+        is_new &= ~np.isin(hashes, self._hashes, assume_unique=False)
+        self._hashes = np.union1d(self._hashes, hashes[is_new])
+        return is_new
+
+
+def iter_source_chunks(
+    source: DataSource, chunksize: int = CHUNK_SIZE
+) -> Iterator[Tuple[np.ndarray, List[str], np.ndarray, np.ndarray]]:
+    """Streams a source as (row numbers, raw texts, labels, content hashes), skipping rows without usable text.
+
+    Texts are kept as in the file; only the hashes are computed on the
+    preprocessed text, so punctuation variants count as duplicates.
+
+    Args:
+        source (DataSource): the CSV to read.
+        chunksize (int): rows parsed at a time; bounds peak memory.
+
+    Yields:
+        Tuple[np.ndarray, List[str], np.ndarray, np.ndarray]: row numbers in the file, texts, integer labels and hashes.
+    """
+    columns = [source.text_column] + ([source.label_column] if source.label_column else [])
+    row = 0
+    for chunk in pd.read_csv(source.path, usecols=columns, chunksize=chunksize):
+        rows = np.arange(row, row + len(chunk))
+        row += len(chunk)
+        texts = chunk[source.text_column]
+        if source.label_column:
+            labels = pd.to_numeric(chunk[source.label_column], errors='coerce')
+        else:
+            labels = pd.Series(source.label, index=chunk.index, dtype='float64')
+        keep = texts.map(lambda value: isinstance(value, str)).to_numpy() & labels.notna().to_numpy()
+        raw = texts[keep].tolist()
+        processed = [preprocess_text(text) for text in raw]
+        non_empty = np.array([bool(text) for text in processed], dtype=bool)
+        yield (
+            rows[keep][non_empty],
+            [text for text, ok in zip(raw, non_empty) if ok],
+            labels[keep].to_numpy(dtype=np.int64)[non_empty],
+            content_hashes([text for text in processed if text]),
+        )
+
+
+def _select_rows(source: DataSource, index: ContentHashIndex, seed: int, chunksize: int) -> np.ndarray:
+    """First pass over a source: deduplicates against every earlier row and picks the sample.
+
+    Only row numbers and sampling keys of the current candidates are kept
+    (bottom-k sampling per label), never the texts themselves.
 
     Returns:
-        pd.DataFrame: _description_
+        np.ndarray: sorted row numbers to keep.
     """
-    data_one = pd.read_csv('data/generated_texts_one.csv')
-    data_two = pd.read_csv('data/generated_texts_two.csv')
+    # label -> (keys, rows) of the current bottom-k candidates
+    candidates: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    kept_all: List[np.ndarray] = []
+    seed = source.seed if source.seed is not None else seed
+    for rows, _, labels, hashes in iter_source_chunks(source, chunksize):
+        is_new = index.add_new(hashes)
+        rows, hashes, labels = rows[is_new], hashes[is_new], labels[is_new]
+        if source.sample_sizes is None:
+            kept_all.append(rows)
+            continue
+        keys = sampling_keys(hashes, seed)
+        for label, size in source.sample_sizes.items():
+            mask = labels == label
+            old_keys, old_rows = candidates.get(label, (np.empty(0, np.uint64), np.empty(0, np.int64)))
+            all_keys = np.concatenate([old_keys, keys[mask]])
+            all_rows = np.concatenate([old_rows, rows[mask]])
+            if len(all_keys) > size:
+                smallest = np.argpartition(all_keys, size - 1)[:size]
+                all_keys, all_rows = all_keys[smallest], all_rows[smallest]
+            candidates[label] = (all_keys, all_rows)
+
+    if source.sample_sizes is None:
+        selected = np.concatenate(kept_all) if kept_all else np.empty(0, np.int64)
+    else:
+        for label, size in source.sample_sizes.items():
+            found = len(candidates.get(label, ((), ()))[0])
+            if found < size:
+                print(f'{source.name}: only {found} unique rows with label {label}, wanted {size}')
+        selected = np.concatenate([rows for _, rows in candidates.values()]) if candidates else np.empty(0, np.int64)
+    return np.sort(selected)
+
+
+def dataset_fingerprint(sources: List[DataSource], seed: int) -> str:
+    """Identifies a dataset build by the pipeline version, sources (path, size, mtime) and sampling parameters."""
+    description = {
+        'version': DATASET_CACHE_VERSION,
+        'seed': seed,
+        'sources': [
+            {
+                **source._asdict(),
+                'path': os.path.abspath(source.path),
+                'size': os.path.getsize(source.path),
+                'mtime': int(os.path.getmtime(source.path)),
+                'sample_sizes': sorted((source.sample_sizes or {}).items()) or None,
+            }
+            for source in sources
+        ],
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()[:16]
 
-    ai_data = pd.concat([data_one, data_two])
-    ai_data.reset_index(drop =True, inplace = True)
-    ai_data['label'] = 1
-    ai_data.rename(columns = {'GeneratedText':'text'}, inplace = True)
 
-    return ai_data
+def build_dataset(
+    sources: List[DataSource],
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    seed: int = 42,
+    chunksize: int = CHUNK_SIZE,
+    rebuild: bool = False,
+) -> Path:
+    """Assembles, deduplicates and samples the sources into a cached Arrow file.
 
-def load_human_data() -> pd.DataFrame:
-    """_summary_
+    Sources are streamed twice: once to deduplicate by content hash (earlier
+    sources win) and choose the sampled rows, and once to write those rows.
+    Peak memory is one chunk plus 8 bytes per unique text, independent of
+    the sample size. An existing cache with the same fingerprint is reused.
+
+    Args:
+        sources (List[DataSource]): CSV sources in priority order.
+        cache_dir (str): directory holding versioned dataset files.
+        seed (int): sampling seed of sources that set none.
+        chunksize (int): rows parsed at a time.
+        rebuild (bool): ignore an existing cache.
 
     Returns:
-        pd.DataFrame: _description_
+        Path: the Arrow file, to be opened with load_dataset_table.
+    """
+    fingerprint = dataset_fingerprint(sources, seed)
+    target = Path(cache_dir) / f'dataset-v{DATASET_CACHE_VERSION}-{fingerprint}.arrow'
+    if target.exists() and not rebuild:
+        return target
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    started = time.perf_counter()
+    index = ContentHashIndex()
+    selections = [(source, _select_rows(source, index, seed, chunksize)) for source in sources]
+
+    counts: Dict[str, Dict[int, int]] = {}
+    tmp_target = target.with_suffix('.arrow.tmp')
+    with pa.OSFile(str(tmp_target), 'wb') as sink, pa.ipc.new_stream(sink, DATASET_SCHEMA) as writer:
+        for source, selected in selections:
+            source_counts = counts.setdefault(source.name, {})
+            for rows, texts, labels, hashes in iter_source_chunks(source, chunksize):
+                mask = np.isin(rows, selected, assume_unique=True)
+                if not mask.any():
+                    continue
+                chosen_texts = [text for text, keep in zip(texts, mask) if keep]
+                chosen_labels = labels[mask]
+                writer.write_batch(pa.record_batch([
+                    pa.array(chosen_texts, pa.large_string()),
+                    pa.array(chosen_labels, pa.int64()),
+                    pa.array([source.name] * len(chosen_texts), pa.string()),
+                    pa.array(hashes[mask], pa.uint64()),
+                ], schema=DATASET_SCHEMA))
+                for label, count in zip(*np.unique(chosen_labels, return_counts=True)):
+                    source_counts[int(label)] = source_counts.get(int(label), 0) + int(count)
+    os.replace(tmp_target, target)
+
+    manifest = {
+        'version': DATASET_CACHE_VERSION,
+        'fingerprint': fingerprint,
+        'seed': seed,
+        'unique_texts_seen': len(index),
+        'rows': sum(sum(c.values()) for c in counts.values()),
+        'counts': counts,
+        'build_seconds': round(time.perf_counter() - started, 2),
+    }
+    target.with_suffix('.json').write_text(json.dumps(manifest, indent=2))
+    print(f"Built {target} with {manifest['rows']} rows in {manifest['build_seconds']}s")
+    return target
+
+
+def load_dataset_table(path: Path) -> pa.Table:
+    """Memory-maps a dataset built by build_dataset; no text is copied into RAM until it is accessed.
+
+    The file uses the Arrow stream format, so `datasets.Dataset.from_file(path)`
+    can map it directly as well.
     """
+    with pa.memory_map(str(path), 'r') as source:
+        return pa.ipc.open_stream(source).read_all()
+
+
+def ai_data_sources() -> List[DataSource]:
+    return [
+        DataSource('generated_one', 'data/generated_texts_one.csv', 'GeneratedText', label=1),
+        DataSource('generated_two', 'data/generated_texts_two.csv', 'GeneratedText', label=1),
+    ]
+
+
+def human_data_source(n: int = 1000) -> DataSource:
     path = kagglehub.dataset_download("fabiochiusano/medium-articles")
-    csv_path = os.path.join(path, "medium_articles.csv")
-    df = pd.read_csv(csv_path)
-    df = df.sample(n=1000, random_state=23)
-    df.reset_index(drop=True, inplace=True)
-    df['label'] = 0
-    df = df[['text','label']]
+    return DataSource(
+        'medium_articles', os.path.join(path, "medium_articles.csv"), 'text', label=0, sample_sizes={0: n}, seed=23,
+    )
 
-    return df
 
-def load_kaggle_data() -> pd.DataFrame:
+def kaggle_data_source(n_per_label: int = 4000) -> DataSource:
     path = kagglehub.dataset_download("shanegerami/ai-vs-human-text")
-    csv_path = os.path.join(path, "AI_Human.csv")
-    df = pd.read_csv(csv_path)
-    df.rename(columns = {'generated':'label'}, inplace = True)
-    df = pd.concat([df[df['label'] == 1].sample(n=4000, random_state=42),
-    df[df['label'] == 0].sample(n=4000, random_state=42)
-    ]).sample(frac=1, random_state=42).reset_index(drop=True)
-    df = df.astype({'label': 'int'})
+    return DataSource(
+        'ai_vs_human', os.path.join(path, "AI_Human.csv"), 'text', label_column='generated',
+        sample_sizes={0: n_per_label, 1: n_per_label},
+    )
 
-    return df
 
-def get_full_data() -> pd.DataFrame:
-    ai_data = load_ai_data()
-    human_data = load_human_data()
-    kaggle_data = load_kaggle_data()
-    final_data = pd.concat([ai_data, human_data,kaggle_data])
+def _to_frame(sources: List[DataSource], **kwargs) -> pd.DataFrame:
+    return load_dataset_table(build_dataset(sources, **kwargs)).select(['text', 'label']).to_pandas()
 
-    return final_data
 
+def load_ai_data() -> pd.DataFrame:
+    """Loads every unique Gemini-generated text, labelled 1.
 
-if __name__ == "__main__":
-    data = load_human_data()
-    print(f'human: {data.shape}')
-    ai_data = load_ai_data()
-    print(f'ai: {ai_data.shape}')
-    full_data = get_full_data()
-    print(full_data.shape)
-    full_data.to_csv('final_data.csv', index = False)
+    Returns:
+        pd.DataFrame: columns text and label.
+    """
+    return _to_frame(ai_data_sources())
 
+def load_human_data(n: int = 1000) -> pd.DataFrame:
+    """Samples n unique Medium articles, labelled 0, without loading the whole CSV.
+
+    Returns:
+        pd.DataFrame: columns text and label.
+    """
+    return _to_frame([human_data_source(n)])
+
+def load_kaggle_data(n_per_label: int = 4000) -> pd.DataFrame:
+    """Samples n_per_label unique texts of each class from the AI vs Human dataset.
+
+    Returns:
+        pd.DataFrame: columns text and label.
+    """
+    return _to_frame([kaggle_data_source(n_per_label)])
+
+def get_full_data(
+    human_samples: int = 1000, kaggle_samples_per_label: int = 4000, seed: int = 42, rebuild: bool = False
+) -> pd.DataFrame:
+    """Assembles the full training set, deduplicated across sources.
+
+    Use get_full_data_path and load_dataset_table instead for larger builds,
+    which keeps the texts memory-mapped rather than in a DataFrame.
+
+    Returns:
+        pd.DataFrame: columns text and label.
+    """
+    path = get_full_data_path(human_samples, kaggle_samples_per_label, seed, rebuild)
+    return load_dataset_table(path).select(['text', 'label']).to_pandas()
+
+def get_full_data_path(
+    human_samples: int = 1000, kaggle_samples_per_label: int = 4000, seed: int = 42, rebuild: bool = False
+) -> Path:
+    """Builds (or reuses) the cached full training set and returns its Arrow file."""
+    sources = ai_data_sources() + [human_data_source(human_samples), kaggle_data_source(kaggle_samples_per_label)]
+    return build_dataset(sources, seed=seed, rebuild=rebuild)
+
+
+if __name__ == "__main__":
+    path = get_full_data_path()
+    table = load_dataset_table(path)
+    print(f'full: {table.num_rows} rows from {path}')
+    print(table.group_by(['source', 'label']).aggregate([('text', 'count')]).to_pandas())
+    import pyarrow.csv
+    pyarrow.csv.write_csv(table.select(['text', 'label']), 'final_data.csv')